@@ -3,33 +3,43 @@ import pandas as pd
 import numpy as np
 import tensorflow as tf
 import xgboost as xgb
-from sklearn.model_selection import train_test_split, GridSearchCV
+from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import MinMaxScaler
 import matplotlib.pyplot as plt
 import seaborn as sns
 import os
+import time
+import argparse
 import warnings
 import pickle
 import json
 
+from training_cache import load_or_build, memmap_dataset
+
 os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2'
 warnings.filterwarnings('ignore', category=UserWarning, module='xgboost')
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 dataset_path = os.path.join(BASE_DIR, "final_master_dataset.csv")
+CACHE_DIR = os.path.join(BASE_DIR, "cache")
 
-def create_sequences(data, feature_cols, target_col, sequence_length=1):
-    X, y, player_ids, season_names = [], [], [], []
-    for player_id, group in data.groupby('player_id'):
-        features = group.sort_values('season_name')[feature_cols].values
-        targets = group.sort_values('season_name')[target_col].values
-        if len(features) > sequence_length:
-            for i in range(len(features) - sequence_length):
-                X.append(features[i:i + sequence_length])
-                y.append(targets[i + sequence_length])
-                player_ids.append(player_id)
-                season_names.append(group.sort_values('season_name').iloc[i + sequence_length]['season_name'])
-    return np.array(X), np.array(y), player_ids, season_names
+# Feature columns
+feature_columns = [
+    'age_clean', 'goals_per_match', 'assists_per_match', 'shots_per_match',
+    'xG_per_match', 'xG_performance', 'goals_yoy_change', 'assists_yoy_change',
+    'total_days_missed', 'injury_count', 'average_sentiment', 'post_count',
+    'pos_Defender', 'pos_Forward', 'pos_Goalkeeper', 'pos_Midfielder'
+]
+target_column = 'market_value_eur'
+engineered_features = ['age_x_goals', 'age_squared', 'attack_contribution']
+lstm_feature_columns = feature_columns + engineered_features
+
+def prepare_model_frame(df):
+    df_model = df[['player_id', 'season_name'] + feature_columns + [target_column]].copy().dropna()
+    df_model['age_x_goals'] = df_model['age_clean'] * df_model['goals_per_match']
+    df_model['age_squared'] = df_model['age_clean'] ** 2
+    df_model['attack_contribution'] = df_model['goals_per_match'] + df_model['assists_per_match']
+    return df_model
 
 def build_lstm_model(input_shape):
     model = tf.keras.Sequential([
@@ -43,77 +53,251 @@ def build_lstm_model(input_shape):
     model.compile(optimizer='adam', loss='mean_squared_error')
     return model
 
-if __name__ == "__main__":
-    if not os.path.exists(dataset_path):
-        print(f"Error: Dataset not found at {dataset_path}")
-        exit()
-    df = pd.read_csv(dataset_path)
-    print("✅ Dataset loaded successfully!")
+SAVED_DIR = os.path.join(BASE_DIR, "saved_models")
+STATE_FILE = "training_state.json"
+XGB_PARAMS = dict(objective='reg:squarederror', subsample=0.8, colsample_bytree=0.8, random_state=42, n_jobs=-1)
 
-    # Feature columns
-    feature_columns = [
-        'age_clean', 'goals_per_match', 'assists_per_match', 'shots_per_match',
-        'xG_per_match', 'xG_performance', 'goals_yoy_change', 'assists_yoy_change',
-        'total_days_missed', 'injury_count', 'average_sentiment', 'post_count',
-        'pos_Defender', 'pos_Forward', 'pos_Goalkeeper', 'pos_Midfielder'
-    ]
-    target_column = 'market_value_eur'
+def load_training_cache():
+    # Model frame, fitted LSTM scaler and sequences come from the preprocessing
+    # cache (memory-mapped .npy); only the first run on a dataset builds them
+    return load_or_build(
+        dataset_path, CACHE_DIR, prepare_model_frame, lstm_feature_columns, target_column,
+        raw_columns=['player_id', 'season_name'] + feature_columns + [target_column],
+        spec_extra={'engineered_features': engineered_features},
+    )
 
-    df_model = df[['player_id', 'season_name'] + feature_columns + [target_column]].copy().dropna()
-    df_model['age_x_goals'] = df_model['age_clean'] * df_model['goals_per_match']
-    df_model['age_squared'] = df_model['age_clean'] ** 2
-    df_model['attack_contribution'] = df_model['goals_per_match'] + df_model['assists_per_match']
-    engineered_features = ['age_x_goals', 'age_squared', 'attack_contribution']
-    lstm_feature_columns = feature_columns + engineered_features
-
-    # --- Train LSTM ---
-    feature_scaler_lstm = MinMaxScaler()
-    df_lstm = df_model.copy()
-    df_lstm[lstm_feature_columns] = feature_scaler_lstm.fit_transform(df_lstm[lstm_feature_columns])
-    df_lstm[target_column] = np.log1p(df_lstm[target_column])
-
-    X_seq, y_seq, _, _ = create_sequences(df_lstm, lstm_feature_columns, target_column)
-    if len(X_seq) == 0:
-        print("Not enough data for sequences. Exiting.")
-        exit()
+def season_mask(season_names, seasons):
+    return np.isin(np.asarray(season_names).astype(str), [str(s) for s in seasons])
 
-    X_train_lstm, _, y_train_lstm, _ = train_test_split(X_seq, y_seq, test_size=0.2, random_state=42)
-    lstm_model = build_lstm_model((X_train_lstm.shape[1], X_train_lstm.shape[2]))
-    lstm_model.fit(X_train_lstm, y_train_lstm, epochs=50, batch_size=32, verbose=1)
+def sequence_mask(cache, rows):
+    # Sequences whose target (player, season) is one of the given model-frame rows
+    keys = pd.MultiIndex.from_arrays([cache.player_id[rows], cache.season_name[rows]])
+    return pd.MultiIndex.from_arrays([cache.seq_player_id, cache.seq_season_name]).isin(keys)
 
-    # Generate LSTM predictions as feature
-    lstm_predictions_log = lstm_model.predict(X_seq, verbose=0)
+def stacking_inputs(cache, lstm_model):
+    # LSTM predictions as the stacking feature for the XGBoost stage
+    X_seq, y_seq = cache.X_seq, cache.y_seq
+    all_idx = np.arange(len(y_seq))
+    lstm_predictions_log = lstm_model.predict(
+        memmap_dataset(X_seq, y_seq, all_idx, batch_size=1024, shuffle=False).map(lambda x, y: x), verbose=0)
+    # Each prediction belongs to its sequence's target (player, season), so
+    # rows of a newly appended season get their own prediction
     df_predictions = pd.DataFrame({
-        'player_id': df_model['player_id'].iloc[1:len(lstm_predictions_log)+1].values,
-        'season_name': df_model['season_name'].iloc[1:len(lstm_predictions_log)+1].values,
+        'player_id': cache.seq_player_id,
+        'season_name': cache.seq_season_name,
         'lstm_prediction': lstm_predictions_log.flatten()
     })
-    df_model = pd.merge(df_model, df_predictions, on=['player_id','season_name'], how='left')
+    # Merge on the key columns only and gather feature rows from the cache
+    # instead of copying the whole model frame
+    df_keys = pd.DataFrame({'player_id': cache.player_id, 'season_name': cache.season_name,
+                            'row': np.arange(len(cache.player_id))})
+    df_keys = pd.merge(df_keys, df_predictions, on=['player_id','season_name'], how='left')
+    df_keys.dropna(subset=['lstm_prediction'], inplace=True)
+    rows = df_keys['row'].to_numpy()
+    X = np.column_stack([cache.features[rows], df_keys['lstm_prediction'].to_numpy()])
+    y = np.log1p(cache.target[rows])
+    return rows, X, y
 
-    # --- Train XGBoost ---
-    final_feature_columns = lstm_feature_columns + ['lstm_prediction']
-    df_xgb = df_model.copy()
-    df_xgb[target_column] = np.log1p(df_xgb[target_column])
-    df_xgb.dropna(subset=['lstm_prediction'], inplace=True)
+def train_full(cache, epochs=50, holdout_rows=None):
+    X_seq, y_seq = cache.X_seq, cache.y_seq
+    seq_idx = np.arange(len(y_seq))
+    if holdout_rows is not None:
+        seq_idx = seq_idx[~sequence_mask(cache, holdout_rows)]
 
-    X = df_xgb[final_feature_columns]
-    y = df_xgb[target_column]
+    # --- Train LSTM ---
+    # Same split as train_test_split on the arrays themselves, without copying them
+    train_idx, _ = train_test_split(seq_idx, test_size=0.2, random_state=42)
+    lstm_model = build_lstm_model((X_seq.shape[1], X_seq.shape[2]))
+    lstm_model.fit(memmap_dataset(X_seq, y_seq, train_idx, batch_size=32), epochs=epochs, verbose=1)
+
+    # --- Train XGBoost ---
+    rows, X, y = stacking_inputs(cache, lstm_model)
+    keep = ~np.isin(rows, holdout_rows) if holdout_rows is not None else slice(None)
     feature_scaler_xgb = MinMaxScaler()
-    X_scaled = feature_scaler_xgb.fit_transform(X)
+    X_scaled = feature_scaler_xgb.fit_transform(X[keep])
 
-    xgb_model = xgb.XGBRegressor(objective='reg:squarederror', subsample=0.8, colsample_bytree=0.8, random_state=42, n_jobs=-1)
-    xgb_model.fit(X_scaled, y)
+    xgb_model = xgb.XGBRegressor(**XGB_PARAMS)
+    xgb_model.fit(X_scaled, y[keep])
+    return {'lstm_model': lstm_model, 'xgb_model': xgb_model,
+            'feature_scaler_lstm': cache.lstm_feature_scaler, 'feature_scaler_xgb': feature_scaler_xgb}
 
+def scaler_covers(scaler, X, tol=1e-9):
+    # Columns of X (the scaler's leading columns) outside the fitted range
+    X = np.asarray(X, dtype=float)
+    data_min, data_max = scaler.data_min_[:X.shape[1]], scaler.data_max_[:X.shape[1]]
+    span = np.maximum(data_max - data_min, 1.0) * tol
+    low = X.min(axis=0) < data_min - span
+    high = X.max(axis=0) > data_max + span
+    return np.flatnonzero(low | high)
+
+def train_incremental(cache, saved, new_seasons, epochs=5, new_trees=100, replay=1.0, holdout_rows=None):
+    # Returns None when the saved scalers do not cover the new data; a full
+    # retrain is needed then because the fitted models assume the old scaling
+    if not np.allclose(saved['feature_scaler_lstm'].data_min_, cache.lstm_feature_scaler.data_min_) or \
+       not np.allclose(saved['feature_scaler_lstm'].data_max_, cache.lstm_feature_scaler.data_max_):
+        new_rows = np.flatnonzero(season_mask(cache.season_name, new_seasons))
+        bad = scaler_covers(saved['feature_scaler_lstm'], cache.features[new_rows])
+        print(f"⚠️ LSTM scaler range changed ({', '.join(lstm_feature_columns[i] for i in bad) or 'earlier seasons'})")
+        return None
+
+    # --- Warm-start LSTM ---
+    # The saved .keras file carries the optimizer state, so training resumes
+    # where the last run stopped. Fine-tune on the new season's sequences plus
+    # a replayed sample of older ones so earlier seasons are not forgotten.
+    X_seq, y_seq = cache.X_seq, cache.y_seq
+    is_new = season_mask(cache.seq_season_name, new_seasons)
+    if holdout_rows is not None:
+        is_new &= ~sequence_mask(cache, holdout_rows)
+    new_idx = np.flatnonzero(is_new)
+    old_idx = np.flatnonzero(~season_mask(cache.seq_season_name, new_seasons))
+    n_replay = min(len(old_idx), int(round(replay * len(new_idx))))
+    replay_idx = np.random.default_rng(42).choice(old_idx, n_replay, replace=False)
+    lstm_model = saved['lstm_model']
+    lstm_model.fit(memmap_dataset(X_seq, y_seq, np.concatenate([new_idx, replay_idx]), batch_size=32),
+                   epochs=epochs, verbose=1)
+
+    # --- Continue boosting XGBoost on the new rows ---
+    rows, X, y = stacking_inputs(cache, lstm_model)
+    keep = season_mask(cache.season_name[rows], new_seasons)
+    if holdout_rows is not None:
+        keep &= ~np.isin(rows, holdout_rows)
+    # The lstm_prediction column is a model output, not data; only the input
+    # features have to stay inside the fitted range
+    bad = scaler_covers(saved['feature_scaler_xgb'], X[keep][:, :len(lstm_feature_columns)])
+    if len(bad):
+        print(f"⚠️ XGBoost scaler range exceeded ({', '.join(lstm_feature_columns[i] for i in bad)})")
+        return None
+    X_scaled = saved['feature_scaler_xgb'].transform(X[keep])
+    xgb_model = xgb.XGBRegressor(**{**XGB_PARAMS, 'n_estimators': new_trees})
+    xgb_model.fit(X_scaled, y[keep], xgb_model=saved['xgb_model'].get_booster())
+    return {'lstm_model': lstm_model, 'xgb_model': xgb_model,
+            'feature_scaler_lstm': saved['feature_scaler_lstm'], 'feature_scaler_xgb': saved['feature_scaler_xgb']}
+
+def evaluate(models, cache, eval_rows):
+    rows, X, y = stacking_inputs(cache, models['lstm_model'])
+    mask = np.isin(rows, eval_rows)
+    pred = models['xgb_model'].predict(models['feature_scaler_xgb'].transform(X[mask]))
+    return {'rows': int(mask.sum()),
+            'rmse_log': float(np.sqrt(np.mean((pred - y[mask]) ** 2))),
+            'mae_eur': float(np.mean(np.abs(np.expm1(pred) - np.expm1(y[mask]))))}
+
+def load_models(saved_dir=SAVED_DIR):
+    xgb_model = xgb.XGBRegressor()
+    xgb_model.load_model(os.path.join(saved_dir, "stacked_xgboost_model.json"))
+    with open(os.path.join(saved_dir, "lstm_feature_scaler.pkl"), "rb") as f:
+        feature_scaler_lstm = pickle.load(f)
+    with open(os.path.join(saved_dir, "xgb_feature_scaler.pkl"), "rb") as f:
+        feature_scaler_xgb = pickle.load(f)
+    return {'lstm_model': tf.keras.models.load_model(os.path.join(saved_dir, "lstm_model.keras")),
+            'xgb_model': xgb_model,
+            'feature_scaler_lstm': feature_scaler_lstm, 'feature_scaler_xgb': feature_scaler_xgb}
+
+def load_state(saved_dir=SAVED_DIR):
+    path = os.path.join(saved_dir, STATE_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+def save_models(models, cache, mode, saved_dir=SAVED_DIR):
     # --- Save models & scalers ---
-    os.makedirs(os.path.join(BASE_DIR,"saved_models"), exist_ok=True)
-    xgb_model.save_model(os.path.join(BASE_DIR,"saved_models","stacked_xgboost_model.json"))
-    lstm_model.save(os.path.join(BASE_DIR,"saved_models","lstm_model.keras"))
-
-    with open(os.path.join(BASE_DIR,"saved_models","lstm_feature_scaler.pkl"), "wb") as f:
-        pickle.dump(feature_scaler_lstm, f)
-    with open(os.path.join(BASE_DIR,"saved_models","xgb_feature_scaler.pkl"), "wb") as f:
-        pickle.dump(feature_scaler_xgb, f)
-    with open(os.path.join(BASE_DIR,"saved_models","features.json"), "w") as f:
+    final_feature_columns = lstm_feature_columns + ['lstm_prediction']
+    os.makedirs(saved_dir, exist_ok=True)
+    models['xgb_model'].save_model(os.path.join(saved_dir,"stacked_xgboost_model.json"))
+    models['lstm_model'].save(os.path.join(saved_dir,"lstm_model.keras"))
+
+    with open(os.path.join(saved_dir,"lstm_feature_scaler.pkl"), "wb") as f:
+        pickle.dump(models['feature_scaler_lstm'], f)
+    with open(os.path.join(saved_dir,"xgb_feature_scaler.pkl"), "wb") as f:
+        pickle.dump(models['feature_scaler_xgb'], f)
+    with open(os.path.join(saved_dir,"features.json"), "w") as f:
         json.dump(final_feature_columns, f)
+    # Seasons the saved models have seen; the next --incremental run trains on the rest
+    with open(os.path.join(saved_dir, STATE_FILE), "w") as f:
+        json.dump({'seasons': sorted(np.unique(cache.season_name.astype(str)).tolist()),
+                   'mode': mode, 'xgb_trees': models['xgb_model'].get_booster().num_boosted_rounds(),
+                   'dataset': os.path.basename(cache.cache_dir),
+                   'trained_at': time.strftime("%Y-%m-%dT%H:%M:%S")}, f, indent=2)
+
+def run_incremental(cache, args):
+    state = load_state()
+    if args.new_seasons:
+        new_seasons = args.new_seasons.split(",")
+    elif state is not None:
+        new_seasons = sorted(set(np.unique(cache.season_name.astype(str))) - set(state['seasons']))
+    else:
+        print(f"Error: no {STATE_FILE} in saved_models; pass --new-seasons")
+        exit()
+    if not new_seasons:
+        print("No new seasons since the last training run. Nothing to do.")
+        return
+    print(f"New seasons: {', '.join(new_seasons)}")
+
+    # Validation rows come from the new seasons and are kept out of every fit
+    # below, so incremental and full retrain are scored on the same unseen rows
+    new_rows = np.flatnonzero(season_mask(cache.season_name, new_seasons))
+    holdout_rows = None
+    if args.compare:
+        rng = np.random.default_rng(42)
+        holdout_rows = np.sort(rng.choice(new_rows, max(1, int(len(new_rows) * args.holdout)), replace=False))
+
+    previous = load_models()
+    report = {'new_seasons': new_seasons}
+    if args.compare:
+        report['previous'] = evaluate(previous, cache, holdout_rows)
+
+    start = time.perf_counter()
+    models = train_incremental(cache, previous, new_seasons, epochs=args.incremental_epochs,
+                               new_trees=args.new_trees, replay=args.replay, holdout_rows=holdout_rows)
+    mode = 'incremental'
+    if models is None:
+        print("Falling back to a full retrain")
+        mode = 'full'
+        models = train_full(cache, epochs=args.epochs, holdout_rows=holdout_rows)
+    report[mode] = {'seconds': time.perf_counter() - start}
+
+    if args.compare:
+        report[mode].update(evaluate(models, cache, holdout_rows))
+        if mode == 'incremental':
+            start = time.perf_counter()
+            full = train_full(cache, epochs=args.epochs, holdout_rows=holdout_rows)
+            report['full'] = {'seconds': time.perf_counter() - start, **evaluate(full, cache, holdout_rows)}
+        print(f"\n{'':<12}{'seconds':>10}{'rmse(log)':>12}{'mae(eur)':>14}")
+        for name in ('previous', 'incremental', 'full'):
+            if name in report:
+                r = report[name]
+                print(f"{name:<12}{r.get('seconds', float('nan')):>10.1f}{r['rmse_log']:>12.4f}{r['mae_eur']:>14,.0f}")
+        with open(os.path.join(SAVED_DIR, "retrain_report.json"), "w") as f:
+            json.dump(report, f, indent=2)
+
+    save_models(models, cache, mode)
+    print(f"✅ {mode.capitalize()} models saved ({report[mode]['seconds']:.1f} s)")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train the stacked LSTM + XGBoost model")
+    parser.add_argument("--epochs", type=int, default=50)
+    parser.add_argument("--incremental", action="store_true",
+                        help="update saved_models with the seasons added since the last run")
+    parser.add_argument("--new-seasons", default=None, help="comma-separated seasons to train on (default: from training_state.json)")
+    parser.add_argument("--incremental-epochs", type=int, default=5)
+    parser.add_argument("--new-trees", type=int, default=100, help="boosting rounds added to the XGBoost model")
+    parser.add_argument("--replay", type=float, default=1.0, help="old sequences replayed per new one in the LSTM fine-tune")
+    parser.add_argument("--compare", action="store_true",
+                        help="also run a full retrain and report time and validation error for both")
+    parser.add_argument("--holdout", type=float, default=0.2, help="share of new-season rows held out for --compare")
+    args = parser.parse_args()
+
+    if not os.path.exists(dataset_path):
+        print(f"Error: Dataset not found at {dataset_path}")
+        exit()
+    cache = load_training_cache()
+    print("✅ Dataset loaded successfully!")
+    if len(cache.X_seq) == 0:
+        print("Not enough data for sequences. Exiting.")
+        exit()
 
-    print("✅ Models and scalers saved successfully!")
+    if args.incremental:
+        run_incremental(cache, args)
+    else:
+        save_models(train_full(cache, epochs=args.epochs), cache, 'full')
+        print("✅ Models and scalers saved successfully!")
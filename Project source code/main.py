@@ -1,9 +1,23 @@
-from fastapi import FastAPI, HTTPException
+import time
+_T_IMPORT = time.perf_counter()
+
+from fastapi import Body, FastAPI, HTTPException
+from fastapi.responses import Response
+import numpy as np
 import pandas as pd
 import joblib
 import os
+import sys
+import threading
 from fastapi.middleware.cors import CORSMiddleware
 
+# Shared serving helpers live at the repository root
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from microbatch import MicroBatcher
+from prediction_cache import PredictionCache, file_version
+from feature_schema import load_manifest, manifest_path_for
+from columnar import CONTENT_TYPE, PASSTHROUGH, feature_columns, read_table, write_table
+
 app = FastAPI(title="TransferIQ API")
 
 # Allow CORS for frontend (adjust origins as needed)
@@ -15,41 +29,135 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Load Decision Tree model
+# Load Decision Tree model. MODEL_ENGINE=arrays serves the NumPy node tables
+# compiled by tree_engine.py (decision_tree_regressor_model.npz) without sklearn.
+MODEL_ENGINE = os.environ.get("MODEL_ENGINE", "sklearn")
 MODEL_PATH = os.path.join(os.path.dirname(__file__), "../model/decision_tree_regressor_model.pkl")
+if MODEL_ENGINE == "arrays":
+    MODEL_PATH = os.path.splitext(MODEL_PATH)[0] + ".npz"
 
 if not os.path.exists(MODEL_PATH):
     raise FileNotFoundError(f"Model file not found at {MODEL_PATH}")
 
-model = joblib.load(MODEL_PATH)
+def load_model():
+    if MODEL_ENGINE == "arrays":
+        from tree_engine import TreeEnsemble
+        return TreeEnsemble.load(MODEL_PATH)
+    return joblib.load(MODEL_PATH)
+
+# Keys are the rounded model input row plus the model file's content hash
+prediction_cache = PredictionCache(
+    max_entries=int(os.environ.get("PREDICTION_CACHE_SIZE", 100_000)),
+    ttl_seconds=float(os.environ.get("PREDICTION_CACHE_TTL_S", 3600)),
+    precision=int(os.environ.get("PREDICTION_CACHE_PRECISION", 6)),
+)
+
+# The model is loaded on first use (or at startup with EAGER_MODEL_LOAD=1)
+model = None
+_model_lock = threading.Lock()
+startup_report = {"model_engine": MODEL_ENGINE, "model_load_ms": None}
+
+def get_model():
+    global model
+    if model is None:
+        with _model_lock:
+            if model is None:
+                start = time.perf_counter()
+                loaded = load_model()
+                prediction_cache.set_model_version(file_version(MODEL_PATH))
+                startup_report["model_load_ms"] = round((time.perf_counter() - start) * 1000, 2)
+                model = loaded
+    return model
 
-# Load feature names
-X_val = pd.read_csv(os.path.join(os.path.dirname(__file__), "../data/X_val_new.csv"))
-FEATURES = X_val.columns.tolist()
+# Load feature names from the schema manifest written by feature_schema.py,
+# falling back to just the header row of the validation file
+_t = time.perf_counter()
+MANIFEST_PATH = manifest_path_for(MODEL_PATH)
+if os.path.exists(MANIFEST_PATH):
+    manifest = load_manifest(MANIFEST_PATH)
+    FEATURES = [f["name"] for f in manifest["features"]]
+    DEFAULTS = {f["name"]: f["default"] for f in manifest["features"]}
+    startup_report["feature_source"] = os.path.basename(MANIFEST_PATH)
+else:
+    FEATURES = pd.read_csv(os.path.join(os.path.dirname(__file__), "../data/X_val_new.csv"), nrows=0).columns.tolist()
+    DEFAULTS = dict.fromkeys(FEATURES, 0)
+    startup_report["feature_source"] = "X_val_new.csv header"
+startup_report["n_features"] = len(FEATURES)
+startup_report["feature_load_ms"] = round((time.perf_counter() - _t) * 1000, 2)
+startup_report["import_ms"] = round((time.perf_counter() - _T_IMPORT) * 1000, 2)
+
+@app.on_event("startup")
+def warm_model():
+    if os.environ.get("EAGER_MODEL_LOAD") == "1":
+        get_model()
+    startup_report["ready_ms"] = round((time.perf_counter() - _T_IMPORT) * 1000, 2)
+    print(f"TransferIQ API startup: {startup_report}")
 
 @app.get("/")
 def home():
     return {"message": "TransferIQ API (Decision Tree) is running successfully"}
 
-@app.post("/predict")
-def predict(data: dict):
-    try:
-        input_df = pd.DataFrame([data])
+def predict_rows(rows):
+    # Fill missing features with their manifest defaults, in the model's column order;
+    # to_numpy(dtype=float) below does the numeric conversion
+    input_df = pd.DataFrame([[row.get(col, DEFAULTS[col]) for col in FEATURES] for row in rows], columns=FEATURES)
 
-        # Fill missing features with 0 for model compatibility
-        for col in FEATURES:
-            if col not in input_df.columns:
-                input_df[col] = 0
+    predictor = get_model()
+    return prediction_cache.predict(input_df.to_numpy(dtype=float), predictor.predict)
 
-        # Ensure correct column order
-        input_df = input_df[FEATURES]
+# Concurrent /predict calls are coalesced into one model call per micro-batch
+batcher = MicroBatcher(
+    predict_rows,
+    max_batch_size=int(os.environ.get("MICROBATCH_MAX_SIZE", 64)),
+    max_wait_ms=float(os.environ.get("MICROBATCH_MAX_WAIT_MS", 2.0)),
+)
 
-        # Convert all columns to numeric if possible (for one-hot and numeric features)
-        input_df = input_df.apply(pd.to_numeric, errors='ignore')
+@app.on_event("shutdown")
+async def stop_batcher():
+    await batcher.stop()
 
-        prediction = model.predict(input_df)[0]
+@app.post("/predict")
+async def predict(data: dict):
+    try:
+        prediction = await batcher.submit(data)
 
         return {"predicted_transfer_value": round(float(prediction), 2)}
 
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
+
+@app.post("/predict/batch/arrow")
+def predict_batch_arrow(body: bytes = Body(..., media_type=CONTENT_TYPE)):
+    # Arrow IPC batch (columnar.py): one column per model feature, missing
+    # ones filled with their defaults; answers with a predicted_transfer_value column
+    try:
+        table = read_table(body)
+        cols = feature_columns(table, FEATURES, DEFAULTS)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    X_input = np.column_stack([cols[col] for col in FEATURES])
+    out = {col: table.column(col) for col in PASSTHROUGH if col in table.column_names}
+    out["predicted_transfer_value"] = prediction_cache.predict(X_input, get_model().predict) if len(X_input) else np.empty(0)
+    return Response(content=write_table(out), media_type=CONTENT_TYPE)
+
+@app.get("/metrics/batching")
+def batching_metrics():
+    return batcher.stats()
+
+@app.get("/metrics/startup")
+def startup_metrics():
+    return startup_report
+
+@app.get("/metrics/cache")
+def cache_metrics():
+    return prediction_cache.stats()
+
+@app.post("/model/reload")
+def reload_model():
+    global model
+    with _model_lock:
+        model = load_model()
+        # A new model version invalidates every cached prediction
+        prediction_cache.set_model_version(file_version(MODEL_PATH))
+    return {"model_version": prediction_cache.model_version}
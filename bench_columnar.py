@@ -0,0 +1,65 @@
+# bench_columnar.py
+# JSON vs Arrow IPC batch scoring: payload size and server CPU per request.
+#
+# Sends the same players to /predict/batch (JSON list of PlayerData) and to
+# /predict/batch/arrow (columnar.py) through the app in-process, with the
+# prediction cache cleared before every request so both paths score every
+# row, and checks the two give the same predictions. Request bodies are
+# encoded up front, so the CPU time is the app's decode, validation, feature
+# and model work plus response encoding.
+#
+#   python bench_columnar.py --rows 100,1000,10000 --repeat 5
+import argparse
+import json
+import time
+
+import numpy as np
+from fastapi.testclient import TestClient
+
+import main
+from bench_predict import random_players
+from columnar import CONTENT_TYPE, read_table, write_table
+
+
+def run(client, path, body, headers, repeat):
+    cpu, wall = [], []
+    for _ in range(repeat):
+        main.prediction_cache.clear()
+        cpu_start, wall_start = time.process_time(), time.perf_counter()
+        response = client.post(path, content=body, headers=headers)
+        cpu.append(time.process_time() - cpu_start)
+        wall.append(time.perf_counter() - wall_start)
+        response.raise_for_status()
+    return response, np.median(cpu) * 1000, np.median(wall) * 1000
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", default="100,1000,10000")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    client = TestClient(main.app)
+    print(f"{'rows':>8}{'format':>8}{'request KB':>12}{'response KB':>13}{'cpu ms':>10}{'wall ms':>10}")
+    for n in [int(r) for r in args.rows.split(",")]:
+        records = [p.dict() for p in random_players(n)]
+        json_body = json.dumps(records).encode()
+        arrow_body = write_table({col: np.array([r[col] for r in records], dtype=np.float64)
+                                  for col in main.RAW_FEATURES})
+
+        json_response, json_cpu, json_wall = run(client, "/predict/batch", json_body,
+                                                 {"Content-Type": "application/json"}, args.repeat)
+        arrow_response, arrow_cpu, arrow_wall = run(client, "/predict/batch/arrow", arrow_body,
+                                                    {"Content-Type": CONTENT_TYPE}, args.repeat)
+        for name, body, response, cpu, wall in [
+            ("json", json_body, json_response, json_cpu, json_wall),
+            ("arrow", arrow_body, arrow_response, arrow_cpu, arrow_wall),
+        ]:
+            print(f"{n:>8}{name:>8}{len(body) / 1e3:>12,.1f}{len(response.content) / 1e3:>13,.1f}"
+                  f"{cpu:>10.1f}{wall:>10.1f}")
+        print(f"{'':>8}{'':>8}{len(json_body) / len(arrow_body):>11.1f}x{'':>13}{json_cpu / arrow_cpu:>9.1f}x")
+
+        json_pred = np.array(json_response.json()["predicted_values"])
+        arrow_pred = read_table(arrow_response.content).column("predicted_value").to_numpy()
+        assert np.allclose(json_pred, arrow_pred, rtol=1e-12), "Arrow path diverges from the JSON path"
+    print("✅ Predictions match")
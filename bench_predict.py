@@ -0,0 +1,72 @@
+# bench_predict.py
+# Micro-benchmark for /predict: compares the compiled NumPy row path with the
+# original one-row DataFrame path and checks both give the same predictions.
+#
+#   python bench_predict.py --n 2000
+import argparse
+import time
+
+import numpy as np
+
+from main import PlayerData, RAW_FEATURES, build_feature_row, model, predict_market_value_frame
+
+
+def random_players(n, seed=42):
+    rng = np.random.default_rng(seed)
+    values = rng.uniform(0, 1, size=(n, len(RAW_FEATURES)))
+    scale = {
+        'age': (16, 40), 'most_recent_transfer_fee': (0, 1e8), 'total_career_goals': (0, 300),
+        'total_career_assists': (0, 200), 'days_since_joined': (0, 4000), 'total_transfers': (0, 12),
+        'vader_polarity': (-1, 1), 'tb_polarity': (-1, 1), 'num_unique_teammates': (0, 600),
+        'total_career_minutes_played': (0, 60000), 'total_value_at_transfer': (0, 2e8),
+        'remaining_contract_duration': (0, 2000), 'days_since_last_transfer': (0, 5000),
+        'total_career_matches': (0, 800), 'total_transfer_fees': (0, 3e8),
+        'citizenship_freq_encoded': (0, 1), 'club_prestige': (0, 1),
+    }
+    players = []
+    for row in values:
+        fields = {}
+        for col, v in zip(RAW_FEATURES, row):
+            lo, hi = scale.get(col, (0, 1))
+            fields[col] = float(lo + v * (hi - lo))
+        players.append(PlayerData(**fields))
+    return players
+
+
+def time_path(fn, players):
+    timings = np.empty(len(players))
+    results = np.empty(len(players))
+    for i, p in enumerate(players):
+        start = time.perf_counter()
+        results[i] = fn(p)
+        timings[i] = time.perf_counter() - start
+    return timings * 1e6, results
+
+
+def predict_row(p):
+    return float(np.expm1(model.predict(build_feature_row(p)))[0])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n", type=int, default=2000)
+    parser.add_argument("--warmup", type=int, default=50)
+    args = parser.parse_args()
+
+    players = random_players(args.n)
+    for p in players[:args.warmup]:
+        predict_row(p)
+        predict_market_value_frame(p)
+
+    frame_us, frame_pred = time_path(predict_market_value_frame, players)
+    row_us, row_pred = time_path(predict_row, players)
+
+    print(f"{'path':<12}{'p50 (us)':>12}{'p99 (us)':>12}")
+    for name, t in [("dataframe", frame_us), ("numpy row", row_us)]:
+        print(f"{name:<12}{np.percentile(t, 50):>12.1f}{np.percentile(t, 99):>12.1f}")
+    print(f"speed-up p50: {np.percentile(frame_us, 50) / np.percentile(row_us, 50):.1f}x")
+
+    max_diff = np.max(np.abs(frame_pred - row_pred) / np.maximum(np.abs(frame_pred), 1.0))
+    print(f"max relative difference: {max_diff:.2e}")
+    assert np.allclose(frame_pred, row_pred, rtol=1e-9), "NumPy row path diverges from DataFrame path"
+    print("✅ Predictions match")
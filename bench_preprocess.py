@@ -0,0 +1,169 @@
+# bench_preprocess.py
+# Runtime and peak memory of the notebook preprocessing chain vs
+# preprocess_pipeline.py on a synthetic merged table.
+#
+# The chain is the notebooks' own code cells run in order in a scratch folder,
+# CSV hand-offs included; each side runs in its own process so peak RSS is
+# measured separately.
+#
+#   python bench_preprocess.py --rows 500000
+import argparse
+import contextlib
+import io
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# (notebook, code cells) in the order they were run; cells that only display
+# something are left out
+CHAIN = [
+    ("missing.ipynb", [0, 1, 3, 4, 5, 8, 9, 10, 11, 12, 13, 14]),
+    ("detect_outliers.ipynb", [1, 2, 3, 4, 5]),
+    ("preprocessing.ipynb", [1, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 16]),
+    ("formatting copy.ipynb", [0]),
+]
+
+
+def synthetic_merged(n_rows, seed=42):
+    rng = np.random.default_rng(seed)
+
+    def dates(start, span_days, missing=0.05):
+        values = pd.Timestamp(start) + pd.to_timedelta(rng.integers(0, span_days, n_rows), unit="D")
+        values = pd.Series(values.strftime("%Y-%m-%d"))
+        return values.mask(rng.random(n_rows) < missing)
+
+    def counts(high, missing=0.02):
+        return pd.Series(rng.integers(0, high, n_rows).astype(float)).mask(rng.random(n_rows) < missing)
+
+    def pick(values, missing=0.03):
+        return pd.Series(rng.choice(values, n_rows)).mask(rng.random(n_rows) < missing)
+
+    positions = ["Attack", "Defender", "Goalkeeper", "Midfield", "Attack - Centre-Forward",
+                 "Defender - Centre-Back", "Midfield - Central Midfield"]
+    df = pd.DataFrame({
+        "player_id": rng.integers(1, n_rows // 10 + 2, n_rows),
+        "player_name": pd.Series(rng.integers(0, n_rows // 10 + 2, n_rows)).map("Player {}".format),
+        "country_of_birth": pick(["Spain", "France", "Brazil"]),
+        "citizenship": pick(["Spain", "France", "Brazil", "England", "Germany", "  Argentina "]),
+        "date_of_birth": dates("1980-01-01", 9000),
+        "position": pick(positions),
+        "main_position": pick(positions),
+        "foot": pick(["right", "left", "both", " Right"]),
+        "height": pd.Series(rng.normal(181, 8, n_rows)).mask(rng.random(n_rows) < 0.05),
+        "joined": dates("2010-01-01", 4000),
+        "contract_expires": dates("2020-01-01", 2500),
+        "is_eu": rng.integers(0, 2, n_rows).astype(bool),
+        "date_unix": dates("2015-01-01", 3000, missing=0.01),
+        "value": pd.Series(rng.lognormal(14, 1.5, n_rows)).mask(rng.random(n_rows) < 0.05),
+        "team_name": pick([f"Team {i}" for i in range(200)]),
+        "competition_name": pick([f"League {i}" for i in range(30)]),
+        "season_name": pick(["18/19", "19/20", "20/21", "21/22", "98/99"], missing=0),
+        "game_date": dates("2015-01-01", 3000),
+        "nb_in_group": counts(25), "nb_on_pitch": counts(25),
+        "goals": counts(6), "assists": counts(4), "own_goals": counts(2),
+        "subed_in": counts(6), "subed_out": counts(6), "yellow_cards": counts(4),
+        "second_yellow_cards": counts(2), "direct_red_cards": counts(2), "penalty_goals": counts(3),
+        "minutes_played": counts(500), "goals_conceded": counts(8), "clean_sheets": counts(4),
+        "injury_reason": pick(["Knee injury", "Hamstring", "no injury", "None"], missing=0.3),
+        "from_date": dates("2015-01-01", 3000), "end_date": dates("2015-01-01", 3000),
+        "days_missed": counts(400, missing=0.3), "games_missed": counts(30, missing=0.3),
+        "when": dates("2015-01-01", 3000),
+        "tweet_date": dates("2015-01-01", 3000, missing=0.1),
+        "text": pd.Series(rng.integers(0, 1000, n_rows)).map(lambda i: f"great match today by player {i} " * 3),
+        "vader_polarity": pd.Series(rng.uniform(-1, 1, n_rows)).mask(rng.random(n_rows) < 0.1),
+        "vader_emotion": pick(["positive", "negative", "neutral"], missing=0.1),
+        "tb_polarity": pd.Series(rng.uniform(-1, 1, n_rows)).mask(rng.random(n_rows) < 0.1),
+        "tb_emotion": pick(["positive", "negative", "neutral"], missing=0.1),
+    })
+    return df
+
+
+def notebook_cells():
+    cells = []
+    for notebook, indexes in CHAIN:
+        with open(os.path.join(BASE_DIR, notebook)) as f:
+            code = [c for c in json.load(f)["cells"] if c["cell_type"] == "code"]
+        cells.extend((notebook, i, "".join(code[i]["source"])) for i in indexes)
+    return cells
+
+
+def run_chain(workdir):
+    os.chdir(workdir)
+    namespace = {}
+    start = time.perf_counter()
+    for notebook, index, source in notebook_cells():
+        if notebook == "formatting copy.ipynb":
+            # formatting copy.ipynb starts from the preprocessing output under another name
+            shutil.copy("final_preprocess_data.csv", "preprocessed_data.csv")
+        with contextlib.redirect_stdout(io.StringIO()):
+            exec(compile(source, f"{notebook}[{index}]", "exec"), namespace)
+    return time.perf_counter() - start
+
+
+def measure(cmd):
+    out = subprocess.run(cmd, check=True, capture_output=True, text=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Notebook chain vs streaming preprocessing pipeline")
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--chunksize", type=int, default=100_000)
+    parser.add_argument("--workdir", default=None)
+    parser.add_argument("--child-chain", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child_chain:
+        seconds = run_chain(args.child_chain)
+        print(json.dumps({"seconds": seconds,
+                          "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}))
+        return
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="bench_preprocess_")
+    os.makedirs(workdir, exist_ok=True)
+    raw = os.path.join(workdir, "final_merged_date.csv")
+    synthetic_merged(args.rows).to_csv(raw, index=False)
+    print(f"{args.rows:,} rows, {os.path.getsize(raw) / 1e6:,.0f} MB raw CSV in {workdir}")
+
+    chain = measure([sys.executable, os.path.abspath(__file__), "--child-chain", workdir])
+    pipeline = measure([sys.executable, os.path.join(BASE_DIR, "preprocess_pipeline.py"), raw,
+                        os.path.join(workdir, "formatted_data.parquet"), "--chunksize", str(args.chunksize), "--json"])
+
+    print("\npipeline stages:")
+    for name, seconds in pipeline["timings"].items():
+        print(f"  {name:<8}{seconds:>9.2f} s")
+    print(f"\n{'':<10}{'seconds':>10}{'peak RSS MB':>14}")
+    print(f"{'notebooks':<10}{chain['seconds']:>10.1f}{chain['peak_rss_mb']:>14,.0f}")
+    print(f"{'pipeline':<10}{pipeline['timings']['total']:>10.1f}{pipeline['peak_rss_mb']:>14,.0f}")
+
+    # Same rows, same columns, same values
+    expected = pd.read_csv(os.path.join(workdir, "formatted_data.csv"))
+    actual = pd.read_parquet(os.path.join(workdir, "formatted_data.parquet"))
+    shared = [c for c in expected.columns if c in actual.columns]
+    missing = sorted(set(expected.columns) - set(actual.columns))
+    diffs = {}
+    for col in shared:
+        a, e = actual[col], expected[col]
+        if pd.api.types.is_numeric_dtype(e) and pd.api.types.is_numeric_dtype(a):
+            mismatch = ~np.isclose(a.to_numpy(float), e.to_numpy(float), rtol=1e-6, atol=1e-6, equal_nan=True)
+        else:
+            mismatch = a.astype(str).to_numpy() != e.astype(str).to_numpy()
+        if mismatch.any():
+            diffs[col] = int(mismatch.sum())
+    print(f"\n{len(shared)} shared columns, {len(diffs)} differ: {diffs or ''}")
+    if missing:
+        print(f"columns only in the notebook output: {missing}")
+
+
+if __name__ == "__main__":
+    main()
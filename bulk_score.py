@@ -0,0 +1,177 @@
+# bulk_score.py
+# Out-of-core bulk scoring for the full player database.
+#
+# Streams a CSV or Parquet file in fixed-size chunks, applies the same
+# feature engineering and gold_features selection as /predict (features.py),
+# scores chunks across a process pool and writes one output part per chunk as
+# soon as it is ready. Only a bounded number of chunks is in flight, so memory
+# stays flat however large the input is. A checkpoint file lists the finished
+# parts, so an interrupted run picks up where it stopped.
+#
+#   python bulk_score.py players.parquet scores/ --id-cols player_id,season_name
+#   python bulk_score.py players.csv scores/ --chunk-rows 200000 --workers 8 --verify 1000
+import argparse
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+
+from features import RAW_FEATURES, compile_feature_row, engineer_features
+
+CHECKPOINT_NAME = "_checkpoint.json"
+
+_model = None
+
+
+def load_model(path):
+    if path.endswith(".npz"):
+        from tree_engine import TreeEnsemble
+        return TreeEnsemble.load(path)
+    import lightgbm as lgb
+    return lgb.Booster(model_file=path)
+
+
+def _init_worker(model_path):
+    global _model
+    # Each pool process scores with a single thread; the pool is the parallelism.
+    # Workers are spawned, so this runs before lightgbm is imported here.
+    os.environ.setdefault("OMP_NUM_THREADS", "1")
+    _model = load_model(model_path)
+
+
+def score_frame(df, model):
+    X_input = engineer_features(df[RAW_FEATURES].astype(np.float64))
+    # Predict (Inverse log transform as used in notebook)
+    return np.expm1(model.predict(X_input))
+
+
+def _score_chunk(index, df, id_cols, out_dir, fmt):
+    start = time.perf_counter()
+    out = df[id_cols].copy() if id_cols else pd.DataFrame(index=df.index)
+    out["predicted_value"] = score_frame(df, _model)
+    path = os.path.join(out_dir, f"part-{index:05d}.{fmt}")
+    tmp = path + ".tmp"
+    if fmt == "parquet":
+        out.to_parquet(tmp, index=False)
+    else:
+        out.to_csv(tmp, index=False)
+    # Rename last so a crash never leaves a half-written part behind
+    os.replace(tmp, path)
+    return index, len(out), time.perf_counter() - start
+
+
+def iter_chunks(path, chunk_rows, columns):
+    if path.endswith(".parquet"):
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_rows, columns=columns):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, chunksize=chunk_rows, usecols=columns)
+
+
+def load_checkpoint(out_dir, config):
+    path = os.path.join(out_dir, CHECKPOINT_NAME)
+    if not os.path.exists(path):
+        return set()
+    with open(path) as f:
+        state = json.load(f)
+    if state.get("config") != config:
+        raise SystemExit(f"Checkpoint in {out_dir} was written with different settings; "
+                         "use a new output directory or delete the checkpoint")
+    return set(state["done"])
+
+
+def save_checkpoint(out_dir, config, done):
+    path = os.path.join(out_dir, CHECKPOINT_NAME)
+    with open(path + ".tmp", "w") as f:
+        json.dump({"config": config, "done": sorted(done)}, f)
+    os.replace(path + ".tmp", path)
+
+
+def verify_against_predict(path, model_path, id_cols, n_rows):
+    # Row-for-row parity with /predict, which uses the compiled single-row path
+    model = load_model(model_path)
+    build_row = compile_feature_row()
+    df = next(iter_chunks(path, n_rows, RAW_FEATURES + id_cols))
+    bulk = score_frame(df, model)
+    single = np.array([
+        np.expm1(model.predict(build_row(SimpleNamespace(**row))))[0]
+        for row in df[RAW_FEATURES].astype(np.float64).to_dict("records")
+    ])
+    max_rel = float(np.max(np.abs(bulk - single) / np.maximum(np.abs(single), 1.0)))
+    print(f"verify: {len(df)} rows, max relative difference vs /predict path {max_rel:.2e}")
+    return max_rel
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stream-score a player table with the serving model")
+    parser.add_argument("input", help="CSV or Parquet file with the PlayerData columns")
+    parser.add_argument("out_dir")
+    parser.add_argument("--model", default="lightgbm_model.txt", help=".txt booster or tree_engine .npz")
+    parser.add_argument("--chunk-rows", type=int, default=100_000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--max-pending", type=int, default=None,
+                        help="chunks in flight at once (default: 2 per worker); bounds memory")
+    parser.add_argument("--id-cols", default="", help="comma-separated columns copied to the output")
+    parser.add_argument("--format", choices=["parquet", "csv"], default="parquet")
+    parser.add_argument("--verify", type=int, default=0, help="check the first N rows against the /predict path")
+    args = parser.parse_args()
+
+    id_cols = [c for c in args.id_cols.split(",") if c]
+    max_pending = args.max_pending or 2 * args.workers
+    os.makedirs(args.out_dir, exist_ok=True)
+
+    if args.verify:
+        if verify_against_predict(args.input, args.model, id_cols, args.verify) > 1e-9:
+            raise SystemExit("❌ Bulk scores diverge from /predict")
+
+    config = {"input": os.path.abspath(args.input), "model": os.path.abspath(args.model),
+              "chunk_rows": args.chunk_rows, "id_cols": id_cols, "format": args.format}
+    done = load_checkpoint(args.out_dir, config)
+    if done:
+        print(f"Resuming: {len(done)} chunks already scored")
+
+    start = time.perf_counter()
+    rows_scored = 0
+    last_report = start
+    pending = set()
+
+    def collect(finished):
+        nonlocal rows_scored, last_report
+        for future in finished:
+            index, n, _ = future.result()
+            done.add(index)
+            rows_scored += n
+        save_checkpoint(args.out_dir, config, done)
+        now = time.perf_counter()
+        if now - last_report >= 5:
+            print(f"  {len(done)} chunks, {rows_scored:,} rows this run, "
+                  f"{rows_scored / (now - start):,.0f} rows/s")
+            last_report = now
+
+    # Spawned (not forked) workers: the parent may already have run OpenMP
+    # code in --verify, and forking after that is not safe
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker, initargs=(args.model,),
+                             mp_context=multiprocessing.get_context("spawn")) as pool:
+        for index, chunk in enumerate(iter_chunks(args.input, args.chunk_rows, RAW_FEATURES + id_cols)):
+            if index in done:
+                continue
+            if len(pending) >= max_pending:
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                collect(finished)
+            pending.add(pool.submit(_score_chunk, index, chunk, id_cols, args.out_dir, args.format))
+        if pending:
+            collect(wait(pending)[0])
+
+    elapsed = time.perf_counter() - start
+    rate = rows_scored / elapsed if elapsed else 0.0
+    print(f"✅ {rows_scored:,} rows in {elapsed:.1f} s ({rate:,.0f} rows/s) -> {args.out_dir}")
+
+
+if __name__ == "__main__":
+    main()
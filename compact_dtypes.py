@@ -0,0 +1,135 @@
+# compact_dtypes.py
+# Schema-driven compact dtypes for the player dataset.
+#
+# The notebooks leave every column as int64 / float64 / object. Most of them do
+# not need it: the counts are capped to single digits in detect_outliers.ipynb,
+# the one-hot columns are 0/1, the polarities live in [-1, 1] and the text
+# columns repeat a handful of values. The schema below gives each column the
+# smallest dtype that holds its range, and the readers pass it straight to the
+# parser, so a frame is never materialised in the wide dtypes first.
+#
+#   python compact_dtypes.py final_handled_outlier.csv      # per-column memory report
+import argparse
+import fnmatch
+
+import numpy as np
+import pandas as pd
+
+# Exact column names
+SCHEMA = {
+    # Counts, capped in detect_outliers.ipynb / formatting copy.ipynb
+    'nb_in_group': 'uint8', 'nb_on_pitch': 'uint8', 'goals': 'uint8', 'assists': 'uint8',
+    'own_goals': 'uint8', 'subed_in': 'uint8', 'subed_out': 'uint8', 'yellow_cards': 'uint8',
+    'second_yellow_cards': 'uint8', 'direct_red_cards': 'uint8', 'penalty_goals': 'uint8',
+    'goals_conceded': 'uint8', 'clean_sheets': 'uint8', 'days_missed': 'uint16', 'games_missed': 'uint8',
+    'injury': 'uint8', 'is_eu': 'uint8',
+    'player_id': 'uint32',
+    # Continuous features; the target keeps full precision
+    'height': 'float32', 'minutes_played': 'float32',
+    'vader_polarity': 'float32', 'tb_polarity': 'float32',
+    'value': 'float64',
+    # Derived from the dates (preprocessing.ipynb)
+    'age': 'int16', 'contract_remaining_days': 'int32', 'days_since_joined': 'int32',
+    'days_since_game': 'int32', 'days_since_tweet': 'int32', 'contract_years_left': 'uint8',
+    'joined_year': 'uint16', 'joined_month': 'uint8', 'contract_expires_year': 'uint16',
+    'contract_expires_month': 'uint8', 'game_year': 'uint16', 'game_month': 'uint8',
+    'tweet_year': 'uint16', 'tweet_month': 'uint8', 'season': 'uint16',
+    'competition_name_freq': 'uint32', 'team_name_freq': 'uint32', 'citizenship_freq': 'uint32',
+    # Text
+    'player_name': 'category', 'citizenship': 'category', 'position': 'category', 'foot': 'category',
+    'team_name': 'category', 'competition_name': 'category', 'injury_reason': 'category',
+    'season_name': 'category', 'vader_emotion': 'category', 'tb_emotion': 'category',
+}
+
+# One-hot columns are named after their category, so they go by prefix
+PATTERNS = [
+    ('foot_*', 'uint8'), ('position_*', 'uint8'),
+    ('vader_emotion_*', 'uint8'), ('tb_emotion_*', 'uint8'),
+]
+
+DATE_COLUMNS = ['date_of_birth', 'joined', 'contract_expires', 'date_unix', 'game_date', 'tweet_date']
+
+# Nullable counterparts for files that still have gaps (before imputation)
+NULLABLE = {'uint8': 'UInt8', 'uint16': 'UInt16', 'uint32': 'UInt32', 'int16': 'Int16', 'int32': 'Int32'}
+
+
+def dtype_for(column, nullable=False):
+    dtype = SCHEMA.get(column)
+    if dtype is None:
+        dtype = next((d for pattern, d in PATTERNS if fnmatch.fnmatchcase(column, pattern)), None)
+    if dtype is not None and nullable:
+        dtype = NULLABLE.get(dtype, dtype)
+    return dtype
+
+
+def dtypes_for(columns, nullable=False):
+    return {col: dtype for col in columns if (dtype := dtype_for(col, nullable)) is not None}
+
+
+def read_csv(path, usecols=None, nullable=False, **kwargs):
+    # nullable=True for files that can still hold NaN in integer columns
+    columns = pd.read_csv(path, nrows=0).columns
+    if usecols is not None:
+        columns = [col for col in columns if col in usecols]
+    return pd.read_csv(path, usecols=usecols, dtype=dtypes_for(columns, nullable),
+                       parse_dates=[col for col in DATE_COLUMNS if col in columns], **kwargs)
+
+
+def read_parquet(path, columns=None):
+    # Files written by preprocess_pipeline.py already store the compact numeric
+    # types; text columns come back dictionary-encoded, i.e. as categoricals
+    import pyarrow.parquet as pq
+
+    names = pq.read_schema(path).names
+    text = [col for col in names if dtype_for(col) == 'category' and (columns is None or col in columns)]
+    return pq.read_table(path, columns=columns, read_dictionary=text).to_pandas()
+
+
+def apply_schema(df):
+    # For frames built in code (the preprocessing pipeline), with a range check
+    # so an out-of-range value fails loudly instead of wrapping around
+    for col in df.columns:
+        dtype = dtype_for(col)
+        if dtype is None or dtype == 'category' or str(df[col].dtype) == dtype:
+            continue
+        if np.dtype(dtype).kind in 'iu' and len(df[col]):
+            info = np.iinfo(dtype)
+            low, high = df[col].min(), df[col].max()
+            if low < info.min or high > info.max:
+                raise ValueError(f"{col}: values {low}..{high} do not fit {dtype}")
+        df[col] = df[col].astype(dtype)
+    return df
+
+
+def memory_report(wide, compact):
+    report = pd.DataFrame({
+        'dtype_before': wide.dtypes.astype(str),
+        'dtype_after': compact.dtypes.reindex(wide.columns).astype(str),
+        'bytes_before': wide.memory_usage(deep=True, index=False),
+        'bytes_after': compact.memory_usage(deep=True, index=False).reindex(wide.columns),
+    })
+    report['ratio'] = report['bytes_before'] / report['bytes_after']
+    return report.sort_values('bytes_before', ascending=False)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Per-column memory before and after the compact schema")
+    parser.add_argument("path", help="CSV or Parquet file of the player dataset")
+    parser.add_argument("--nullable", action="store_true", help="integer columns may contain gaps")
+    args = parser.parse_args()
+
+    if args.path.endswith(".parquet"):
+        wide = pd.read_parquet(args.path)
+        wide = wide.astype({col: 'int64' for col in wide.columns if wide[col].dtype.kind in 'iu'})
+        wide = wide.astype({col: 'float64' for col in wide.columns if wide[col].dtype.kind == 'f'})
+        wide = wide.astype({col: object for col in wide.columns if isinstance(wide[col].dtype, pd.CategoricalDtype)})
+        compact = read_parquet(args.path)
+    else:
+        wide = pd.read_csv(args.path)
+        compact = read_csv(args.path, nullable=args.nullable)
+
+    report = memory_report(wide, compact)
+    with pd.option_context('display.max_rows', None, 'display.width', 120):
+        print(report.to_string(formatters={'ratio': '{:.1f}x'.format}))
+    before, after = report['bytes_before'].sum(), report['bytes_after'].sum()
+    print(f"\nTotal: {before / 1e6:,.1f} MB -> {after / 1e6:,.1f} MB ({before / after:.1f}x smaller)")
@@ -0,0 +1,175 @@
+# encoders.py
+# Fitted categorical encoders, saved as one artifact (encoders.joblib).
+#
+# preprocessing.ipynb refits the OneHotEncoder for foot / position / the
+# emotions and recounts value_counts() over the whole file for the *_freq
+# columns (competition_name, team_name, citizenship) on every run, and main.py
+# has clients send citizenship_freq_encoded ready-made. Here every column keeps
+# a vocabulary (cleaned string -> code) and arrays indexed by code: the running
+# counts behind the frequency encoding and the slot of the category in the
+# one-hot block. Encoding one value is a dict lookup and an array read; new rows
+# only add their counts (update), history is never rescanned.
+#
+# One-hot blocks stay as fitted (they are model columns); a category first seen
+# in an update is counted but encodes to all zeros, like handle_unknown="ignore".
+#
+#   python encoders.py fit final_merged_date.csv --out encoders.joblib
+#   python encoders.py update new_rows.csv --encoders encoders.joblib
+import argparse
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from preprocess_pipeline import (CONSTANT_FILL, FREQUENCY_COLUMNS, FREQUENCY_MISSING, LOWER_COLUMNS,
+                                 MISSING_TOKENS, MODE_CATEGORICAL, ONE_HOT_COLUMNS, coerce_types, fit_stats)
+
+ENCODERS_NAME = "encoders.joblib"
+
+
+class FittedEncoders:
+    def __init__(self):
+        self.vocab = {}
+        self.counts = {}
+        self.slots = {}
+        self.categories = {}
+        self.fill = {}
+
+    # ---------------- Cleaning (as in preprocess_pipeline.py) ----------------
+    @staticmethod
+    def clean(col, value):
+        if value is None or (isinstance(value, float) and np.isnan(value)):
+            value = ''
+        value = str(value).strip()
+        if col in LOWER_COLUMNS:
+            value = value.lower()
+        if col in FREQUENCY_COLUMNS and value in FREQUENCY_MISSING:
+            return 'missing'
+        return value
+
+    def _clean_series(self, col, values):
+        values = coerce_types(pd.DataFrame({col: values}), None)[col]
+        # Gaps get the fill the encoders were fitted with, as impute() does
+        if col in MODE_CATEGORICAL:
+            values = values.mask(values.isna() | values.isin(MISSING_TOKENS), self.fill.get(col))
+        elif col in CONSTANT_FILL:
+            values = values.mask(values.isna() | values.isin(['nan', '', 'none']), CONSTANT_FILL[col])
+        if col in FREQUENCY_COLUMNS:
+            values = values.mask(values.isna() | values.isin(FREQUENCY_MISSING), 'missing')
+        return values.dropna()
+
+    # ---------------- Fitting ----------------
+    def _add(self, col, values, counts):
+        vocab = self.vocab.setdefault(col, {})
+        for value in values:
+            if value not in vocab:
+                vocab[value] = len(vocab)
+        grown = np.zeros(len(vocab), dtype=np.int64)
+        old = self.counts.get(col, grown[:0])
+        grown[:len(old)] = old
+        codes = np.fromiter((vocab[v] for v in values), dtype=np.int64, count=len(values))
+        np.add.at(grown, codes, np.asarray(counts, dtype=np.int64))
+        self.counts[col] = grown
+        slots = np.full(len(vocab), -1, dtype=np.int32)
+        for slot, category in enumerate(self.categories.get(col, [])):
+            if category in vocab:
+                slots[vocab[category]] = slot
+        self.slots[col] = slots
+
+    @classmethod
+    def from_stats(cls, stats):
+        # Same tables the pipeline encoded the training data with
+        encoders = cls()
+        encoders.fill = {col: stats['fill'][col] for col in MODE_CATEGORICAL}
+        for col in ONE_HOT_COLUMNS:
+            encoders.categories[col] = list(stats['categories'][col])
+            encoders._add(col, encoders.categories[col], np.zeros(len(encoders.categories[col])))
+        for col in FREQUENCY_COLUMNS:
+            freq = stats['frequency'][col]
+            encoders._add(col, list(freq), list(freq.values()))
+        return encoders
+
+    def update(self, df):
+        # Adds the counts of new rows; returns the categories not seen before
+        new = {}
+        for col in set(ONE_HOT_COLUMNS + FREQUENCY_COLUMNS):
+            if col not in df.columns:
+                continue
+            counts = self._clean_series(col, df[col]).value_counts()
+            unseen = [v for v in counts.index if v not in self.vocab.get(col, {})]
+            if unseen:
+                new[col] = unseen
+            self._add(col, counts.index.tolist(), counts.to_numpy())
+        return new
+
+    # ---------------- Lookups ----------------
+    def frequency(self, col, value):
+        code = self.vocab[col].get(self.clean(col, value))
+        return 0 if code is None else int(self.counts[col][code])
+
+    def one_hot_slot(self, col, value):
+        code = self.vocab[col].get(self.clean(col, value))
+        return -1 if code is None else int(self.slots[col][code])
+
+    def one_hot(self, col, value):
+        row = np.zeros(len(self.categories[col]), dtype=np.float64)
+        slot = self.one_hot_slot(col, value)
+        if slot >= 0:
+            row[slot] = 1.0
+        return row
+
+    def frequency_array(self, col, values):
+        codes = pd.Series(values).map(lambda v: self.vocab[col].get(self.clean(col, v), -1)).to_numpy()
+        # Code -1 reads the trailing zero
+        return np.append(self.counts[col], 0)[codes]
+
+    def as_stats(self):
+        # The pipeline's encode() tables, for preprocess_pipeline.py --encoders
+        return {
+            'frequency': {col: dict(zip(self.vocab[col], self.counts[col].tolist())) for col in FREQUENCY_COLUMNS},
+            'categories': {col: list(self.categories[col]) for col in ONE_HOT_COLUMNS},
+            'one_hot_columns': [f"{col}_{c}" for col in ONE_HOT_COLUMNS for c in self.categories[col]],
+        }
+
+
+def save_encoders(encoders, path=ENCODERS_NAME):
+    # Plain dicts and arrays, so the file loads without pickling the class
+    joblib.dump(vars(encoders), path)
+
+
+def load_encoders(path=ENCODERS_NAME):
+    encoders = FittedEncoders()
+    vars(encoders).update(joblib.load(path))
+    return encoders
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fit or update the categorical encoder tables")
+    sub = parser.add_subparsers(dest="command", required=True)
+    fit = sub.add_parser("fit", help="fit on a merged file with the pipeline's statistics pass")
+    fit.add_argument("input")
+    fit.add_argument("--out", default=ENCODERS_NAME)
+    fit.add_argument("--chunksize", type=int, default=200_000)
+    update = sub.add_parser("update", help="add the counts of new rows")
+    update.add_argument("input")
+    update.add_argument("--encoders", default=ENCODERS_NAME)
+    update.add_argument("--chunksize", type=int, default=200_000)
+    args = parser.parse_args()
+
+    if args.command == "fit":
+        encoders = FittedEncoders.from_stats(fit_stats(args.input, args.chunksize))
+        save_encoders(encoders, args.out)
+        sizes = ", ".join(f"{col} {len(vocab)}" for col, vocab in encoders.vocab.items())
+        print(f"✅ Encoders fitted ({sizes}) -> {args.out}")
+    else:
+        encoders = load_encoders(args.encoders)
+        usecols = lambda c: c in ONE_HOT_COLUMNS + FREQUENCY_COLUMNS
+        rows, new = 0, {}
+        for chunk in pd.read_csv(args.input, usecols=usecols, chunksize=args.chunksize):
+            rows += len(chunk)
+            for col, values in encoders.update(chunk).items():
+                new.setdefault(col, []).extend(values)
+        save_encoders(encoders, args.encoders)
+        print(f"✅ Added {rows:,} rows -> {args.encoders}")
+        for col, values in new.items():
+            print(f"⚠️ {col}: {len(values)} new categories (counted; not in the one-hot block): {values[:10]}")
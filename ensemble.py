@@ -0,0 +1,187 @@
+# ensemble.py
+# Concurrent multi-model blend for main.py's /predict/ensemble.
+#
+# The LightGBM booster, xgboost_model.joblib and the decision tree (dt.pkl) are
+# each served on their own. Here they are members of one ensemble described by
+# ensemble.json: model file, loader, input features, how the output maps back
+# to euros and a blend weight. A request is scored by every member whose inputs
+# it carries, concurrently on a thread pool (the native predict calls release
+# the GIL), and blended as a weighted mean with the spread across members.
+#
+# With a latency budget the blend waits only until the deadline: members still
+# running are left to finish in the background and reported as timed out, and
+# the response is built from the ones that made it.
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import numpy as np
+
+from features import gold_features
+
+CONFIG_NAME = "ensemble.json"
+
+# How each member's output maps back to euros. "standardized" members (fitted
+# on a StandardScaler'd target, see formatting copy.ipynb) also name the
+# target_scaler file to invert it with.
+OUTPUTS = {
+    "log1p": np.expm1,
+    "log10": lambda values: np.power(10.0, values),
+    "raw": lambda values: values,
+}
+
+
+def load_member_model(path, kind):
+    if kind == "lightgbm":
+        import lightgbm as lgb
+        return lgb.Booster(model_file=path)
+    if kind == "arrays":
+        from tree_engine import TreeEnsemble
+        return TreeEnsemble.load(path)
+    import joblib
+    return joblib.load(path)
+
+
+def model_features(model):
+    # The input columns a fitted model was trained on
+    if hasattr(model, "feature_names_in_"):
+        return [str(f) for f in model.feature_names_in_]
+    if hasattr(model, "get_booster"):
+        return [str(f) for f in model.get_booster().feature_names]
+    if hasattr(model, "feature_name"):
+        return [str(f) for f in model.feature_name()]
+    raise ValueError(f"cannot tell the input features of {type(model).__name__}; list them in {CONFIG_NAME}")
+
+
+class NothingToBlend(ValueError):
+    # The request cannot be scored at all: no member has its inputs, or the
+    # weights of those that do sum to zero
+    def __init__(self, message, skipped):
+        super().__init__(message)
+        self.skipped = skipped
+
+
+class Member:
+    def __init__(self, name, model, features, output="raw", weight=1.0, target_scaler=None):
+        self.name = name
+        self.model = model
+        self.features = features
+        if output == "standardized":
+            self.to_euros = lambda values: target_scaler.inverse_transform(values.reshape(-1, 1)).ravel()
+        else:
+            self.to_euros = OUTPUTS[output]
+        self.weight = float(weight)
+
+    def predict(self, X):
+        return np.asarray(self.to_euros(np.asarray(self.model.predict(X), dtype=np.float64)), dtype=np.float64)
+
+
+class Ensemble:
+    def __init__(self, members):
+        self.members = members
+        # Twice the members, so one straggler left running past a deadline
+        # does not hold up the next request's call to the same model
+        self.pool = ThreadPoolExecutor(max_workers=2 * len(members), thread_name_prefix="ensemble")
+        self.lock = threading.Lock()
+        self.counts = {m.name: {"used": 0, "timed_out": 0, "skipped": 0} for m in members}
+
+    @classmethod
+    def from_config(cls, path=CONFIG_NAME):
+        base = os.path.dirname(os.path.abspath(path))
+        with open(path) as f:
+            config = json.load(f)
+        members = []
+        for spec in config["members"]:
+            model_path = os.path.join(base, spec["path"])
+            if not os.path.exists(model_path):
+                print(f"⚠️ ensemble: {spec['name']} left out, {spec['path']} not found")
+                continue
+            target_scaler = None
+            if spec.get("output") == "standardized":
+                scaler_path = os.path.join(base, spec.get("target_scaler", "y_scaler.pkl"))
+                if not os.path.exists(scaler_path):
+                    print(f"⚠️ ensemble: {spec['name']} left out, its target scaler {scaler_path} not found")
+                    continue
+                import joblib
+                target_scaler = joblib.load(scaler_path)
+            model = load_member_model(model_path, spec.get("kind", "joblib"))
+            features = spec.get("features") or model_features(model)
+            features = gold_features if features == "gold" else list(features)
+            members.append(Member(spec["name"], model, features, spec.get("output", "raw"),
+                                  spec.get("weight", 1.0), target_scaler))
+        if not members:
+            raise FileNotFoundError(f"none of the models in {path} were found")
+        weights = [m.weight for m in members]
+        if min(weights) < 0 or sum(weights) <= 0:
+            raise ValueError(f"{path}: member weights must be non-negative and not all zero, got {weights}")
+        return cls(members)
+
+    def predict(self, named, budget_s=None, weights=None):
+        # named: feature name -> value for one player
+        start = time.perf_counter()
+        weights = weights or {}
+        runnable, skipped = [], {}
+        for member in self.members:
+            missing = [f for f in member.features if f not in named]
+            if missing:
+                skipped[member.name] = f"missing features: {missing[:5]}"
+            else:
+                runnable.append(member)
+        if not runnable:
+            raise NothingToBlend("no member has all its input features", skipped)
+        run_weights = [weights.get(m.name, m.weight) for m in runnable]
+        if min(run_weights) < 0 or sum(run_weights) <= 0:
+            raise NothingToBlend(f"weights of the runnable members must be non-negative and not all zero, "
+                                 f"got {dict(zip([m.name for m in runnable], run_weights))}", skipped)
+
+        futures = {}
+        for member in runnable:
+            X = np.array([[named[f] for f in member.features]], dtype=np.float64)
+            futures[self.pool.submit(member.predict, X)] = member
+
+        done, pending = wait(futures, timeout=budget_s)
+        predictions = {}
+        failed = {}
+        for future in done:
+            member = futures[future]
+            try:
+                predictions[member.name] = float(future.result()[0])
+            except Exception as exc:
+                failed[member.name] = repr(exc)
+        timed_out = [futures[f].name for f in pending]
+
+        used = [m for m in self.members if m.name in predictions]
+        w = np.array([weights.get(m.name, m.weight) for m in used], dtype=np.float64)
+        values = np.array([predictions[m.name] for m in used], dtype=np.float64)
+        blend = float(np.dot(w, values) / w.sum()) if len(used) and w.sum() > 0 else None
+
+        with self.lock:
+            for m in used:
+                self.counts[m.name]["used"] += 1
+            for name in timed_out:
+                self.counts[name]["timed_out"] += 1
+            for name in skipped:
+                self.counts[name]["skipped"] += 1
+        return {
+            "predicted_value": blend,
+            "spread": {
+                "std": float(values.std()) if len(values) else None,
+                "min": float(values.min()) if len(values) else None,
+                "max": float(values.max()) if len(values) else None,
+            },
+            "models_used": [m.name for m in used],
+            "predictions": predictions,
+            "timed_out": timed_out,
+            "skipped": {**skipped, **failed},
+            "elapsed_ms": (time.perf_counter() - start) * 1000,
+        }
+
+    def close(self):
+        # Members still running finish in the background; no new work is taken
+        self.pool.shutdown(wait=False)
+
+    def stats(self):
+        with self.lock:
+            return {name: dict(c) for name, c in self.counts.items()}
@@ -0,0 +1,95 @@
+# feature_schema.py
+# Feature-schema manifest for the Decision Tree API.
+#
+# The API only needs the model's column names, dtypes and fill values, not the
+# validation data itself. This builds a small manifest from the training /
+# validation frame (streamed in chunks) and saves it next to the model with
+# joblib, like model_features.joblib, so the API can start without reading
+# X_val_new.csv.
+#
+#   python feature_schema.py --data data/X_val_new.csv --model model/decision_tree_regressor_model.pkl
+import argparse
+import os
+import time
+from collections import defaultdict
+
+import joblib
+import pandas as pd
+
+MANIFEST_NAME = "feature_schema.joblib"
+
+
+def manifest_path_for(model_path):
+    return os.path.join(os.path.dirname(os.path.abspath(model_path)), MANIFEST_NAME)
+
+
+def _one_hot_groups(binary_columns):
+    # "position_Attack", "position_Defender", ... -> {"position": [...]}
+    groups = defaultdict(list)
+    for col in binary_columns:
+        if "_" in col:
+            groups[col.rsplit("_", 1)[0]].append(col)
+    # Walk prefixes from the longest so "position_Attack_-_Left_Winger" joins
+    # "position" together with "position_Attack"
+    merged = defaultdict(list)
+    for prefix in sorted(groups, key=len, reverse=True):
+        parent = prefix
+        while "_" in parent and parent.rsplit("_", 1)[0] in groups:
+            parent = parent.rsplit("_", 1)[0]
+        merged[parent].extend(groups[prefix])
+    return {prefix: sorted(cols) for prefix, cols in merged.items() if len(cols) > 1}
+
+
+def build_manifest(data_path, model_path=None, chunksize=100_000, default=0):
+    columns = None
+    dtypes = {}
+    is_binary = None
+    n_rows = 0
+    for chunk in pd.read_csv(data_path, chunksize=chunksize):
+        if columns is None:
+            columns = chunk.columns.tolist()
+            is_binary = dict.fromkeys(columns, True)
+        n_rows += len(chunk)
+        for col in columns:
+            series = chunk[col]
+            dtype = str(series.dtype)
+            seen = dtypes.setdefault(col, dtype)
+            if seen != dtype:
+                # e.g. int64 in one chunk, float64 (NaNs) in the next
+                numeric = series.dtype.kind in "iufb" and pd.api.types.is_numeric_dtype(seen)
+                dtypes[col] = "float64" if numeric else "object"
+            if is_binary[col]:
+                is_binary[col] = bool(series.dtype.kind in "iufb" and series.dropna().isin([0, 1]).all())
+
+    binary = [col for col in columns if is_binary[col]]
+    manifest = {
+        "features": [{"name": col, "dtype": dtypes[col], "default": default} for col in columns],
+        "one_hot_groups": _one_hot_groups(binary),
+        "n_rows_profiled": n_rows,
+        "source": os.path.basename(data_path),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    if model_path is not None:
+        manifest["model_file"] = os.path.basename(model_path)
+    return manifest
+
+
+def save_manifest(manifest, path):
+    joblib.dump(manifest, path)
+
+
+def load_manifest(path):
+    return joblib.load(path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write the feature-schema manifest next to the model")
+    parser.add_argument("--data", required=True, help="CSV with exactly the model's input columns")
+    parser.add_argument("--model", required=True, help="model artifact the manifest belongs to")
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args()
+
+    manifest = build_manifest(args.data, args.model)
+    out = args.out or manifest_path_for(args.model)
+    save_manifest(manifest, out)
+    print(f"✅ {len(manifest['features'])} features, {len(manifest['one_hot_groups'])} one-hot groups -> {out}")
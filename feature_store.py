@@ -0,0 +1,168 @@
+# feature_store.py
+# Memory-mapped per-player feature store for the LightGBM API.
+#
+# /predict makes the caller assemble all 17 raw fields, though every one of
+# them is an aggregate already computed offline. This builds a store from the
+# preprocessed player table (one row per player, the latest when a date column
+# is given):
+#
+#   player_ids.npy  sorted int64 ids
+#   raw.npy         float64 [n, RAW_FEATURES], the PlayerData fields
+#   gold.npy        float64 [n, gold_features], what the model scores
+#   meta.json       columns, row count, source
+#
+# The server opens the arrays with mmap_mode='r': a lookup is a binary search
+# over the ids and a slice of gold.npy (a view, nothing copied), and every
+# worker process reads the same pages from the OS page cache.
+#
+#   python feature_store.py build merged_f.csv --out feature_store --date-column date_unix
+#   python feature_store.py get feature_store 28003
+import argparse
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+import pandas as pd
+
+from features import RAW_FEATURES, add_engineered_columns, gold_features
+
+STORE_DIR = "feature_store"
+
+
+class FeatureStore:
+    def __init__(self, path=STORE_DIR):
+        self.path = path
+        # A rebuild swaps the whole directory; if that happened while the files
+        # were being opened, open them again so they all come from one build
+        for attempt in range(3):
+            try:
+                inode = os.stat(path).st_ino
+                with open(os.path.join(path, "meta.json")) as f:
+                    self.meta = json.load(f)
+                self.player_ids = np.load(os.path.join(path, "player_ids.npy"), mmap_mode="r")
+                self.raw = np.load(os.path.join(path, "raw.npy"), mmap_mode="r")
+                self.gold = np.load(os.path.join(path, "gold.npy"), mmap_mode="r")
+                if os.stat(path).st_ino == inode:
+                    return
+            except FileNotFoundError:
+                # Between the two renames of a swap there is no directory
+                if attempt == 2:
+                    raise
+            time.sleep(0.01)
+        raise RuntimeError(f"{path} kept changing while it was opened")
+
+    def __len__(self):
+        return len(self.player_ids)
+
+    def position(self, player_id):
+        i = int(np.searchsorted(self.player_ids, player_id))
+        return i if i < len(self.player_ids) and self.player_ids[i] == player_id else -1
+
+    def positions(self, player_ids):
+        ids = np.asarray(player_ids, dtype=np.int64)
+        i = np.searchsorted(self.player_ids, ids)
+        found = i < len(self.player_ids)
+        found[found] = self.player_ids[i[found]] == ids[found]
+        return np.where(found, i, -1)
+
+    def row(self, player_id):
+        # (1, n_features) view into the mapped file, or None
+        i = self.position(player_id)
+        return None if i < 0 else self.gold[i:i + 1]
+
+    def rows(self, player_ids):
+        # Rows of the players found (gathered, so a copy) and the found mask
+        i = self.positions(player_ids)
+        found = i >= 0
+        return self.gold[i[found]], found
+
+    def raw_fields(self, player_id):
+        i = self.position(player_id)
+        return None if i < 0 else dict(zip(RAW_FEATURES, self.raw[i].tolist()))
+
+
+def _read(path):
+    if path.endswith(".parquet"):
+        return pd.read_parquet(path)
+    if path.endswith((".xlsx", ".xls")):
+        return pd.read_excel(path)
+    return pd.read_csv(path)
+
+
+def build(source, out_dir=STORE_DIR, date_column=None, encoders_path=None):
+    df = _read(source)
+    if 'citizenship_freq_encoded' not in df.columns and 'citizenship' in df.columns and encoders_path:
+        # Raw citizenship strings, encoded with the serving tables (encoders.py)
+        from encoders import load_encoders
+        df['citizenship_freq_encoded'] = load_encoders(encoders_path).frequency_array('citizenship', df['citizenship'])
+    missing = [col for col in ['player_id'] + RAW_FEATURES if col not in df.columns]
+    if missing:
+        raise ValueError(f"{source} is missing columns: {missing}")
+
+    df = df.dropna(subset=['player_id'])
+    if date_column:
+        df = df.sort_values(date_column, kind="stable")
+    # One row per player: the latest snapshot (or the last row when undated)
+    df = df.drop_duplicates('player_id', keep='last').sort_values('player_id')
+
+    raw = df[RAW_FEATURES].to_numpy(dtype=np.float64)
+    cols = {col: raw[:, j] for j, col in enumerate(RAW_FEATURES)}
+    with np.errstate(divide='ignore', invalid='ignore'):
+        add_engineered_columns(cols)
+    gold = np.ascontiguousarray(np.column_stack([cols[col] for col in gold_features]))
+
+    out_dir = out_dir.rstrip(os.sep)
+    tmp_dir = out_dir + ".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    np.save(os.path.join(tmp_dir, "player_ids.npy"), df['player_id'].to_numpy(dtype=np.int64))
+    np.save(os.path.join(tmp_dir, "raw.npy"), raw)
+    np.save(os.path.join(tmp_dir, "gold.npy"), gold)
+    meta = {
+        "raw_features": RAW_FEATURES, "gold_features": gold_features, "players": int(len(df)),
+        "source": os.path.basename(source), "date_column": date_column,
+        "built_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    with open(os.path.join(tmp_dir, "meta.json"), "w") as f:
+        json.dump(meta, f, indent=2)
+    # Swapped in whole, so a reader never pairs the ids of one build with the
+    # rows of another; servers keep their maps of the old files until reload
+    if os.path.exists(out_dir):
+        os.replace(out_dir, out_dir + ".old")
+    os.replace(tmp_dir, out_dir)
+    shutil.rmtree(out_dir + ".old", ignore_errors=True)
+    return meta
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build or query the per-player feature store")
+    sub = parser.add_subparsers(dest="command", required=True)
+    b = sub.add_parser("build")
+    b.add_argument("source", help="preprocessed player table (CSV, Parquet or Excel) with player_id and the PlayerData fields")
+    b.add_argument("--out", default=STORE_DIR)
+    b.add_argument("--date-column", default=None, help="keep each player's latest row by this column")
+    b.add_argument("--encoders", default=None, help="encoders.joblib, if the table has raw citizenship strings")
+    g = sub.add_parser("get")
+    g.add_argument("store")
+    g.add_argument("player_id", type=int)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        meta = build(args.source, args.out, args.date_column, args.encoders)
+        size = sum(os.path.getsize(os.path.join(args.out, f)) for f in os.listdir(args.out))
+        print(f"✅ {meta['players']:,} players -> {args.out} ({size / 1e6:,.1f} MB)")
+    else:
+        store = FeatureStore(args.store)
+        start = time.perf_counter()
+        for _ in range(10_000):
+            store.row(args.player_id)
+        lookup_us = (time.perf_counter() - start) / 10_000 * 1e6
+        fields = store.raw_fields(args.player_id)
+        if fields is None:
+            print(f"⚠️ player {args.player_id} not in {args.store}")
+        else:
+            for name, value in fields.items():
+                print(f"  {name:<30}{value:>16,.4f}")
+            print(f"✅ lookup {lookup_us:.1f} us")
@@ -0,0 +1,119 @@
+# features.py
+# Serving feature engineering for the LightGBM model, shared by the API
+# (main.py), bulk scoring and the other offline tools. Importing this module
+# does not load any model.
+import threading
+
+import numpy as np
+
+# Raw inputs, in PlayerData field order
+RAW_FEATURES = [
+    'age', 'most_recent_transfer_fee', 'total_career_goals', 'total_career_assists',
+    'days_since_joined', 'total_transfers', 'vader_polarity', 'tb_polarity',
+    'num_unique_teammates', 'total_career_minutes_played', 'total_value_at_transfer',
+    'remaining_contract_duration', 'days_since_last_transfer', 'total_career_matches',
+    'total_transfer_fees', 'citizenship_freq_encoded', 'club_prestige'
+]
+
+# Select the Gold Features used for training
+gold_features = [
+    'club_prestige', 'total_value_at_transfer', 'most_recent_transfer_fee',
+    'career_momentum', 'remaining_contract_duration', 'days_since_last_transfer',
+    'total_career_matches', 'performance_age_ratio', 'total_career_minutes_played',
+    'total_transfer_fees', 'market_visibility', 'loyalty_index',
+    'citizenship_freq_encoded', 'efficiency_index'
+]
+
+def add_engineered_columns(df):
+    # --- REPLICATE FEATURE ENGINEERING FROM NOTEBOOK ---
+    # Works column-wise on a DataFrame or a dict of NumPy arrays, so one call
+    # covers a single player or a whole squad.
+    # Performance Age Ratio
+    df['performance_age_ratio'] = (df['total_career_goals'] + df['total_career_assists']) / np.maximum(df['age'] - 15, 1)
+
+    # Loyalty Index
+    df['loyalty_index'] = df['days_since_joined'] / (df['total_transfers'] + 1)
+
+    # Market Visibility
+    df['market_visibility'] = (df['vader_polarity'] + df['tb_polarity']) * df['num_unique_teammates']
+
+    # Career Momentum
+    df['career_momentum'] = df['most_recent_transfer_fee'] / np.maximum(df['age'] - 17, 1)
+
+    # Efficiency Index
+    df['efficiency_index'] = (df['total_career_goals'] + df['total_career_assists']) / (df['total_career_minutes_played'] + 1)
+
+    return df
+
+def engineer_features(df):
+    add_engineered_columns(df)
+    return df[gold_features]
+
+def gold_matrix(cols):
+    # cols maps every RAW_FEATURES name to a column array; the engineered
+    # columns are added to it and the model matrix gathered in gold order
+    with np.errstate(divide='ignore', invalid='ignore'):
+        add_engineered_columns(cols)
+    return np.column_stack([cols[col] for col in gold_features])
+
+def feature_matrix(players):
+    # Build each raw column straight from the validated models instead of
+    # going through one dict per player
+    cols = {
+        col: np.fromiter((getattr(p, col) for p in players), dtype=np.float64, count=len(players))
+        for col in RAW_FEATURES
+    }
+    return gold_matrix(cols)
+
+def sweep_matrix(base, axes):
+    # What-if grid around one player: base maps every RAW_FEATURES name to a
+    # value, axes is [(name, values)] for one or two varied fields. Rows run
+    # over the first axis' values slowest ('ij' order), so predictions
+    # reshape to [len(values_1), len(values_2)].
+    grids = np.meshgrid(*[np.asarray(values, dtype=np.float64) for _, values in axes], indexing='ij')
+    n = grids[0].size
+    cols = {col: np.full(n, base[col], dtype=np.float64) for col in RAW_FEATURES}
+    for (name, _), grid in zip(axes, grids):
+        cols[name] = grid.ravel()
+    return gold_matrix(cols)
+
+def _div(a, b):
+    # Scalar division with the same inf/nan results pandas gives on a zero denominator
+    try:
+        return a / b
+    except ZeroDivisionError:
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return float(np.float64(a) / np.float64(b))
+
+def compile_feature_row(columns=gold_features):
+    # Resolve every column position once so the per-request work is plain
+    # attribute reads and scalar math written into a reusable float64 row.
+    pos = {name: i for i, name in enumerate(columns)}
+    raw_slots = [(pos[name], name) for name in RAW_FEATURES if name in pos]
+    i_par = pos['performance_age_ratio']
+    i_loyalty = pos['loyalty_index']
+    i_visibility = pos['market_visibility']
+    i_momentum = pos['career_momentum']
+    i_efficiency = pos['efficiency_index']
+    local = threading.local()
+
+    def build_row(data):
+        # One row buffer per worker thread, since sync handlers share the threadpool
+        row = getattr(local, 'row', None)
+        if row is None:
+            row = local.row = np.empty((1, len(columns)), dtype=np.float64)
+        out = row[0]
+
+        for i, name in raw_slots:
+            out[i] = getattr(data, name)
+
+        age = data.age
+        goal_involvements = data.total_career_goals + data.total_career_assists
+        out[i_par] = _div(goal_involvements, max(age - 15, 1))
+        out[i_loyalty] = _div(data.days_since_joined, data.total_transfers + 1)
+        out[i_visibility] = (data.vader_polarity + data.tb_polarity) * data.num_unique_teammates
+        out[i_momentum] = _div(data.most_recent_transfer_fee, max(age - 17, 1))
+        out[i_efficiency] = _div(goal_involvements, data.total_career_minutes_played + 1)
+        return row
+
+    return build_row
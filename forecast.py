@@ -0,0 +1,314 @@
+# forecast.py
+# Multi-season value forecasts from the Model2 LSTM + stacked XGBoost.
+#
+# Model2.py trains both models but only uses the LSTM for the lstm_prediction
+# column of the stacking stage. Here they are served together: the LSTM reads
+# a player's last `sequence_length` seasons (scaled with the saved LSTM scaler)
+# and predicts log1p of next season's value, and the stacked XGBoost turns that
+# plus the season's features into the final estimate. Each projected season
+# (age + 1, the other inputs held at the last season's level) is pushed onto
+# the window and fed back in, so N seasons cost N forward passes, each one
+# batched over every player in the request.
+#
+# Each player's last scaled window is kept in forecast_state/ under the saved
+# models dir. Appending a season only shifts that player's window (and is
+# logged to appended.jsonl, replayed on load); their history is never
+# reprocessed. `compact` folds the log back into the arrays.
+#
+#   python forecast.py build --cache-dir cache/<key>
+#   python forecast.py get 123 456 --seasons 5
+#   python forecast.py compact
+import argparse
+import collections
+import json
+import os
+import pickle
+import shutil
+import threading
+import time
+
+import numpy as np
+
+SAVED_DIR = "saved_models"
+STATE_DIR = "forecast_state"
+APPEND_LOG = "appended.jsonl"
+
+# As Model2.prepare_model_frame; recomputed for appended and projected seasons
+ENGINEERED = {
+    'age_x_goals': lambda c: c['age_clean'] * c['goals_per_match'],
+    'age_squared': lambda c: c['age_clean'] ** 2,
+    'attack_contribution': lambda c: c['goals_per_match'] + c['assists_per_match'],
+}
+
+
+def engineer(features, columns):
+    # In place on a (n, len(columns)) array
+    cols = {col: features[:, i].copy() for i, col in enumerate(columns)}
+    for i, col in enumerate(columns):
+        if col in ENGINEERED:
+            features[:, i] = ENGINEERED[col](cols)
+    return features
+
+
+def project(features, columns):
+    # Next season's inputs: one year older, performance held where it is
+    features = np.array(features, dtype=np.float64)
+    features[:, columns.index('age_clean')] += 1
+    return engineer(features, columns)
+
+
+def model_columns(saved_dir):
+    # features.json lists the stacking inputs: the LSTM columns + lstm_prediction
+    with open(os.path.join(saved_dir, "features.json")) as f:
+        return [c for c in json.load(f) if c != 'lstm_prediction']
+
+
+def load_lstm_scaler(saved_dir):
+    with open(os.path.join(saved_dir, "lstm_feature_scaler.pkl"), "rb") as f:
+        return pickle.load(f)
+
+
+class Forecaster:
+    def __init__(self, saved_dir=SAVED_DIR, max_cached=50_000):
+        import tensorflow as tf
+        import xgboost as xgb
+
+        self.saved_dir = saved_dir
+        self.columns = model_columns(saved_dir)
+        self.lstm = tf.keras.models.load_model(os.path.join(saved_dir, "lstm_model.keras"), compile=False)
+        self.xgb = xgb.XGBRegressor()
+        self.xgb.load_model(os.path.join(saved_dir, "stacked_xgboost_model.json"))
+        self.lstm_scaler = load_lstm_scaler(saved_dir)
+        with open(os.path.join(saved_dir, "xgb_feature_scaler.pkl"), "rb") as f:
+            self.xgb_scaler = pickle.load(f)
+
+        state = os.path.join(saved_dir, STATE_DIR)
+        with open(os.path.join(state, "meta.json")) as f:
+            self.meta = json.load(f)
+        self.player_ids = np.load(os.path.join(state, "player_ids.npy"))
+        self.seasons = np.load(os.path.join(state, "seasons.npy"))
+        self.windows = np.load(os.path.join(state, "windows.npy"))
+        self.last_features = np.load(os.path.join(state, "last_features.npy"))
+        self.sequence_length = self.windows.shape[1]
+
+        # player_id -> (window, last features, last season) for appended seasons
+        self.appended = {}
+        # player_id -> (lstm log values, stacked log values), LRU
+        self.forecasts = collections.OrderedDict()
+        self.max_cached = max_cached
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        self.log_path = os.path.join(state, APPEND_LOG)
+        if os.path.exists(self.log_path):
+            with open(self.log_path) as f:
+                for line in f:
+                    entry = json.loads(line)
+                    self._append(entry["player_id"], entry["season_name"], np.asarray(entry["features"]))
+
+    # ---------------- State ----------------
+    def lookup(self, player_id):
+        # (scaled window, last raw features, last season) or None
+        if player_id in self.appended:
+            return self.appended[player_id]
+        i = int(np.searchsorted(self.player_ids, player_id))
+        if i < len(self.player_ids) and self.player_ids[i] == player_id:
+            return self.windows[i], self.last_features[i], str(self.seasons[i])
+        return None
+
+    def season_row(self, values):
+        # Raw values of the base columns -> full input row with engineered columns
+        missing = [c for c in self.columns if c not in ENGINEERED and c not in values]
+        if missing:
+            raise ValueError(f"missing features: {missing}")
+        row = np.array([[values.get(c, 0.0) for c in self.columns]], dtype=np.float64)
+        return engineer(row, self.columns)[0]
+
+    def _append(self, player_id, season_name, row):
+        scaled = self.lstm_scaler.transform(row[None, :]).astype(np.float32)
+        current = self.lookup(player_id)
+        if current is None:
+            if self.sequence_length > 1:
+                raise ValueError(f"player {player_id} has no history; the LSTM needs {self.sequence_length} seasons")
+            window = scaled
+        else:
+            if str(season_name) <= current[2]:
+                raise ValueError(f"season {season_name} is not after player {player_id}'s last season {current[2]}")
+            window = np.concatenate([current[0][1:], scaled])
+        self.appended[player_id] = (window, row, str(season_name))
+        self.forecasts.pop(player_id, None)
+
+    def append(self, player_id, season_name, values):
+        row = self.season_row(values)
+        with self.lock:
+            self._append(player_id, season_name, row)
+            with open(self.log_path, "a") as f:
+                f.write(json.dumps({"player_id": player_id, "season_name": str(season_name),
+                                    "features": row.tolist()}) + "\n")
+
+    # ---------------- Forecasting ----------------
+    def roll(self, windows, last_features, seasons):
+        # Log1p values (LSTM, stacked) for the next `seasons` seasons, shape (n, seasons)
+        windows = np.array(windows, dtype=np.float32)
+        features = np.asarray(last_features, dtype=np.float64)
+        lstm_log = np.empty((len(windows), seasons))
+        stacked_log = np.empty((len(windows), seasons))
+        for k in range(seasons):
+            lstm_log[:, k] = np.asarray(self.lstm(windows, training=False)).ravel()
+            features = project(features, self.columns)
+            X = self.xgb_scaler.transform(np.column_stack([features, lstm_log[:, k]]))
+            stacked_log[:, k] = self.xgb.predict(X)
+            scaled = self.lstm_scaler.transform(features).astype(np.float32)
+            windows = np.concatenate([windows[:, 1:], scaled[:, None, :]], axis=1)
+        return lstm_log, stacked_log
+
+    def forecast(self, player_ids, seasons=3):
+        # One entry per id (None when unknown); cached trajectories at least
+        # `seasons` long are sliced, the rest go through one batched roll
+        results = [None] * len(player_ids)
+        todo = []
+        with self.lock:
+            for i, pid in enumerate(player_ids):
+                state = self.lookup(pid)
+                if state is None:
+                    continue
+                cached = self.forecasts.get(pid)
+                if cached is not None and cached[0].shape[0] >= seasons:
+                    self.forecasts.move_to_end(pid)
+                    results[i] = (state[2], cached[0][:seasons], cached[1][:seasons])
+                    self.hits += 1
+                else:
+                    todo.append((i, pid, state, self.appended.get(pid)))
+            self.misses += len(todo)
+
+        if todo:
+            lstm_log, stacked_log = self.roll(np.stack([t[2][0] for t in todo]),
+                                              np.stack([t[2][1] for t in todo]), seasons)
+            with self.lock:
+                for j, (i, pid, state, appended) in enumerate(todo):
+                    results[i] = (state[2], lstm_log[j], stacked_log[j])
+                    # Skip players who got a new season while this batch ran
+                    if self.appended.get(pid) is appended:
+                        self.forecasts[pid] = (lstm_log[j], stacked_log[j])
+                while len(self.forecasts) > self.max_cached:
+                    self.forecasts.popitem(last=False)
+
+        return [None if r is None else {
+            "player_id": pid,
+            "last_season": r[0],
+            "predicted_values": np.expm1(r[2]).tolist(),
+            "lstm_values": np.expm1(r[1]).tolist(),
+        } for pid, r in zip(player_ids, results)]
+
+    def stats(self):
+        with self.lock:
+            return {"players": len(self.player_ids) + sum(p not in self.player_ids for p in self.appended),
+                    "appended": len(self.appended), "cached_forecasts": len(self.forecasts),
+                    "hits": self.hits, "misses": self.misses, "sequence_length": self.sequence_length}
+
+
+# ---------------- Building the state ----------------
+def find_cache_dir(cache_root, columns):
+    # Newest training cache (training_cache.py) built for these columns
+    candidates = []
+    for name in os.listdir(cache_root):
+        meta_path = os.path.join(cache_root, name, "meta.json")
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                if json.load(f)["feature_cols"] == columns:
+                    candidates.append((os.path.getmtime(meta_path), os.path.join(cache_root, name)))
+    if not candidates:
+        raise FileNotFoundError(f"no training cache under {cache_root} for the saved models' columns; run Model2.py first")
+    return max(candidates)[1]
+
+
+def write_state(state_dir, player_ids, seasons, windows, last_features, **meta):
+    tmp_dir = state_dir + ".tmp"
+    os.makedirs(tmp_dir, exist_ok=True)
+    np.save(os.path.join(tmp_dir, "player_ids.npy"), player_ids)
+    np.save(os.path.join(tmp_dir, "seasons.npy"), seasons)
+    np.save(os.path.join(tmp_dir, "windows.npy"), windows)
+    np.save(os.path.join(tmp_dir, "last_features.npy"), last_features)
+    with open(os.path.join(tmp_dir, "meta.json"), "w") as f:
+        json.dump({"players": int(len(player_ids)), "sequence_length": int(windows.shape[1]),
+                   "built_at": time.strftime("%Y-%m-%dT%H:%M:%S"), **meta}, f, indent=2)
+    # Swapped in whole; a fresh state starts without an append log
+    if os.path.exists(state_dir):
+        os.replace(state_dir, state_dir + ".old")
+    os.replace(tmp_dir, state_dir)
+    shutil.rmtree(state_dir + ".old", ignore_errors=True)
+
+
+def build(saved_dir=SAVED_DIR, cache_dir=None, cache_root="cache"):
+    from training_cache import open_cache
+
+    columns = model_columns(saved_dir)
+    cache = open_cache(cache_dir or find_cache_dir(cache_root, columns))
+    if cache.meta["feature_cols"] != columns:
+        raise ValueError(f"{cache.cache_dir} was built for other columns than {saved_dir}/features.json")
+    L = int(cache.meta["sequence_length"])
+
+    # Last L seasons of every player with at least L, in (player_id, season) order
+    pids = np.asarray(cache.player_id).astype(np.int64)
+    seasons = np.asarray(cache.season_name).astype(str)
+    order = np.lexsort((seasons, pids))
+    sorted_pids = pids[order]
+    ends = np.flatnonzero(np.r_[sorted_pids[1:] != sorted_pids[:-1], True])
+    starts = np.r_[0, ends[:-1] + 1]
+    ends = ends[ends - starts + 1 >= L]
+    rows = order[ends[:, None] - L + 1 + np.arange(L)]
+
+    features = np.asarray(cache.features, dtype=np.float64)
+    scaler = load_lstm_scaler(saved_dir)
+    windows = scaler.transform(features[rows.ravel()]).astype(np.float32).reshape(len(rows), L, -1)
+    write_state(os.path.join(saved_dir, STATE_DIR), pids[rows[:, -1]], seasons[rows[:, -1]], windows,
+                features[rows[:, -1]], source=os.path.basename(cache.cache_dir))
+    return len(rows), L
+
+
+def compact(saved_dir=SAVED_DIR):
+    # Folds the append log into the arrays
+    forecaster = Forecaster(saved_dir)
+    if not forecaster.appended:
+        return 0
+    merged = {int(pid): (w, f, s) for pid, w, f, s in zip(forecaster.player_ids, forecaster.windows,
+                                                           forecaster.last_features, forecaster.seasons)}
+    merged.update(forecaster.appended)
+    pids = np.array(sorted(merged), dtype=np.int64)
+    write_state(os.path.join(saved_dir, STATE_DIR), pids, np.array([merged[p][2] for p in pids]),
+                np.stack([merged[p][0] for p in pids]), np.stack([merged[p][1] for p in pids]),
+                source=forecaster.meta.get("source"), compacted=len(forecaster.appended))
+    return len(forecaster.appended)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Multi-season forecasts from the stacked LSTM + XGBoost model")
+    parser.add_argument("--saved-dir", default=SAVED_DIR)
+    sub = parser.add_subparsers(dest="command", required=True)
+    b = sub.add_parser("build", help="cache every player's last window from Model2's training cache")
+    b.add_argument("--cache-dir", default=None, help="default: the newest cache/<key> for the saved models")
+    b.add_argument("--cache-root", default="cache")
+    g = sub.add_parser("get")
+    g.add_argument("player_ids", type=int, nargs="+")
+    g.add_argument("--seasons", type=int, default=3)
+    sub.add_parser("compact", help="fold appended seasons into the state arrays")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        players, L = build(args.saved_dir, args.cache_dir, args.cache_root)
+        print(f"✅ {players:,} player windows (last {L} seasons) -> {os.path.join(args.saved_dir, STATE_DIR)}")
+    elif args.command == "compact":
+        print(f"✅ Folded {compact(args.saved_dir):,} appended players into the state")
+    else:
+        forecaster = Forecaster(args.saved_dir)
+        start = time.perf_counter()
+        forecasts = forecaster.forecast(args.player_ids, args.seasons)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        for pid, result in zip(args.player_ids, forecasts):
+            if result is None:
+                print(f"⚠️ player {pid} not in the forecast state")
+                continue
+            path = "  ".join(f"{v:,.0f}" for v in result["predicted_values"])
+            print(f"  {pid:<10} after {result['last_season']}: {path}")
+        print(f"✅ {len(args.player_ids)} players x {args.seasons} seasons in {elapsed_ms:.1f} ms")
@@ -1,14 +1,66 @@
 # main.py (FastAPI Backend)
-from fastapi import FastAPI
-from pydantic import BaseModel
+import math
+import os
+import threading
+from typing import Dict, List, Optional
+
+from fastapi import Body, FastAPI, HTTPException
+from fastapi.responses import JSONResponse, Response
+from pydantic import BaseModel, Field
 import pandas as pd
 import numpy as np
-import lightgbm as lgb
+
+from features import RAW_FEATURES, gold_features, engineer_features, feature_matrix, gold_matrix, compile_feature_row, sweep_matrix
+from microbatch import MicroBatcher
+from prediction_cache import PredictionCache, file_version
+from encoders import load_encoders
+from feature_store import FeatureStore
+from ensemble import Ensemble, NothingToBlend
+from forecast import Forecaster
+from columnar import CONTENT_TYPE, PASSTHROUGH, raw_columns, read_table, write_table
 
 app = FastAPI()
 
-# Load the trained LightGBM model
-model = lgb.Booster(model_file='lightgbm_model.txt')
+# Load the trained LightGBM model. MODEL_ENGINE=arrays serves the NumPy node
+# tables compiled by tree_engine.py instead, without importing lightgbm.
+MODEL_ENGINE = os.environ.get('MODEL_ENGINE', 'lightgbm')
+MODEL_PATH = 'lightgbm_model.npz' if MODEL_ENGINE == 'arrays' else 'lightgbm_model.txt'
+
+def load_model():
+    if MODEL_ENGINE == 'arrays':
+        from tree_engine import TreeEnsemble
+        return TreeEnsemble.load(MODEL_PATH)
+    import lightgbm as lgb
+    return lgb.Booster(model_file=MODEL_PATH)
+
+model = load_model()
+
+# Repeated player profiles (dashboards, Streamlit reruns) are served from here.
+# Keys are the rounded gold_features row plus the model file's content hash.
+prediction_cache = PredictionCache(
+    max_entries=int(os.environ.get('PREDICTION_CACHE_SIZE', 100_000)),
+    ttl_seconds=float(os.environ.get('PREDICTION_CACHE_TTL_S', 3600)),
+    precision=int(os.environ.get('PREDICTION_CACHE_PRECISION', 6)),
+    model_version=file_version(MODEL_PATH),
+)
+
+# Fitted category tables (encoders.py). With them clients can send the raw
+# citizenship string instead of citizenship_freq_encoded.
+ENCODERS_PATH = os.environ.get('ENCODERS_PATH', 'encoders.joblib')
+
+def load_category_encoders():
+    return load_encoders(ENCODERS_PATH) if os.path.exists(ENCODERS_PATH) else None
+
+encoders = load_category_encoders()
+
+# Per-player features built offline (feature_store.py), mapped read-only so
+# forked workers share the pages; /predict/by_id scores straight from it
+FEATURE_STORE_PATH = os.environ.get('FEATURE_STORE_PATH', 'feature_store')
+
+def open_feature_store():
+    return FeatureStore(FEATURE_STORE_PATH) if os.path.exists(os.path.join(FEATURE_STORE_PATH, 'meta.json')) else None
+
+feature_store = open_feature_store()
 
 class PlayerData(BaseModel):
     age: float
@@ -26,43 +78,386 @@ class PlayerData(BaseModel):
     days_since_last_transfer: float
     total_career_matches: float
     total_transfer_fees: float
-    citizenship_freq_encoded: float
+    citizenship_freq_encoded: Optional[float] = None
     club_prestige: float
+    citizenship: Optional[str] = None
 
-@app.post("/predict")
-def predict_market_value(data: PlayerData):
-    # Convert input to DataFrame
+def encode_categoricals(players):
+    # One dict lookup and one array read per field; a number sent by the
+    # client is used as is
+    for p in players:
+        if p.citizenship_freq_encoded is not None:
+            continue
+        if p.citizenship is None:
+            raise HTTPException(status_code=422, detail="citizenship or citizenship_freq_encoded is required")
+        if encoders is None:
+            raise HTTPException(status_code=422, detail=f"{ENCODERS_PATH} not loaded; send citizenship_freq_encoded")
+        p.citizenship_freq_encoded = float(encoders.frequency('citizenship', p.citizenship))
+    return players
+
+class PlayerIds(BaseModel):
+    player_ids: List[int]
+
+SWEEP_MAX_POINTS = int(os.environ.get('SWEEP_MAX_POINTS', 250_000))
+
+class SweepAxis(BaseModel):
+    feature: str
+    # Either explicit values or an evenly spaced range
+    values: Optional[List[float]] = Field(None, max_length=SWEEP_MAX_POINTS)
+    start: Optional[float] = None
+    stop: Optional[float] = None
+    num: int = Field(50, ge=1, le=SWEEP_MAX_POINTS)
+
+class SweepRequest(BaseModel):
+    # The base player: full fields, or a player_id from the feature store
+    player: Optional[PlayerData] = None
+    player_id: Optional[int] = None
+    axes: List[SweepAxis]
+
+class EnsembleRequest(BaseModel):
+    # PlayerData (or a feature-store player_id) covers the LightGBM inputs;
+    # the other members read their own columns from features
+    player: Optional[PlayerData] = None
+    player_id: Optional[int] = None
+    features: Dict[str, float] = {}
+    budget_ms: Optional[float] = None
+    weights: Optional[Dict[str, float]] = None
+
+# Members and weights come from ensemble.json; loaded on first use (or by
+# serve.py's preload) since it pulls in xgboost and scikit-learn
+ENSEMBLE_CONFIG = os.environ.get('ENSEMBLE_CONFIG', 'ensemble.json')
+ENSEMBLE_BUDGET_MS = float(os.environ.get('ENSEMBLE_BUDGET_MS', 100))
+ensemble = None
+_ensemble_lock = threading.Lock()
+
+def get_ensemble():
+    global ensemble
+    if ensemble is None:
+        with _ensemble_lock:
+            if ensemble is None:
+                if not os.path.exists(ENSEMBLE_CONFIG):
+                    raise HTTPException(status_code=503, detail=f"no ensemble config at {ENSEMBLE_CONFIG}")
+                ensemble = Ensemble.from_config(ENSEMBLE_CONFIG)
+    return ensemble
+
+class ForecastRequest(BaseModel):
+    player_ids: List[int]
+    seasons: int = 3
+
+class SeasonUpdate(BaseModel):
+    # A finished season for one player: the Model2 base columns (age_clean,
+    # goals_per_match, ...); the engineered ones are recomputed
+    player_id: int
+    season_name: str
+    features: Dict[str, float]
+    seasons: int = 3
+
+# The stacked LSTM + XGBoost (Model2.py's saved_models, forecast.py). Loaded on
+# first use in each worker: it pulls in TensorFlow, which does not survive a
+# fork, so serve.py does not preload it
+FORECAST_DIR = os.environ.get('FORECAST_DIR', 'saved_models')
+FORECAST_MAX_SEASONS = int(os.environ.get('FORECAST_MAX_SEASONS', 10))
+forecaster = None
+_forecaster_lock = threading.Lock()
+
+def get_forecaster():
+    global forecaster
+    if forecaster is None:
+        with _forecaster_lock:
+            if forecaster is None:
+                if not os.path.exists(os.path.join(FORECAST_DIR, 'forecast_state', 'meta.json')):
+                    raise HTTPException(status_code=503, detail=f"no forecast state in {FORECAST_DIR}; run forecast.py build")
+                forecaster = Forecaster(FORECAST_DIR)
+    return forecaster
+
+def check_seasons(seasons):
+    if not 1 <= seasons <= FORECAST_MAX_SEASONS:
+        raise HTTPException(status_code=422, detail=f"seasons must be between 1 and {FORECAST_MAX_SEASONS}")
+
+# Per-feature contributions (TreeSHAP, the booster's pred_contrib) for
+# /explain. The bias column is the same for every row, so it and the feature
+# names are taken once per model load. The arrays engine carries no
+# contribution support, so the text model is loaded for it on first use.
+def load_explainer():
+    booster = model
+    if MODEL_ENGINE == 'arrays':
+        import lightgbm as lgb
+        booster = lgb.Booster(model_file='lightgbm_model.txt')
+    expected_value = float(booster.predict(np.zeros((1, len(gold_features))), pred_contrib=True)[0, -1])
+    return {
+        "booster": booster,
+        "features": list(gold_features),
+        "expected_value": expected_value,
+        "base_value": float(np.expm1(expected_value)),
+    }
+
+explainer = load_explainer() if MODEL_ENGINE != 'arrays' else None
+_explainer_lock = threading.Lock()
+
+def get_explainer():
+    global explainer
+    if explainer is None:
+        with _explainer_lock:
+            if explainer is None:
+                explainer = load_explainer()
+    return explainer
+
+# Contribution rows (gold_features + bias) keyed like the predictions
+explanation_cache = PredictionCache(
+    max_entries=int(os.environ.get('EXPLANATION_CACHE_SIZE', 20_000)),
+    ttl_seconds=float(os.environ.get('PREDICTION_CACHE_TTL_S', 3600)),
+    precision=int(os.environ.get('PREDICTION_CACHE_PRECISION', 6)),
+    model_version=prediction_cache.model_version,
+    width=len(gold_features) + 1,
+)
+
+def explain_values(X_input):
+    # One pred_contrib call for the cache misses; columns are gold_features then the bias
+    state = get_explainer()
+    return explanation_cache.predict(X_input, lambda X: state["booster"].predict(X, pred_contrib=True))
+
+def explanation(contributions):
+    # Contributions are in the model's log1p space and sum to the log prediction
+    return {
+        "predicted_value": float(np.expm1(contributions.sum())),
+        "contributions": dict(zip(gold_features, contributions[:-1].tolist())),
+    }
+
+# Compiled once at startup; /predict uses it instead of a one-row DataFrame
+build_feature_row = compile_feature_row()
+
+def predict_market_value_frame(data: PlayerData):
+    # Reference DataFrame path, kept for bench_predict.py parity checks
     df = pd.DataFrame([data.dict()])
+    X_input = engineer_features(df)
+    return float(np.expm1(model.predict(X_input))[0])
+
+def score_players(players):
+    # A lone request keeps the compiled single-row path; batches go column-wise
+    if len(players) == 1:
+        X_input = build_feature_row(players[0])
+    else:
+        X_input = feature_matrix(players)
 
-    # --- REPLICATE FEATURE ENGINEERING FROM NOTEBOOK ---
-    # Performance Age Ratio
-    df['performance_age_ratio'] = (df['total_career_goals'] + df['total_career_assists']) / (df['age'] - 15).clip(lower=1)
-    
-    # Loyalty Index
-    df['loyalty_index'] = df['days_since_joined'] / (df['total_transfers'] + 1)
-    
-    # Market Visibility
-    df['market_visibility'] = (df['vader_polarity'] + df['tb_polarity']) * df['num_unique_teammates']
-    
-    # Career Momentum
-    df['career_momentum'] = df['most_recent_transfer_fee'] / (df['age'] - 17).clip(lower=1)
-    
-    # Efficiency Index
-    df['efficiency_index'] = (df['total_career_goals'] + df['total_career_assists']) / (df['total_career_minutes_played'] + 1)
-
-    # Select the Gold Features used for training
-    gold_features = [
-        'club_prestige', 'total_value_at_transfer', 'most_recent_transfer_fee',
-        'career_momentum', 'remaining_contract_duration', 'days_since_last_transfer',
-        'total_career_matches', 'performance_age_ratio', 'total_career_minutes_played',
-        'total_transfer_fees', 'market_visibility', 'loyalty_index',
-        'citizenship_freq_encoded', 'efficiency_index'
-    ]
-    
-    X_input = df[gold_features]
+    return prediction_cache.predict(X_input, predict_values)
 
+def predict_values(X_input):
     # Predict (Inverse log transform as used in notebook)
     log_prediction = model.predict(X_input)
-    real_prediction = np.expm1(log_prediction)[0]
+    return np.expm1(log_prediction)
+
+# Concurrent /predict calls are coalesced into one model call per micro-batch
+batcher = MicroBatcher(
+    score_players,
+    max_batch_size=int(os.environ.get('MICROBATCH_MAX_SIZE', 64)),
+    max_wait_ms=float(os.environ.get('MICROBATCH_MAX_WAIT_MS', 2.0)),
+)
+
+@app.on_event("shutdown")
+async def stop_batcher():
+    await batcher.stop()
+
+@app.post("/predict")
+async def predict_market_value(data: PlayerData):
+    encode_categoricals([data])
+    real_prediction = await batcher.submit(data)
+
+    return {"predicted_value": float(real_prediction)}
+
+@app.get("/metrics/batching")
+def batching_metrics():
+    return batcher.stats()
+
+@app.get("/metrics/cache")
+def cache_metrics():
+    return {**prediction_cache.stats(), "explanations": explanation_cache.stats()}
+
+@app.post("/model/reload")
+def reload_model():
+    global model, encoders, feature_store, ensemble, explainer, forecaster
+    model = load_model()
+    explainer = load_explainer() if MODEL_ENGINE != 'arrays' else None
+    encoders = load_category_encoders()
+    feature_store = open_feature_store()
+    # Reloaded with its member models on the next ensemble request; the old
+    # one's thread pool is shut down rather than leaked
+    with _ensemble_lock:
+        old_ensemble, ensemble = ensemble, None
+    if old_ensemble is not None:
+        old_ensemble.close()
+    forecaster = None
+    # A new model version invalidates every cached prediction
+    prediction_cache.set_model_version(file_version(MODEL_PATH))
+    explanation_cache.set_model_version(prediction_cache.model_version)
+    return {"model_version": prediction_cache.model_version}
+
+@app.post("/predict/batch")
+def predict_market_value_batch(players: List[PlayerData]):
+    if not players:
+        return {"predicted_values": []}
+
+    X_input = feature_matrix(encode_categoricals(players))
+
+    # One booster call for the cache misses; output order follows request order
+    real_prediction = prediction_cache.predict(X_input, predict_values)
+
+    return {"predicted_values": real_prediction.astype(float).tolist()}
+
+def encode_citizenship_column(values):
+    if encoders is None:
+        raise HTTPException(status_code=422, detail=f"{ENCODERS_PATH} not loaded; send citizenship_freq_encoded")
+    return encoders.frequency_array('citizenship', values)
+
+@app.post("/predict/batch/arrow")
+def predict_market_value_batch_arrow(body: bytes = Body(..., media_type=CONTENT_TYPE)):
+    # Same scoring as /predict/batch for an Arrow IPC stream (columnar.py):
+    # the feature columns are read as views of the body, not per-player objects
+    try:
+        table = read_table(body)
+        cols = raw_columns(table, encode_citizenship_column)
+    except HTTPException:
+        raise
+    except Exception as exc:
+        raise HTTPException(status_code=422, detail=f"invalid Arrow batch: {exc}")
+
+    out = {col: table.column(col) for col in PASSTHROUGH if col in table.column_names}
+    X_input = gold_matrix(cols)
+    out['predicted_value'] = prediction_cache.predict(X_input, predict_values) if len(X_input) else np.empty(0)
+    return Response(content=write_table(out), media_type=CONTENT_TYPE)
+
+def require_feature_store():
+    if feature_store is None:
+        raise HTTPException(status_code=503, detail=f"no feature store at {FEATURE_STORE_PATH}")
+    return feature_store
+
+@app.get("/predict/by_id/{player_id}")
+def predict_by_id(player_id: int):
+    row = require_feature_store().row(player_id)
+    if row is None:
+        raise HTTPException(status_code=404, detail=f"player {player_id} not in the feature store")
+
+    real_prediction = prediction_cache.predict(row, predict_values)
+    return {"player_id": player_id, "predicted_value": float(real_prediction[0])}
+
+@app.post("/predict/by_id")
+def predict_by_id_batch(request: PlayerIds):
+    # Unknown ids get null and are listed under "missing"
+    store = require_feature_store()
+    X_input, found = store.rows(request.player_ids)
+    values = [None] * len(request.player_ids)
+    if len(X_input):
+        predictions = prediction_cache.predict(X_input, predict_values)
+        for i, value in zip(np.flatnonzero(found), predictions.astype(float).tolist()):
+            values[i] = value
+
+    missing = [pid for pid, ok in zip(request.player_ids, found) if not ok]
+    return {"player_ids": request.player_ids, "predicted_values": values, "missing": missing}
+
+def sweep_axis_values(axis):
+    if axis.feature not in RAW_FEATURES:
+        raise HTTPException(status_code=422, detail=f"unknown feature {axis.feature!r}; use one of {RAW_FEATURES}")
+    if axis.values is not None:
+        return np.asarray(axis.values, dtype=np.float64)
+    if axis.start is None or axis.stop is None:
+        raise HTTPException(status_code=422, detail=f"{axis.feature}: give values, or start, stop and num")
+    return np.linspace(axis.start, axis.stop, axis.num)
+
+@app.post("/predict/sweep")
+def predict_sweep(request: SweepRequest):
+    # The whole grid is one matrix and one model call; not cached, since grid
+    # points rarely repeat and would only push real requests out of the cache
+    if not 1 <= len(request.axes) <= 2 or len({a.feature for a in request.axes}) != len(request.axes):
+        raise HTTPException(status_code=422, detail="give one or two different features to vary")
+    if request.player is not None:
+        base = encode_categoricals([request.player])[0].dict()
+    elif request.player_id is not None:
+        base = require_feature_store().raw_fields(request.player_id)
+        if base is None:
+            raise HTTPException(status_code=404, detail=f"player {request.player_id} not in the feature store")
+    else:
+        raise HTTPException(status_code=422, detail="give player or player_id")
+
+    # Size the grid before building any axis
+    shape = [len(axis.values) if axis.values is not None else axis.num for axis in request.axes]
+    if math.prod(shape) > SWEEP_MAX_POINTS:
+        raise HTTPException(status_code=422, detail=f"grid of {' x '.join(map(str, shape))} points exceeds {SWEEP_MAX_POINTS}")
+    axes = [(axis.feature, sweep_axis_values(axis)) for axis in request.axes]
+
+    X_input = sweep_matrix(base, axes)
+    real_prediction = predict_values(X_input).reshape(shape)
+    # Plain floats already; skip FastAPI's per-element encoding of the grid
+    return JSONResponse({
+        "features": [name for name, _ in axes],
+        "grid": [values.tolist() for _, values in axes],
+        "predicted_values": real_prediction.astype(float).tolist(),
+    })
+
+@app.post("/predict/ensemble")
+def predict_ensemble(request: EnsembleRequest):
+    named = dict(request.features)
+    if request.player is not None:
+        named.update(zip(gold_features, feature_matrix(encode_categoricals([request.player]))[0].tolist()))
+    elif request.player_id is not None:
+        row = require_feature_store().row(request.player_id)
+        if row is None:
+            raise HTTPException(status_code=404, detail=f"player {request.player_id} not in the feature store")
+        named.update(zip(gold_features, row[0].tolist()))
+
+    budget_ms = request.budget_ms if request.budget_ms is not None else ENSEMBLE_BUDGET_MS
+    try:
+        result = get_ensemble().predict(named, budget_s=budget_ms / 1000, weights=request.weights)
+    except NothingToBlend as exc:
+        raise HTTPException(status_code=422, detail={"message": str(exc), "skipped": exc.skipped})
+    if result["predicted_value"] is None:
+        message = "no model finished within the budget" if result["timed_out"] else "no model produced a prediction"
+        raise HTTPException(status_code=504 if result["timed_out"] else 422, detail={"message": message, **result})
+    return {**result, "budget_ms": budget_ms}
+
+@app.get("/metrics/ensemble")
+def ensemble_metrics():
+    return get_ensemble().stats()
+
+@app.post("/explain")
+def explain(data: PlayerData):
+    state = get_explainer()
+    contributions = explain_values(build_feature_row(encode_categoricals([data])[0]))[0]
+    return {"expected_value": state["expected_value"], "base_value": state["base_value"],
+            **explanation(contributions)}
+
+@app.post("/explain/batch")
+def explain_batch(players: List[PlayerData]):
+    # Contributions as lists in the order of "features", one per player
+    state = get_explainer()
+    meta = {"features": state["features"], "expected_value": state["expected_value"], "base_value": state["base_value"]}
+    if not players:
+        return {**meta, "predicted_values": [], "contributions": []}
+
+    contributions = explain_values(feature_matrix(encode_categoricals(players)))
+    return JSONResponse({
+        **meta,
+        "predicted_values": np.expm1(contributions.sum(axis=1)).tolist(),
+        "contributions": contributions[:, :-1].tolist(),
+    })
+
+@app.post("/forecast")
+def forecast(request: ForecastRequest):
+    # One batched LSTM pass per season ahead for all requested players;
+    # unknown ids get null and are listed under "missing"
+    check_seasons(request.seasons)
+    forecasts = get_forecaster().forecast(request.player_ids, request.seasons)
+    missing = [pid for pid, f in zip(request.player_ids, forecasts) if f is None]
+    return {"seasons": request.seasons, "forecasts": forecasts, "missing": missing}
+
+@app.post("/forecast/season")
+def add_season(update: SeasonUpdate):
+    # Shifts the player's cached window by one season and returns the new forecast
+    check_seasons(update.seasons)
+    try:
+        get_forecaster().append(update.player_id, update.season_name, update.features)
+    except ValueError as exc:
+        raise HTTPException(status_code=422, detail=str(exc))
+    return get_forecaster().forecast([update.player_id], update.seasons)[0]
 
-    return {"predicted_value": float(real_prediction)}
\ No newline at end of file
+@app.get("/metrics/forecast")
+def forecast_metrics():
+    return get_forecaster().stats()
@@ -0,0 +1,296 @@
+# merge_engine.py
+# Bounded-memory merge of the raw player tables.
+#
+# preproceesed_code (1).ipynb inner-merges profiles, market values,
+# performances, national performances, injuries and tweets on player_id alone,
+# so every market-value row is multiplied by every performance row, every
+# injury and so on. Here each market-value snapshot stays one row and gets:
+#
+#   profile          - the player's profile (one row per player)
+#   performances     - summed over competitions per season, as-of join: the
+#                      latest season that had started by the snapshot date
+#   injuries, tweets - aggregated over a window before the snapshot date
+#                      (count, sums / means), plus injury totals to date; the
+#                      tweets come pre-scored from sentiment.py if its
+#                      tweet_sentiment.parquet is in the raw folder
+#   national, mates  - per-player aggregates (these tables carry no dates)
+#
+# Every table is first hash-partitioned by player_id into buckets on disk (done
+# once; reruns reuse it while the raw files are unchanged). The buckets are then
+# merged one at a time, each sorted by (player_id, date), so memory is bounded
+# by the largest bucket rather than by the whole dump.
+#
+#   python merge_engine.py --raw-dir raw_data --out merged_snapshots --buckets 64 --window-days 365
+import argparse
+import glob
+import json
+import os
+import resource
+import shutil
+import time
+
+import numpy as np
+import pandas as pd
+
+TABLES = {
+    "market_value": {"file": "player_market_value.csv", "date": "date_unix"},
+    "profiles": {"file": "player_profiles.csv", "read": {"low_memory": False}},
+    "performances": {"file": "player_performances.csv", "season": "season_name"},
+    "injuries": {"file": "player_injuries.csv", "date": "from_date"},
+    "national": {"file": "player_national_performances.csv"},
+    "teammates": {"file": "player_teammates_played_with.csv"},
+    "tweets": {"file": "tweets_premier_league_footballers.csv", "date": "tweet_date",
+               "name": "player_name", "read": {"encoding": "latin1"}},
+    # Per player-day sentiment from sentiment.py; used instead of "tweets" when present
+    "tweet_sentiment": {"file": "tweet_sentiment.parquet", "date": "tweet_date", "name": "player_name"},
+}
+ID_COLUMNS = {"player_id", "team_id", "competition_id", "coach_id", "debut_game_id",
+              "teammate_player_id", "current_club_id", "player_agent_id"}
+DROP_TEXT = ["tweet_text", "text"]
+
+# Day offsets keep every date of one player inside its own key range
+DAY_OFFSET = 1 << 16
+PLAYER_STRIDE = 1 << 18
+
+
+def clean_player_name(names):
+    # Same normalisation the notebook uses to match tweets to profiles
+    return names.astype(str).str.split('(', n=1).str[0].str.strip().str.upper()
+
+
+def to_days(values):
+    if pd.api.types.is_numeric_dtype(values):
+        dates = pd.to_datetime(values, unit="s", errors="coerce")
+    else:
+        dates = pd.to_datetime(values, errors="coerce")
+    return dates.to_numpy(dtype="datetime64[D]")
+
+
+def season_start(names):
+    # "18/19" -> 2018-07-01 (00-25 -> 2000s, as in preprocessing.ipynb); "2018/2019" -> 2018-07-01
+    text = names.astype(str).str.strip()
+    four = pd.to_numeric(text.str[:4], errors="coerce")
+    two = pd.to_numeric(text.str[:2], errors="coerce")
+    year = four.where(text.str.match(r"^\d{4}"), np.where(two <= 25, 2000 + two, 1900 + two))
+    return pd.to_datetime(year.astype("Int64").astype(str) + "-07-01", errors="coerce").to_numpy(dtype="datetime64[D]")
+
+
+def _keys(player_ids, days):
+    # Parquet hands dates back at ms resolution; keys are in days
+    day = days.astype("datetime64[D]").astype("int64") + DAY_OFFSET
+    return player_ids.astype("int64") * PLAYER_STRIDE + day
+
+
+def _numeric_columns(df, exclude=()):
+    return [col for col in df.columns
+            if col not in ID_COLUMNS and col not in exclude and pd.api.types.is_numeric_dtype(df[col])]
+
+
+# ---------------- Partitioning ----------------
+def _fingerprint(raw_dir):
+    files = {}
+    for name, spec in TABLES.items():
+        path = os.path.join(raw_dir, spec["file"])
+        if os.path.exists(path):
+            stat = os.stat(path)
+            files[name] = [stat.st_size, int(stat.st_mtime)]
+    return files
+
+
+def _read_chunks(path, chunksize, **kwargs):
+    if path.endswith(".parquet"):
+        import pyarrow.parquet as pq
+        return (batch.to_pandas() for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize))
+    return pd.read_csv(path, chunksize=chunksize, **kwargs)
+
+
+def partition(raw_dir, index_dir, buckets=64, chunksize=500_000):
+    manifest_path = os.path.join(index_dir, "manifest.json")
+    fingerprint = {"files": _fingerprint(raw_dir), "buckets": buckets}
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            if json.load(f).get("fingerprint") == fingerprint:
+                print(f"✅ Reusing partitioned tables in {index_dir}")
+                return
+    shutil.rmtree(index_dir, ignore_errors=True)
+    os.makedirs(index_dir)
+
+    # Tweets carry names only; map them through the profiles. A name shared by
+    # several players is ambiguous and dropped rather than fanned out.
+    names = {}
+    profiles_path = os.path.join(raw_dir, TABLES["profiles"]["file"])
+    if os.path.exists(profiles_path):
+        profiles = pd.read_csv(profiles_path, usecols=["player_id", "player_name"])
+        profiles["player_id"] = pd.to_numeric(profiles["player_id"], errors="coerce")
+        profiles = profiles.dropna().drop_duplicates()
+        profiles["clean"] = clean_player_name(profiles["player_name"])
+        unique = profiles.groupby("clean")["player_id"].nunique() == 1
+        names = profiles[profiles["clean"].isin(unique[unique].index)].drop_duplicates("clean")
+        names = dict(zip(names["clean"], names["player_id"].astype("int64")))
+
+    counts = {}
+    scored = os.path.exists(os.path.join(raw_dir, TABLES["tweet_sentiment"]["file"]))
+    for table, spec in TABLES.items():
+        path = os.path.join(raw_dir, spec["file"])
+        if not os.path.exists(path) or (table == "tweets" and scored):
+            continue
+        start = time.perf_counter()
+        rows = 0
+        for i, chunk in enumerate(_read_chunks(path, chunksize, **spec.get("read", {}))):
+            chunk = chunk.drop(columns=[c for c in DROP_TEXT if c in chunk.columns])
+            if "name" in spec:
+                chunk["player_id"] = clean_player_name(chunk[spec["name"]]).map(names)
+                chunk = chunk.drop(columns=[spec["name"]])
+            chunk["player_id"] = pd.to_numeric(chunk["player_id"], errors="coerce")
+            chunk = chunk.dropna(subset=["player_id"])
+            chunk["player_id"] = chunk["player_id"].astype("int64")
+            if "date" in spec:
+                chunk["_day"] = to_days(chunk[spec["date"]])
+            if "season" in spec:
+                chunk["_day"] = season_start(chunk[spec["season"]])
+            rows += len(chunk)
+            for bucket, part in chunk.groupby(chunk["player_id"] % buckets):
+                out = os.path.join(index_dir, table, f"b{bucket:04d}")
+                os.makedirs(out, exist_ok=True)
+                part.to_parquet(os.path.join(out, f"part-{i:05d}.parquet"), index=False)
+        counts[table] = rows
+        print(f"  partitioned {table}: {rows:,} rows in {time.perf_counter() - start:.1f} s")
+
+    with open(manifest_path, "w") as f:
+        json.dump({"fingerprint": fingerprint, "rows": counts}, f, indent=2)
+
+
+def read_bucket(index_dir, table, bucket):
+    parts = sorted(glob.glob(os.path.join(index_dir, table, f"b{bucket:04d}", "*.parquet")))
+    if not parts:
+        return None
+    return pd.concat([pd.read_parquet(p) for p in parts], ignore_index=True)
+
+
+# ---------------- Joins ----------------
+def window_aggregate(spine, events, columns, window_days, prefix, how="sum"):
+    # Aggregates events with day in (snapshot - window, snapshot] per player
+    # (window_days=None: everything up to the snapshot)
+    # using prefix sums over the (player_id, day) order: two binary searches
+    # per snapshot instead of a join
+    events = events.dropna(subset=["_day"])
+    keys = _keys(events["player_id"].to_numpy(), events["_day"].to_numpy())
+    order = np.argsort(keys, kind="stable")
+    keys = keys[order]
+    spine_keys = _keys(spine["player_id"].to_numpy(), spine["_day"].to_numpy())
+    hi = np.searchsorted(keys, spine_keys, side="right")
+    if window_days is None:
+        lo = np.searchsorted(keys, spine["player_id"].to_numpy().astype("int64") * PLAYER_STRIDE, side="left")
+    else:
+        lo = np.searchsorted(keys, spine_keys - window_days, side="right")
+    n = hi - lo
+    out = {f"{prefix}_count": n}
+    for col in columns:
+        values = events[col].to_numpy(dtype=np.float64)[order]
+        present = ~np.isnan(values)
+        sums = np.concatenate([[0.0], np.cumsum(np.where(present, values, 0.0))])
+        seen = np.concatenate([[0], np.cumsum(present)])
+        total = sums[hi] - sums[lo]
+        if how == "mean":
+            with np.errstate(invalid="ignore", divide="ignore"):
+                out[f"{prefix}_{col}_mean"] = total / (seen[hi] - seen[lo])
+        else:
+            out[f"{prefix}_{col}"] = total
+    return pd.DataFrame(out, index=spine.index)
+
+
+def player_aggregate(df, prefix):
+    numeric = _numeric_columns(df)
+    grouped = df.groupby("player_id")
+    out = grouped[numeric].sum().add_prefix(f"{prefix}_") if numeric else pd.DataFrame(index=grouped.size().index)
+    out[f"{prefix}_rows"] = grouped.size()
+    return out.reset_index()
+
+
+def merge_bucket(index_dir, bucket, window_days):
+    spine = read_bucket(index_dir, "market_value", bucket)
+    if spine is None:
+        return None
+    spine = spine.dropna(subset=["_day"]).sort_values(["player_id", "_day"], kind="stable").reset_index(drop=True)
+    spine = spine.rename(columns={"value": "market_value"})
+
+    profiles = read_bucket(index_dir, "profiles", bucket)
+    if profiles is not None:
+        profiles = profiles.drop_duplicates("player_id")
+        spine = spine.merge(profiles, on="player_id", how="left", validate="m:1", suffixes=("", "_profile"))
+
+    performances = read_bucket(index_dir, "performances", bucket)
+    if performances is not None:
+        numeric = _numeric_columns(performances, exclude=("_day",))
+        seasons = performances.dropna(subset=["_day"]).groupby(["player_id", "_day"], as_index=False).agg(
+            {**{col: "sum" for col in numeric}, TABLES["performances"]["season"]: "first"})
+        seasons = seasons.rename(columns={col: f"perf_{col}" for col in numeric + [TABLES["performances"]["season"]]})
+        seasons = seasons.rename(columns={"_day": "perf_season_start"})
+        seasons["perf_season_start"] = seasons["perf_season_start"].astype("datetime64[s]")
+        spine["_date"] = spine["_day"].astype("datetime64[s]")
+        spine = pd.merge_asof(spine.sort_values("_date"), seasons.sort_values("perf_season_start"),
+                              left_on="_date", right_on="perf_season_start", by="player_id", direction="backward")
+        spine = spine.drop(columns=["_date"]).sort_values(["player_id", "_day"], kind="stable").reset_index(drop=True)
+
+    injuries = read_bucket(index_dir, "injuries", bucket)
+    if injuries is not None:
+        numeric = [c for c in ("days_missed", "games_missed") if c in injuries.columns]
+        spine = spine.join(window_aggregate(spine, injuries, numeric, window_days, f"injuries_{window_days}d"))
+        spine = spine.join(window_aggregate(spine, injuries, numeric, None, "injuries_to_date"))
+
+    sentiment = read_bucket(index_dir, "tweet_sentiment", bucket)
+    tweets = read_bucket(index_dir, "tweets", bucket)
+    if sentiment is not None:
+        # Weighted by the tweets of each day, so the means match the raw path
+        prefix = f"tweets_{window_days}d"
+        sums = window_aggregate(spine, sentiment, ["tweets", "vader_polarity_sum", "tb_polarity_sum"],
+                                window_days, prefix)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            spine[f"{prefix}_count"] = sums[f"{prefix}_tweets"].astype("int64")
+            for col in ("vader_polarity", "tb_polarity"):
+                spine[f"{prefix}_{col}_mean"] = sums[f"{prefix}_{col}_sum"] / sums[f"{prefix}_tweets"]
+    elif tweets is not None:
+        numeric = _numeric_columns(tweets, exclude=("_day",))
+        spine = spine.join(window_aggregate(spine, tweets, numeric, window_days, f"tweets_{window_days}d", how="mean"))
+
+    for table in ("national", "teammates"):
+        df = read_bucket(index_dir, table, bucket)
+        if df is not None:
+            spine = spine.merge(player_aggregate(df, table), on="player_id", how="left", validate="m:1")
+
+    spine["snapshot_date"] = spine.pop("_day").astype("datetime64[s]")
+    return spine
+
+
+def run(raw_dir, out_dir, buckets=64, window_days=365, chunksize=500_000, index_dir=None):
+    index_dir = index_dir or os.path.join(out_dir, "_index")
+    start = time.perf_counter()
+    partition(raw_dir, index_dir, buckets, chunksize)
+    print(f"✅ Partitioned into {buckets} player buckets in {time.perf_counter() - start:.1f} s")
+
+    start = time.perf_counter()
+    rows = 0
+    for bucket in range(buckets):
+        merged = merge_bucket(index_dir, bucket, window_days)
+        if merged is None or merged.empty:
+            continue
+        path = os.path.join(out_dir, f"part-{bucket:04d}.parquet")
+        merged.to_parquet(path + ".tmp", index=False)
+        os.replace(path + ".tmp", path)
+        rows += len(merged)
+    elapsed = time.perf_counter() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"✅ {rows:,} market-value snapshots merged in {elapsed:.1f} s, peak RSS {peak:,.0f} MB -> {out_dir}")
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Merge the raw player tables per market-value snapshot")
+    parser.add_argument("--raw-dir", default=".")
+    parser.add_argument("--out", default="merged_snapshots")
+    parser.add_argument("--buckets", type=int, default=64, help="player partitions; more buckets, less memory")
+    parser.add_argument("--window-days", type=int, default=365)
+    parser.add_argument("--chunksize", type=int, default=500_000)
+    args = parser.parse_args()
+    os.makedirs(args.out, exist_ok=True)
+    run(args.raw_dir, args.out, args.buckets, args.window_days, args.chunksize)
@@ -0,0 +1,213 @@
+# microbatch.py
+# Asyncio micro-batching for the FastAPI prediction handlers.
+#
+# Handlers `await batcher.submit(item)`. A single background task collects the
+# items that arrive within a short window (or until the batch is full), scores
+# them with one vectorized call in the threadpool and hands every caller its
+# own result. The window and the batch size follow the observed arrival rate:
+# at low traffic a request is dispatched immediately, under load the batcher
+# waits just long enough to fill a batch, capped at max_wait_ms.
+import asyncio
+import collections
+import time
+
+
+class MicroBatcher:
+    def __init__(self, predict_batch, max_batch_size=64, max_wait_ms=2.0, adaptive=True,
+                 executor=None, ewma_alpha=0.1):
+        # predict_batch(list_of_items) -> sequence of results in the same order
+        self.predict_batch = predict_batch
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.adaptive = adaptive
+        self.executor = executor
+        self.ewma_alpha = ewma_alpha
+
+        self._pending = collections.deque()
+        self._loop = None
+        self._worker = None
+        self._wakeup = None
+        self._full = None
+
+        # Arrival tracking (EWMA of seconds between submits)
+        self._last_arrival = None
+        self._interarrival = None
+
+        # Metrics
+        self.requests_total = 0
+        self.batches_total = 0
+        self.batched_items_total = 0
+        self.errors_total = 0
+        self.max_queue_depth = 0
+        self.last_batch_size = 0
+        self.last_wait_ms = 0.0
+        self.batch_size_histogram = collections.Counter()
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+    def start(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is loop and self._worker is not None and not self._worker.done():
+            return
+        self._loop = loop
+        self._wakeup = asyncio.Event()
+        self._full = asyncio.Event()
+        self._worker = loop.create_task(self._run())
+
+    async def stop(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+        self._worker = None
+        while self._pending:
+            _, future = self._pending.popleft()
+            if not future.done():
+                future.set_exception(RuntimeError("micro-batcher stopped"))
+
+    # ------------------------------------------------------------------
+    # Request side
+    # ------------------------------------------------------------------
+    async def submit(self, item):
+        self.start()
+        self._observe_arrival()
+        future = self._loop.create_future()
+        self._pending.append((item, future))
+        self.requests_total += 1
+        self.max_queue_depth = max(self.max_queue_depth, len(self._pending))
+
+        self._wakeup.set()
+        if len(self._pending) >= self.current_limits()[0]:
+            self._full.set()
+        return await future
+
+    def _observe_arrival(self):
+        now = time.perf_counter()
+        if self._last_arrival is not None:
+            gap = now - self._last_arrival
+            if self._interarrival is None:
+                self._interarrival = gap
+            else:
+                self._interarrival += self.ewma_alpha * (gap - self._interarrival)
+        self._last_arrival = now
+
+    def arrival_rate(self):
+        if not self._interarrival:
+            return 0.0
+        # A quiet spell counts immediately, so traffic dropping off does not
+        # keep later requests waiting for a batch that will never fill
+        idle = time.perf_counter() - self._last_arrival
+        return 1.0 / max(self._interarrival, idle)
+
+    def current_limits(self):
+        # (fill target, wait in seconds) for the next batch. The target only
+        # decides how long to wait for more requests; a backlog that is already
+        # queued is always drained up to max_batch_size at once.
+        if not self.adaptive:
+            return self.max_batch_size, self.max_wait
+        rate = self.arrival_rate()
+        if rate <= 0:
+            return 1, 0.0
+        # Expect rate * max_wait arrivals within one full window
+        target = int(min(self.max_batch_size, max(1, rate * self.max_wait)))
+        if target == 1:
+            return 1, 0.0
+        return target, min(self.max_wait, target / rate)
+
+    # ------------------------------------------------------------------
+    # Worker side
+    # ------------------------------------------------------------------
+    async def _run(self):
+        while True:
+            if not self._pending:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+
+            target, wait = self.current_limits()
+            if len(self._pending) < target and wait > 0:
+                self._full.clear()
+                try:
+                    await asyncio.wait_for(self._full.wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
+            else:
+                wait = 0.0
+
+            batch = [self._pending.popleft() for _ in range(min(self.max_batch_size, len(self._pending)))]
+            if not batch:
+                continue
+            self.last_wait_ms = wait * 1000.0
+            await self._dispatch(batch)
+
+    async def _dispatch(self, batch):
+        items = [item for item, _ in batch]
+        self.batches_total += 1
+        self.batched_items_total += len(items)
+        self.last_batch_size = len(items)
+        self.batch_size_histogram[_bucket(len(items))] += 1
+
+        try:
+            outcomes = await self._loop.run_in_executor(self.executor, self._score, items)
+        except asyncio.CancelledError:
+            # stop() while this batch is scoring: its callers get an error
+            # rather than waiting on futures nothing will resolve
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(RuntimeError("micro-batcher stopped"))
+            raise
+        for (_, future), (ok, value) in zip(batch, outcomes):
+            if future.done():
+                continue
+            if ok:
+                future.set_result(value)
+            else:
+                future.set_exception(value)
+
+    def _score(self, items):
+        try:
+            return [(True, value) for value in self.predict_batch(items)]
+        except Exception as e:
+            if len(items) == 1:
+                self.errors_total += 1
+                return [(False, e)]
+        # One bad item should not fail its neighbours: score them one by one
+        outcomes = []
+        for item in items:
+            try:
+                outcomes.append((True, self.predict_batch([item])[0]))
+            except Exception as e:
+                self.errors_total += 1
+                outcomes.append((False, e))
+        return outcomes
+
+    # ------------------------------------------------------------------
+    # Metrics
+    # ------------------------------------------------------------------
+    def stats(self):
+        target, wait = self.current_limits()
+        return {
+            "queue_depth": len(self._pending),
+            "max_queue_depth": self.max_queue_depth,
+            "requests_total": self.requests_total,
+            "batches_total": self.batches_total,
+            "errors_total": self.errors_total,
+            "mean_batch_size": self.batched_items_total / self.batches_total if self.batches_total else 0.0,
+            "last_batch_size": self.last_batch_size,
+            "batch_size_histogram": dict(sorted(self.batch_size_histogram.items(), key=lambda kv: int(kv[0].split("-")[0]))),
+            "arrival_rate_per_s": round(self.arrival_rate(), 2),
+            "current_fill_target": target,
+            "current_wait_ms": round(wait * 1000.0, 3),
+            "last_wait_ms": round(self.last_wait_ms, 3),
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000.0,
+            "adaptive": self.adaptive,
+        }
+
+
+def _bucket(n):
+    # Power-of-two buckets: "1-1", "2-3", "4-7", ...
+    lo = 1 << (n.bit_length() - 1)
+    return f"{lo}-{2 * lo - 1}"
@@ -0,0 +1,142 @@
+# prediction_cache.py
+# Bounded in-process cache for model predictions.
+#
+# Entries are keyed on the final feature vector the model sees (rounded to a
+# configurable number of decimals) plus the model version, so two requests
+# that engineer to the same gold_features row share one prediction no matter
+# how the raw payload was spelled. LRU order bounds the size, a TTL bounds
+# the age, and setting a new model version drops everything.
+#
+# width=n stores a row of n floats per key instead of one value (per-feature
+# contributions for /explain), under the same keys, bounds and invalidation.
+import collections
+import hashlib
+import threading
+import time
+
+import numpy as np
+
+
+def file_version(path):
+    # Content hash of a model artifact, used as the cache's model version
+    digest = hashlib.blake2b(digest_size=8)
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class PredictionCache:
+    def __init__(self, max_entries=100_000, ttl_seconds=3600.0, precision=6, model_version="", width=None):
+        self.max_entries = int(max_entries)
+        self.ttl = float(ttl_seconds) if ttl_seconds else None
+        self.precision = int(precision)
+        self.model_version = str(model_version)
+        self.width = width
+        self._entries = collections.OrderedDict()  # key -> (value, stored_at)
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions_lru = 0
+        self.evictions_ttl = 0
+        self.invalidations = 0
+
+    # ------------------------------------------------------------------
+    # Keys
+    # ------------------------------------------------------------------
+    def keys_for(self, X):
+        X = np.atleast_2d(np.asarray(X, dtype=np.float64))
+        # Rounding first makes float noise from the feature arithmetic hash equal;
+        # adding 0.0 folds -0.0 into 0.0
+        rounded = np.ascontiguousarray(np.round(X, self.precision) + 0.0)
+        version = self.model_version.encode() + b"|"
+        return [hashlib.blake2b(version + row.tobytes(), digest_size=16).digest() for row in rounded]
+
+    # ------------------------------------------------------------------
+    # Lookup / store
+    # ------------------------------------------------------------------
+    def get_many(self, keys):
+        # Returns (values, hit_mask); values are NaN where the key missed
+        values = np.full(len(keys) if self.width is None else (len(keys), self.width), np.nan)
+        hit = np.zeros(len(keys), dtype=bool)
+        now = time.monotonic()
+        with self._lock:
+            for i, key in enumerate(keys):
+                entry = self._entries.get(key)
+                if entry is None:
+                    continue
+                value, stored_at = entry
+                if self.ttl is not None and now - stored_at > self.ttl:
+                    del self._entries[key]
+                    self.evictions_ttl += 1
+                    continue
+                self._entries.move_to_end(key)
+                values[i] = value
+                hit[i] = True
+            n_hits = int(hit.sum())
+            self.hits += n_hits
+            self.misses += len(keys) - n_hits
+        return values, hit
+
+    def put_many(self, keys, values, version=None):
+        if self.max_entries <= 0:
+            return
+        now = time.monotonic()
+        with self._lock:
+            # Drop results computed against a model that has since been replaced
+            if version is not None and version != self.model_version:
+                return
+            for key, value in zip(keys, values):
+                value = float(value) if self.width is None else np.array(value, dtype=np.float64)
+                self._entries[key] = (value, now)
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions_lru += 1
+
+    def predict(self, X, predict_fn):
+        # Serve cached rows and call predict_fn once on the rest
+        X = np.atleast_2d(np.asarray(X, dtype=np.float64))
+        version = self.model_version
+        keys = self.keys_for(X)
+        values, hit = self.get_many(keys)
+        if not hit.all():
+            miss = ~hit
+            fresh = np.asarray(predict_fn(X[miss]), dtype=np.float64)
+            values[miss] = fresh
+            self.put_many([k for k, m in zip(keys, miss) if m], fresh, version=version)
+        return values
+
+    # ------------------------------------------------------------------
+    # Invalidation
+    # ------------------------------------------------------------------
+    def set_model_version(self, version):
+        # Called on every model (re)load; even an unchanged version drops the
+        # entries so a reload always starts from a cold cache
+        with self._lock:
+            self.model_version = str(version)
+            self._entries.clear()
+            self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "precision": self.precision,
+                "model_version": self.model_version,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions_lru": self.evictions_lru,
+                "evictions_ttl": self.evictions_ttl,
+                "invalidations": self.invalidations,
+            }
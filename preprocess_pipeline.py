@@ -0,0 +1,410 @@
+# preprocess_pipeline.py
+# The notebook preprocessing chain as one streaming pipeline.
+#
+# missing.ipynb -> detect_outliers.ipynb -> preprocessing.ipynb -> formatting
+# copy.ipynb re-read and re-wrote a full CSV after every cell and parsed the
+# date columns again each time. Here the same steps are chunk stages applied
+# in order while the raw merged file is read once:
+#
+#   drop -> coerce -> impute -> cap -> encode -> dates -> types
+#
+# Imputation and encoding need whole-table statistics (medians, modes, the
+# mean value, category lists and frequency counts). Those are gathered first
+# in a narrow pass that only reads the columns they depend on (not the tweet
+# text), and can be saved with --save-stats and reused with --stats. Dates are
+# parsed in coerce_types by every pass that reads them: the statistics pass
+# (skipped with --stats) and the main pass, not once per notebook cell. With
+# --fit-fences a second narrow pass sketches the imputed columns and caps with
+# their IQR fences instead of the hand-picked caps; --fences reuses them. The result
+# is written as a single Parquet file, equivalent to formatted_data.csv, in the
+# compact dtypes of compact_dtypes.py.
+#
+#   python preprocess_pipeline.py final_merged_date.csv formatted_data.parquet
+import argparse
+import json
+import os
+import resource
+import time
+from collections import defaultdict
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from compact_dtypes import apply_schema
+from quantile_sketch import fences_from_sketches, load_fences, save_fences, sketch_chunks
+
+DROP_COLUMNS = ["country_of_birth", "from_date", "end_date", "when", "main_position", "text"]
+
+DATE_COLUMNS = ["date_of_birth", "joined", "contract_expires", "date_unix", "game_date", "tweet_date"]
+
+NUMERIC_COLUMNS = [
+    'player_id', 'nb_in_group', 'nb_on_pitch', 'goals', 'assists', 'own_goals',
+    'subed_in', 'subed_out', 'yellow_cards', 'second_yellow_cards',
+    'direct_red_cards', 'penalty_goals', 'minutes_played',
+    'goals_conceded', 'clean_sheets', 'height', 'days_missed', 'games_missed', 'tb_polarity', 'vader_polarity', 'value'
+]
+
+TEXT_COLUMNS = ['player_name', 'citizenship', 'position', 'team_name', 'competition_name', 'injury_reason', 'season_name']
+LOWER_COLUMNS = ['foot', 'vader_emotion', 'tb_emotion', 'position', 'citizenship', 'injury_reason']
+
+# --- Imputation (missing.ipynb) ---
+MISSING_TOKENS = ['nan', '', 'none', 'na']
+MEDIAN_IMPUTE = ['goals', 'height', 'vader_polarity', 'tb_polarity']
+ZERO_IMPUTE = ['days_missed', 'games_missed']
+MODE_IMPUTE = ['minutes_played']
+MEAN_IMPUTE = ['value']
+MODE_CATEGORICAL = ['foot', 'position', 'citizenship']
+CONSTANT_FILL = {'injury_reason': 'no injury', 'vader_emotion': 'neutral', 'tb_emotion': 'neutral'}
+
+# --- Caps (detect_outliers.ipynb and formatting copy.ipynb) ---
+# (column, lower, upper, round first). Where the notebooks capped a column
+# twice, the tighter of the two caps is the one that stuck and is used here.
+# With fitted fences (quantile_sketch.py) the fence replaces the upper cap; the
+# lower cap stays as a floor (no negative counts, height >= 140).
+CAPS = [
+    ('nb_in_group', 0, 10, True), ('nb_on_pitch', 0, 10, True),
+    ('goals', 0, 3, True), ('assists', 0, 2, True), ('own_goals', 0, 1, True),
+    ('penalty_goals', 0, 1, True), ('yellow_cards', 0, 2, True),
+    ('second_yellow_cards', 0, 1, True), ('direct_red_cards', 0, 1, True),
+    ('goals_conceded', 0, 1, True), ('clean_sheets', 0, 2, True),
+    ('subed_in', 0, 3, True), ('subed_out', 0, 3, True), ('minutes_played', 0, 300, False),
+    ('days_missed', 0, 30, True), ('games_missed', 0, 5, True),
+    ('height', 140, 200, False), ('value', 0, 2000000, False),
+    ('vader_polarity', -1, 1, False), ('tb_polarity', -1, 1, False),
+]
+
+# --- Encoding (preprocessing.ipynb) ---
+ONE_HOT_COLUMNS = ["foot", "vader_emotion", "tb_emotion", "position"]
+FREQUENCY_COLUMNS = ['competition_name', 'team_name', 'citizenship']
+FREQUENCY_MISSING = ['nan', 'None', 'none', 'null', 'Null', '']
+
+FLOAT_COLUMNS = ['height', 'value', 'vader_polarity', 'tb_polarity', 'minutes_played']
+INT_COLUMNS = [
+    'player_id', 'nb_in_group', 'nb_on_pitch', 'goals', 'assists', 'own_goals',
+    'subed_in', 'subed_out', 'yellow_cards', 'second_yellow_cards', 'direct_red_cards',
+    'penalty_goals', 'goals_conceded', 'clean_sheets',
+    'days_missed', 'games_missed', 'age', 'contract_remaining_days',
+    'days_since_joined', 'days_since_game', 'days_since_tweet',
+    'joined_year', 'joined_month', 'contract_expires_year', 'contract_expires_month', 'contract_years_left',
+    'game_year', 'game_month', 'tweet_year', 'tweet_month', 'season', 'injury',
+    'competition_name_freq', 'team_name_freq', 'citizenship_freq',
+]
+
+# Columns the statistics pass has to read
+STATS_COLUMNS = sorted(set(DATE_COLUMNS + MEDIAN_IMPUTE + MODE_IMPUTE + MEAN_IMPUTE + MODE_CATEGORICAL
+                           + ONE_HOT_COLUMNS + FREQUENCY_COLUMNS))
+
+
+def _is_missing(series, tokens=MISSING_TOKENS):
+    return series.isna() | series.isin(tokens)
+
+
+# ---------------- Stages ----------------
+def drop_columns(df, stats):
+    return df.drop(columns=[col for col in DROP_COLUMNS if col in df.columns])
+
+
+def coerce_types(df, stats):
+    # Every pass parses its date columns here and nowhere else
+    for col in DATE_COLUMNS:
+        if col in df.columns:
+            df[col] = pd.to_datetime(df[col], errors='coerce')
+    for col in NUMERIC_COLUMNS:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors='coerce')
+    for col in set(TEXT_COLUMNS + LOWER_COLUMNS):
+        if col in df.columns:
+            # Missing stays missing instead of becoming the string 'nan'
+            values = df[col].astype(str).str.strip().where(df[col].notna())
+            df[col] = values.str.lower() if col in LOWER_COLUMNS else values
+    return df
+
+
+def impute_numeric(df, stats):
+    for col in DATE_COLUMNS + MEDIAN_IMPUTE:
+        if col in df.columns and stats['median'][col] is not None:
+            df[col] = df[col].fillna(stats['median'][col])
+    for col in ZERO_IMPUTE:
+        if col in df.columns:
+            df[col] = df[col].fillna(0)
+    for col in MODE_IMPUTE + MEAN_IMPUTE:
+        if col in df.columns and stats['fill'][col] is not None:
+            df[col] = df[col].fillna(stats['fill'][col])
+    return df
+
+
+def impute(df, stats):
+    df = impute_numeric(df, stats)
+    for col in MODE_CATEGORICAL:
+        if stats['fill'][col] is not None:
+            df[col] = df[col].mask(_is_missing(df[col]), stats['fill'][col])
+    for col, value in CONSTANT_FILL.items():
+        df[col] = df[col].mask(_is_missing(df[col], ['nan', '', 'none']), value)
+    return df
+
+
+def cap(df, stats):
+    fences = stats.get('fences') or {}
+    for col, lower, upper, rounded in CAPS:
+        if col in fences:
+            lower, upper = max(lower, fences[col]['lower']), fences[col]['upper']
+        values = df[col].round() if rounded else df[col]
+        df[col] = values.clip(lower=lower, upper=upper)
+    # Consistency rules from formatting copy.ipynb
+    df.loc[df['clean_sheets'] > 0, 'goals_conceded'] = 0
+    df['goals_conceded'] = np.minimum(df['goals_conceded'], df['nb_on_pitch'] * 10)
+    df['clean_sheets'] = np.minimum(df['clean_sheets'], df['nb_on_pitch'])
+    return df
+
+
+def encode(df, stats):
+    encoded = {}
+    for col in ONE_HOT_COLUMNS:
+        values = df[col]
+        for category in stats['categories'][col]:
+            encoded[f"{col}_{category}"] = (values == category).astype(np.float64).to_numpy()
+    df = pd.concat([df.drop(columns=ONE_HOT_COLUMNS), pd.DataFrame(encoded, index=df.index)], axis=1)
+
+    for col in FREQUENCY_COLUMNS:
+        values = df[col].mask(_is_missing(df[col], FREQUENCY_MISSING), 'missing')
+        df[col + "_freq"] = values.map(stats['frequency'][col])
+        df = df.drop(columns=[col])
+
+    injured = df['injury_reason'] != 'no injury'
+    df = df.drop(columns=['injury_reason'])
+    df['injury'] = injured.astype(int)
+    return df
+
+
+def derive_dates(df, stats):
+    df['age'] = (df['date_unix'] - df['date_of_birth']).dt.days // 365
+    df['contract_remaining_days'] = (df['contract_expires'] - df['date_unix']).dt.days.clip(lower=0)
+    df['days_since_joined'] = (df['date_unix'] - df['joined']).dt.days.clip(lower=0)
+    df['days_since_game'] = (df['date_unix'] - df['game_date']).dt.days.clip(lower=0)
+    df['days_since_tweet'] = (df['date_unix'] - df['tweet_date']).dt.days.clip(lower=0)
+
+    df['joined_year'] = df['joined'].dt.year
+    df['joined_month'] = df['joined'].dt.month
+    df['contract_expires_year'] = df['contract_expires'].dt.year
+    df['contract_expires_month'] = df['contract_expires'].dt.month
+    df['contract_years_left'] = (df['contract_remaining_days'] // 365).clip(lower=0)
+    df['game_year'] = df['game_date'].dt.year
+    df['game_month'] = df['game_date'].dt.month
+    df['tweet_year'] = df['tweet_date'].dt.year
+    df['tweet_month'] = df['tweet_date'].dt.month
+    df = df.drop(columns=DATE_COLUMNS)
+
+    # "18/19" -> 2018; 26-99 -> 1900s
+    start = pd.to_numeric(df['season_name'].str[:2], errors='coerce')
+    df['season'] = np.where(start <= 25, 2000 + start, 1900 + start)
+    return df.drop(columns=['season_name'])
+
+
+def finalize_types(df, stats):
+    if 'is_eu' in df.columns:
+        df['is_eu'] = df['is_eu'].fillna(0).astype(int)
+    int_columns = INT_COLUMNS + stats['one_hot_columns']
+    for col in int_columns:
+        if col in df.columns:
+            df[col] = df[col].fillna(0).astype(int)
+    for col in FLOAT_COLUMNS:
+        df[col] = df[col].astype(float)
+    # Written in the compact dtypes, so readers get them without converting
+    return apply_schema(df)
+
+
+STAGES = [
+    ("drop", drop_columns),
+    ("coerce", coerce_types),
+    ("impute", impute),
+    ("cap", cap),
+    ("encode", encode),
+    ("dates", derive_dates),
+    ("types", finalize_types),
+]
+
+
+# ---------------- Statistics pass ----------------
+def _median_from_counts(counts):
+    counts = counts[counts > 0].sort_index()
+    if counts.empty:
+        return None
+    cumulative = counts.cumsum().to_numpy()
+    n = cumulative[-1]
+    values = counts.index
+    lo = values[np.searchsorted(cumulative, (n - 1) // 2, side='right')]
+    hi = values[np.searchsorted(cumulative, n // 2, side='right')]
+    return lo + (hi - lo) / 2
+
+
+def _mode_from_counts(counts):
+    counts = counts[counts > 0].sort_index()
+    # Ties go to the smallest value, like Series.mode()[0]
+    return None if counts.empty else counts.idxmax()
+
+
+def fit_stats(path, chunksize=200_000):
+    header = pd.read_csv(path, nrows=0).columns
+    usecols = [col for col in STATS_COLUMNS if col in header]
+    counts = defaultdict(lambda: pd.Series(dtype=float))
+    sums = defaultdict(float)
+    missing = defaultdict(int)
+    for chunk in pd.read_csv(path, chunksize=chunksize, usecols=usecols):
+        chunk = coerce_types(chunk, None)
+        for col in DATE_COLUMNS + MEDIAN_IMPUTE + MODE_IMPUTE:
+            counts[col] = counts[col].add(chunk[col].value_counts(), fill_value=0)
+        for col in MEAN_IMPUTE:
+            sums[col] += chunk[col].sum()
+            counts[col] = counts[col].add(pd.Series({'n': chunk[col].count()}), fill_value=0)
+        for col in set(MODE_CATEGORICAL + ONE_HOT_COLUMNS):
+            is_missing = _is_missing(chunk[col])
+            missing[col] += int(is_missing.sum())
+            counts[col] = counts[col].add(chunk[col][~is_missing].value_counts(), fill_value=0)
+        for col in ['competition_name', 'team_name']:
+            values = chunk[col].mask(_is_missing(chunk[col], FREQUENCY_MISSING), 'missing')
+            counts[col] = counts[col].add(values.value_counts(), fill_value=0)
+
+    stats = {'median': {}, 'fill': {}, 'categories': {}, 'frequency': {}}
+    for col in DATE_COLUMNS + MEDIAN_IMPUTE:
+        stats['median'][col] = _median_from_counts(counts[col])
+    for col in MODE_IMPUTE:
+        stats['fill'][col] = _mode_from_counts(counts[col])
+    for col in MEAN_IMPUTE:
+        n = counts[col].get('n', 0)
+        stats['fill'][col] = sums[col] / n if n else None
+    # The mode ignores the missing markers themselves
+    for col in MODE_CATEGORICAL:
+        stats['fill'][col] = _mode_from_counts(counts[col])
+
+    # Categories and frequencies as they are after imputation
+    for col in ONE_HOT_COLUMNS:
+        fill = stats['fill'].get(col, CONSTANT_FILL.get(col))
+        observed = counts[col].index.tolist()
+        if missing[col] and fill is not None and fill not in observed:
+            observed.append(fill)
+        stats['categories'][col] = sorted(observed)
+    citizenship = counts['citizenship'].copy()
+    if missing['citizenship'] and stats['fill']['citizenship'] is not None:
+        citizenship[stats['fill']['citizenship']] = citizenship.get(stats['fill']['citizenship'], 0) + missing['citizenship']
+    for col, freq in [('competition_name', counts['competition_name']), ('team_name', counts['team_name']),
+                      ('citizenship', citizenship)]:
+        stats['frequency'][col] = freq.astype(int).to_dict()
+    stats['one_hot_columns'] = [f"{col}_{c}" for col in ONE_HOT_COLUMNS for c in stats['categories'][col]]
+    return stats
+
+
+def fit_fences(path, stats, chunksize=200_000, k=200, workers=1):
+    # Fences over the imputed values, as detect_outliers.ipynb computed them on
+    # missing_handled_file.csv
+    columns = [col for col, *_ in CAPS]
+    header = pd.read_csv(path, nrows=0).columns
+
+    def chunks():
+        for chunk in pd.read_csv(path, chunksize=chunksize, usecols=[c for c in columns if c in header]):
+            yield impute_numeric(coerce_types(chunk, None), stats)
+
+    return fences_from_sketches(sketch_chunks(chunks(), columns, k, workers))
+
+
+# ---------------- Streaming pass ----------------
+def run(path, out_path, stats=None, chunksize=200_000, fences=None):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    timings = defaultdict(float)
+    start = time.perf_counter()
+    if stats is None:
+        stats = fit_stats(path, chunksize)
+        timings['stats'] = time.perf_counter() - start
+    if fences == 'fit':
+        t = time.perf_counter()
+        stats['fences'] = fit_fences(path, stats, chunksize)
+        timings['fences'] = time.perf_counter() - t
+    elif fences is not None:
+        stats['fences'] = fences
+
+    writer = None
+    # The first chunk fixes the schema; later chunks are cast to it
+    schema = None
+    rows = 0
+    tmp_path = out_path + ".tmp"
+    reader = pd.read_csv(path, chunksize=chunksize)
+    while True:
+        t = time.perf_counter()
+        df = next(reader, None)
+        timings['read'] += time.perf_counter() - t
+        if df is None:
+            break
+        for name, stage in STAGES:
+            t = time.perf_counter()
+            df = stage(df, stats)
+            timings[name] += time.perf_counter() - t
+
+        t = time.perf_counter()
+        if writer is None:
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            schema = table.schema
+            writer = pq.ParquetWriter(tmp_path, schema)
+        else:
+            table = pa.Table.from_pandas(df, schema=schema, preserve_index=False)
+        writer.write_table(table)
+        timings['write'] += time.perf_counter() - t
+        rows += len(df)
+    if writer is not None:
+        writer.close()
+        os.replace(tmp_path, out_path)
+
+    timings['total'] = time.perf_counter() - start
+    return rows, dict(timings), stats
+
+
+def save_stats(stats, path):
+    joblib.dump(stats, path)
+
+
+def load_stats(path):
+    return joblib.load(path)
+
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the notebook preprocessing chain as one streaming pass")
+    parser.add_argument("input", nargs="?", default="final_merged_date.csv")
+    parser.add_argument("output", nargs="?", default="formatted_data.parquet")
+    parser.add_argument("--chunksize", type=int, default=200_000)
+    parser.add_argument("--stats", default=None, help="reuse statistics saved with --save-stats")
+    parser.add_argument("--save-stats", default=None)
+    parser.add_argument("--fences", default=None, help="cap with fences from quantile_sketch.py / --fit-fences")
+    parser.add_argument("--fit-fences", default=None, help="fit IQR fences on this input and save them here")
+    parser.add_argument("--encoders", default=None, help="encode with the tables of encoders.py instead")
+    parser.add_argument("--save-encoders", default=None, help="save the fitted encoder tables for serving")
+    parser.add_argument("--json", action="store_true", help="print the timings as JSON")
+    args = parser.parse_args()
+
+    stats = load_stats(args.stats) if args.stats else None
+    if args.encoders:
+        from encoders import load_encoders
+
+        # Medians and fills still come from this input unless --stats is given
+        stats = stats or fit_stats(args.input, args.chunksize)
+        stats.update(load_encoders(args.encoders).as_stats())
+    fences = load_fences(args.fences) if args.fences else ('fit' if args.fit_fences else None)
+    rows, timings, stats = run(args.input, args.output, stats, args.chunksize, fences)
+    if args.fit_fences:
+        save_fences(stats['fences'], args.fit_fences, source=args.input)
+    if args.save_stats:
+        save_stats(stats, args.save_stats)
+    if args.save_encoders:
+        from encoders import FittedEncoders, save_encoders
+
+        save_encoders(FittedEncoders.from_stats(stats), args.save_encoders)
+    if args.json:
+        print(json.dumps({"rows": rows, "timings": timings, "peak_rss_mb": peak_rss_mb()}))
+    else:
+        for name, seconds in timings.items():
+            print(f"  {name:<8}{seconds:>9.2f} s")
+        print(f"✅ {rows:,} rows -> {args.output} (peak RSS {peak_rss_mb():,.0f} MB)")
@@ -0,0 +1,221 @@
+# quantile_sketch.py
+# One-pass, mergeable quantile sketches for the IQR outlier fences.
+#
+# detect_outliers.ipynb loads the whole missing-handled table and runs
+# np.quantile on every column to get the 1.5 * IQR bounds, then hand-codes the
+# caps in later cells. Here each column gets a KLL sketch instead: a stack of
+# compactors where level h holds items of weight 2**h and a full level is
+# sorted and every other item promoted. Memory stays at a few hundred floats
+# per column whatever the row count, the rank error is about 1.7 / k (~1% at
+# k=200), and two sketches of different partitions merge into the sketch of
+# their union, so chunks can be sketched in worker processes and combined.
+#
+# The fences are written to JSON; preprocess_pipeline.py --fences caps with them.
+# --sketches keeps the sketches too, so a new partition can be folded in later
+# without re-reading the old ones.
+#
+#   python quantile_sketch.py missing_handled_file.csv --out outlier_fences.json --workers 4
+#   python quantile_sketch.py new_rows.csv --sketches outlier_sketches.json --out outlier_fences.json
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+# The columns detect_outliers.ipynb checks
+FENCE_COLUMNS = [
+    'goals', 'clean_sheets', 'nb_in_group', 'nb_on_pitch',
+    'assists', 'own_goals', 'subed_in', 'subed_out', 'yellow_cards', 'second_yellow_cards',
+    'direct_red_cards', 'penalty_goals', 'goals_conceded',
+    'minutes_played', 'height', 'value', 'days_missed', 'games_missed',
+    'vader_polarity', 'tb_polarity',
+]
+
+
+class KLLSketch:
+    def __init__(self, k=200, seed=0):
+        self.k = k
+        self.n = 0
+        self.levels = [np.empty(0)]
+        self.rng = np.random.default_rng(seed)
+
+    def _capacity(self, level):
+        # Lower levels get geometrically smaller buffers (c = 2/3)
+        depth = len(self.levels) - level - 1
+        return max(2, int(np.ceil(self.k * (2 / 3) ** depth)))
+
+    def _compress(self):
+        level = 0
+        while level < len(self.levels):
+            items = self.levels[level]
+            if len(items) > self._capacity(level):
+                if level + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                items = np.sort(items)
+                # An odd item out stays behind so the total weight is kept
+                keep = items[:len(items) % 2]
+                pairs = items[len(keep):]
+                promoted = pairs[self.rng.integers(0, 2)::2]
+                self.levels[level] = keep
+                self.levels[level + 1] = np.concatenate([self.levels[level + 1], promoted])
+            level += 1
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        if len(values):
+            self.n += len(values)
+            self.levels[0] = np.concatenate([self.levels[0], values])
+            self._compress()
+        return self
+
+    def merge(self, other):
+        for level, items in enumerate(other.levels):
+            if level == len(self.levels):
+                self.levels.append(np.empty(0))
+            self.levels[level] = np.concatenate([self.levels[level], items])
+        self.n += other.n
+        self._compress()
+        return self
+
+    def quantile(self, qs):
+        if self.n == 0:
+            return np.full(np.shape(qs), np.nan)
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(items), 2.0 ** level) for level, items in enumerate(self.levels)])
+        order = np.argsort(items, kind="stable")
+        items, cumulative = items[order], np.cumsum(weights[order])
+        # Same definition as np.quantile's default, on the weighted ranks
+        ranks = np.asarray(qs, dtype=np.float64) * (cumulative[-1] - 1)
+        low = np.searchsorted(cumulative, np.floor(ranks) + 1, side="left")
+        high = np.searchsorted(cumulative, np.ceil(ranks) + 1, side="left")
+        frac = ranks - np.floor(ranks)
+        return items[low] + (items[high] - items[low]) * frac
+
+    def size(self):
+        return sum(len(items) for items in self.levels)
+
+    def to_dict(self):
+        return {"k": self.k, "n": self.n, "levels": [items.tolist() for items in self.levels]}
+
+    @classmethod
+    def from_dict(cls, data):
+        sketch = cls(data["k"])
+        sketch.n = data["n"]
+        sketch.levels = [np.asarray(items, dtype=np.float64) for items in data["levels"]]
+        return sketch
+
+
+# ---------------- Fitting ----------------
+def sketch_frame(df, columns, k=200, seed=0):
+    return {col: KLLSketch(k, seed + i).update(df[col].to_numpy(dtype=np.float64))
+            for i, col in enumerate(columns) if col in df.columns}
+
+
+def merge_sketches(parts):
+    merged = {}
+    for sketches in parts:
+        for col, sketch in sketches.items():
+            merged[col] = merged[col].merge(sketch) if col in merged else sketch
+    return merged
+
+
+def sketch_chunks(chunks, columns, k=200, workers=1):
+    # Chunks are sketched in worker processes with at most 2 * workers in
+    # flight, and the per-chunk sketches merged as they come back
+    if workers <= 1:
+        return merge_sketches(sketch_frame(chunk, columns, k, seed=i * len(columns)) for i, chunk in enumerate(chunks))
+    merged, pending = {}, []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for i, chunk in enumerate(chunks):
+            pending.append(pool.submit(sketch_frame, chunk[[c for c in columns if c in chunk.columns]],
+                                       columns, k, i * len(columns)))
+            if len(pending) >= 2 * workers:
+                merged = merge_sketches([merged, pending.pop(0).result()])
+        for future in pending:
+            merged = merge_sketches([merged, future.result()])
+    return merged
+
+
+def fences_from_sketches(sketches, whisker=1.5):
+    fences = {}
+    for col, sketch in sketches.items():
+        q25, q75 = sketch.quantile([0.25, 0.75])
+        iqr = q75 - q25
+        fences[col] = {"n": int(sketch.n), "q25": float(q25), "q75": float(q75), "iqr": float(iqr),
+                       "lower": float(q25 - whisker * iqr), "upper": float(q75 + whisker * iqr)}
+    return fences
+
+
+def sketch_files(paths, columns=FENCE_COLUMNS, chunksize=200_000, k=200, workers=1):
+    def chunks():
+        for path in paths:
+            header = pd.read_csv(path, nrows=0).columns
+            usecols = [col for col in columns if col in header]
+            for chunk in pd.read_csv(path, usecols=usecols, chunksize=chunksize):
+                yield chunk.apply(pd.to_numeric, errors="coerce")
+
+    return sketch_chunks(chunks(), columns, k, workers)
+
+
+def fit_fences(paths, columns=FENCE_COLUMNS, chunksize=200_000, k=200, workers=1, whisker=1.5):
+    return fences_from_sketches(sketch_files(paths, columns, chunksize, k, workers), whisker)
+
+
+def save_fences(fences, path, **meta):
+    with open(path, "w") as f:
+        json.dump({**meta, "columns": fences}, f, indent=2)
+
+
+def load_fences(path):
+    with open(path) as f:
+        return json.load(f)["columns"]
+
+
+def save_sketches(sketches, path):
+    with open(path, "w") as f:
+        json.dump({col: sketch.to_dict() for col, sketch in sketches.items()}, f)
+
+
+def load_sketches(path):
+    with open(path) as f:
+        return {col: KLLSketch.from_dict(data) for col, data in json.load(f).items()}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="IQR outlier fences from streaming quantile sketches")
+    parser.add_argument("paths", nargs="+", help="CSV files (e.g. missing_handled_file.csv or its partitions)")
+    parser.add_argument("--out", default="outlier_fences.json")
+    parser.add_argument("--k", type=int, default=200, help="sketch size; rank error is about 1.7 / k")
+    parser.add_argument("--whisker", type=float, default=1.5)
+    parser.add_argument("--chunksize", type=int, default=200_000)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--sketches", default=None, help="sketch file to merge into (if present) and rewrite")
+    parser.add_argument("--check", action="store_true", help="also compute the exact quantiles in memory")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    sketches = sketch_files(args.paths, FENCE_COLUMNS, args.chunksize, args.k, args.workers)
+    print(f"✅ Sketched {len(sketches)} columns in {time.perf_counter() - start:.1f} s")
+    if args.sketches:
+        if os.path.exists(args.sketches):
+            sketches = merge_sketches([load_sketches(args.sketches), sketches])
+            print(f"✅ Merged into the sketches in {args.sketches}")
+        save_sketches(sketches, args.sketches)
+    fences = fences_from_sketches(sketches, args.whisker)
+    save_fences(fences, args.out, k=args.k, whisker=args.whisker, sources=args.paths)
+
+    exact = None
+    if args.check:
+        exact = pd.concat([pd.read_csv(p, usecols=lambda c: c in fences) for p in args.paths], ignore_index=True)
+    for col, fence in fences.items():
+        line = f"📌 {col:<22} IQR {fence['iqr']:>12.4g}  fences [{fence['lower']:.4g}, {fence['upper']:.4g}]"
+        if exact is not None:
+            data = pd.to_numeric(exact[col], errors="coerce").dropna()
+            q25, q75 = np.quantile(data, 0.25), np.quantile(data, 0.75)
+            line += f"  exact [{q25 - args.whisker * (q75 - q25):.4g}, {q75 + args.whisker * (q75 - q25):.4g}]"
+        print(line)
+    print(f"✅ Fences -> {args.out}")
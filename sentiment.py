@@ -0,0 +1,195 @@
+# sentiment.py
+# Batched, cached sentiment scoring of the tweet corpus.
+#
+# vader_polarity (VADER compound score) and tb_polarity (TextBlob polarity)
+# feed market_visibility in main.py. Scoring tweets one at a time means every
+# refresh scores the whole corpus again. Here the tweets are streamed in
+# chunks and keyed by a hash of their text (and the scorer versions). The keys
+# are looked up in a local SQLite store, and only the misses are scored, in
+# batches across a process pool, then written back. A rerun over a corpus with
+# a few new tweets scores just those.
+#
+# Scores are aggregated per player and day while the chunks stream past. The
+# output has one row per (player_name, tweet_date) with the tweet count,
+# polarity sums and means, and is read by merge_engine.py in place of the raw
+# tweets file:
+#
+#   python sentiment.py tweets_premier_league_footballers.csv --out tweet_sentiment.parquet --workers 4
+#
+# Requires the scorers themselves: pip install vaderSentiment textblob
+import argparse
+import hashlib
+import os
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor
+from importlib.metadata import PackageNotFoundError, version
+
+import numpy as np
+import pandas as pd
+
+TEXT_COLUMNS = ['tweet_text', 'text']
+DATE_COLUMNS = ['tweet_date', 'date', 'created_at']
+SCORES = ['vader_polarity', 'tb_polarity']
+
+
+def scorer_version():
+    # Part of every cache key: upgrading either library re-scores everything
+    versions = []
+    for package in ('vaderSentiment', 'textblob'):
+        try:
+            versions.append(f"{package}={version(package)}")
+        except PackageNotFoundError:
+            versions.append(f"{package}=missing")
+    return ";".join(versions)
+
+
+def text_keys(texts, salt):
+    salt = salt.encode()
+    return [hashlib.blake2b(salt + t.encode('utf-8', 'surrogatepass'), digest_size=16).digest() for t in texts]
+
+
+# ---------------- Scoring (worker processes) ----------------
+_analyzers = None
+
+
+def _init_scorer():
+    global _analyzers
+    from textblob import TextBlob
+    from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
+
+    _analyzers = (SentimentIntensityAnalyzer(), TextBlob)
+
+
+def score_batch(texts):
+    if _analyzers is None:
+        _init_scorer()
+    vader, TextBlob = _analyzers
+    out = np.empty((len(texts), 2), dtype=np.float64)
+    for i, text in enumerate(texts):
+        out[i, 0] = vader.polarity_scores(text)['compound']
+        out[i, 1] = TextBlob(text).sentiment.polarity
+    return out
+
+
+# ---------------- Cache ----------------
+class ScoreCache:
+    def __init__(self, path):
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS scores "
+                          "(key BLOB PRIMARY KEY, vader REAL, tb REAL) WITHOUT ROWID")
+
+    def get_many(self, keys, batch=500):
+        found = {}
+        for i in range(0, len(keys), batch):
+            part = keys[i:i + batch]
+            rows = self.conn.execute(
+                f"SELECT key, vader, tb FROM scores WHERE key IN ({','.join('?' * len(part))})", part)
+            found.update((key, (v, t)) for key, v, t in rows)
+        return found
+
+    def put_many(self, keys, scores):
+        self.conn.executemany("INSERT OR REPLACE INTO scores VALUES (?, ?, ?)",
+                              ((k, float(v), float(t)) for k, (v, t) in zip(keys, scores)))
+        self.conn.commit()
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM scores").fetchone()[0]
+
+    def close(self):
+        self.conn.close()
+
+
+# ---------------- Streaming pass ----------------
+def score_chunk(texts, cache, salt, pool=None, batch_size=256):
+    # Scores for one chunk of texts: cached ones looked up, unique misses scored
+    keys = text_keys(texts, salt)
+    unique = list(dict.fromkeys(keys))
+    found = cache.get_many(unique)
+    missing = [k for k in unique if k not in found]
+    if missing:
+        first = {}
+        for key, text in zip(keys, texts):
+            first.setdefault(key, text)
+        todo = [first[k] for k in missing]
+        batches = [todo[i:i + batch_size] for i in range(0, len(todo), batch_size)]
+        results = pool.map(score_batch, batches) if pool is not None else map(score_batch, batches)
+        scores = np.concatenate(list(results))
+        cache.put_many(missing, scores)
+        found.update(zip(missing, map(tuple, scores)))
+    return np.array([found[k] for k in keys], dtype=np.float64).reshape(-1, 2), len(missing)
+
+
+def aggregate_chunk(df):
+    grouped = df.groupby(['player_name', 'tweet_date'])
+    return pd.DataFrame({
+        'tweets': grouped.size(),
+        'vader_polarity_sum': grouped['vader_polarity'].sum(),
+        'tb_polarity_sum': grouped['tb_polarity'].sum(),
+    })
+
+
+def run(path, out_path, cache_path="sentiment_cache.sqlite", workers=1, chunksize=50_000,
+        batch_size=256, encoding="latin1"):
+    header = pd.read_csv(path, nrows=0, encoding=encoding).columns
+    text_col = next(c for c in TEXT_COLUMNS if c in header)
+    date_col = next(c for c in DATE_COLUMNS if c in header)
+    salt = scorer_version()
+    cache = ScoreCache(cache_path)
+    pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_scorer) if workers > 1 else None
+
+    totals = None
+    rows = scored = 0
+    start = time.perf_counter()
+    try:
+        for chunk in pd.read_csv(path, usecols=['player_name', text_col, date_col], chunksize=chunksize,
+                                 encoding=encoding):
+            chunk = chunk.dropna(subset=['player_name', text_col])
+            texts = chunk[text_col].astype(str).tolist()
+            scores, misses = score_chunk(texts, cache, salt, pool, batch_size)
+            rows += len(chunk)
+            scored += misses
+            df = pd.DataFrame({
+                'player_name': chunk['player_name'].astype(str).str.strip().to_numpy(),
+                'tweet_date': pd.to_datetime(chunk[date_col], errors='coerce').dt.normalize().to_numpy(),
+                'vader_polarity': scores[:, 0], 'tb_polarity': scores[:, 1],
+            })
+            # Partial sums per (player, day) folded into the running totals
+            partial = aggregate_chunk(df)
+            totals = partial if totals is None else totals.add(partial, fill_value=0)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+        cache.close()
+
+    out = totals.reset_index() if totals is not None else pd.DataFrame(
+        columns=['player_name', 'tweet_date', 'tweets', 'vader_polarity_sum', 'tb_polarity_sum'])
+    out['tweets'] = out['tweets'].astype('int64')
+    for col in SCORES:
+        out[col] = out[f'{col}_sum'] / out['tweets']
+    out.to_parquet(out_path + ".tmp", index=False)
+    os.replace(out_path + ".tmp", out_path)
+    return {"tweets": rows, "scored": scored, "cached": rows - scored, "groups": len(out),
+            "seconds": time.perf_counter() - start}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Score tweets with VADER / TextBlob, cached, and aggregate per player-day")
+    parser.add_argument("input", nargs="?", default="tweets_premier_league_footballers.csv")
+    parser.add_argument("--out", default="tweet_sentiment.parquet")
+    parser.add_argument("--cache", default="sentiment_cache.sqlite")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--chunksize", type=int, default=50_000)
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--encoding", default="latin1")
+    args = parser.parse_args()
+
+    missing = [p.split("=")[0] for p in scorer_version().split(";") if p.endswith("=missing")]
+    if missing:
+        raise SystemExit(f"⚠️ {', '.join(missing)} not installed: pip install {' '.join(missing)}")
+
+    report = run(args.input, args.out, args.cache, args.workers, args.chunksize, args.batch_size, args.encoding)
+    print(f"✅ {report['tweets']:,} tweets in {report['seconds']:.1f} s: {report['scored']:,} scored, "
+          f"{report['cached']:,} from the cache -> {report['groups']:,} player-days in {args.out}")
@@ -0,0 +1,51 @@
+# sequences.py
+# Sliding-window sequence builder for the Model2 LSTM.
+#
+# One stable sort by (player_id, season_name), group boundaries from NumPy, and
+# a single gather for all windows of every player, instead of re-sorting each
+# player's group inside the window loop.
+import numpy as np
+import pandas as pd
+
+
+def sequence_index(player_ids, season_names, sequence_length=1):
+    # Row positions of every window's inputs, shape (n_windows, sequence_length),
+    # and of the season each window predicts, shape (n_windows,)
+    frame = pd.DataFrame({'player_id': player_ids, 'season_name': season_names})
+    frame = frame[frame['player_id'].notna()]
+    order = frame.sort_values(['player_id', 'season_name'], kind='mergesort').index.to_numpy()
+    n = len(order)
+    empty = np.empty((0, sequence_length), dtype=np.int64), np.empty(0, dtype=np.int64)
+    if n == 0:
+        return empty
+
+    # Group boundaries in the sorted order
+    pids = np.asarray(player_ids)[order]
+    starts = np.flatnonzero(np.r_[True, pids[1:] != pids[:-1]])
+    lengths = np.diff(np.r_[starts, n])
+    counts = np.maximum(lengths - sequence_length, 0)
+    total = int(counts.sum())
+    if total == 0:
+        return empty
+
+    # First sorted position of every window: start + 0..count-1 for each player
+    offsets = np.cumsum(counts) - counts
+    window_start = np.repeat(starts - offsets, counts) + np.arange(total)
+    window_rows = order[window_start[:, None] + np.arange(sequence_length)]
+    target_rows = order[window_start + sequence_length]
+    return window_rows, target_rows
+
+
+def create_sequences(data, feature_cols, target_col, sequence_length=1):
+    # Same outputs as the original per-player loop: windows of
+    # `sequence_length` seasons predicting the next season's target, players
+    # in player_id order and seasons in season_name order
+    pids = data['player_id'].to_numpy()
+    seasons = data['season_name'].to_numpy()
+    window_rows, target_rows = sequence_index(pids, seasons, sequence_length)
+    if len(target_rows) == 0:
+        return np.array([]), np.array([]), [], []
+
+    X = data[feature_cols].to_numpy()[window_rows]
+    y = data[target_col].to_numpy()[target_rows]
+    return X, y, pids[target_rows].tolist(), seasons[target_rows].tolist()
@@ -0,0 +1,211 @@
+# serve.py
+# Multi-process launcher for the prediction APIs (Linux / fork only).
+#
+# The parent imports the app once (model, feature tables and all), freezes the
+# heap out of the garbage collector and then forks the workers, so every
+# worker shares the loaded model pages copy-on-write instead of holding its
+# own copy. All workers accept on one listening socket.
+#
+# A global cap on in-flight requests is kept in shared memory. When every slot
+# is taken a request gets an immediate 503 instead of joining a queue, which
+# keeps tail latency flat under overload.
+#
+#   python serve.py main:app --workers 16 --max-inflight 256
+#   python serve.py "Project source code/main.py:app" --workers 8 --port 8001
+import os
+
+# One compute thread per worker: N workers x N OpenMP threads oversubscribes
+# the node and is the main source of p99 jitter. Must be set before the
+# model libraries are imported.
+os.environ.setdefault("OMP_NUM_THREADS", "1")
+
+import argparse
+import gc
+import importlib
+import importlib.util
+import json
+import multiprocessing
+import signal
+import socket
+import sys
+import time
+
+import uvicorn
+
+
+def load_app(target):
+    # "module:attr" or "path/to/file.py:attr"
+    location, _, attr = target.rpartition(":")
+    if location.endswith(".py"):
+        path = os.path.abspath(location)
+        # The app resolves its artifacts relative to its own folder
+        os.chdir(os.path.dirname(path))
+        sys.path.insert(0, os.path.dirname(path))
+        spec = importlib.util.spec_from_file_location("served_app", path)
+        module = importlib.util.module_from_spec(spec)
+        sys.modules["served_app"] = module
+        spec.loader.exec_module(module)
+    else:
+        module = importlib.import_module(location)
+    return module, getattr(module, attr)
+
+
+class AdmissionControl:
+    # ASGI middleware enforcing a node-wide in-flight limit across workers
+    def __init__(self, app, inflight, rejected, worker_index, max_inflight, retry_after=1):
+        self.app = app
+        self.inflight = inflight
+        self.rejected = rejected
+        self.worker_index = worker_index
+        self.max_inflight = max_inflight
+        self.retry_after = str(retry_after).encode()
+
+    def try_acquire(self):
+        with self.inflight.get_lock():
+            if sum(self.inflight) >= self.max_inflight:
+                self.rejected[self.worker_index] += 1
+                return False
+            self.inflight[self.worker_index] += 1
+            return True
+
+    def release(self):
+        with self.inflight.get_lock():
+            self.inflight[self.worker_index] -= 1
+
+    def stats(self):
+        with self.inflight.get_lock():
+            per_worker = list(self.inflight)
+        return {
+            "max_inflight": self.max_inflight,
+            "inflight": sum(per_worker),
+            "inflight_per_worker": per_worker,
+            "rejected_total": sum(self.rejected),
+            "worker_index": self.worker_index,
+            "pid": os.getpid(),
+        }
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        if scope["path"] == "/metrics/admission":
+            return await self._respond(send, 200, self.stats())
+        if not self.try_acquire():
+            return await self._respond(send, 503, {"detail": "server overloaded, retry later"},
+                                       [(b"retry-after", self.retry_after)])
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.release()
+
+    async def _respond(self, send, status, payload, extra_headers=()):
+        body = json.dumps(payload).encode()
+        headers = [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+        await send({"type": "http.response.start", "status": status, "headers": headers + list(extra_headers)})
+        await send({"type": "http.response.body", "body": body})
+
+
+def preload(module):
+    # Lazily loaded models (the Decision Tree API) must be in memory before the fork
+    if hasattr(module, "get_model"):
+        module.get_model()
+    # The ensemble's member models too; its thread pool starts no threads
+    # until the first request, so forking after this is safe
+    if hasattr(module, "get_ensemble") and os.path.exists(getattr(module, "ENSEMBLE_CONFIG", "")):
+        module.get_ensemble()
+
+
+def run_worker(app, sock, index, args, inflight, rejected):
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    guarded = AdmissionControl(app, inflight, rejected, index, args.max_inflight)
+    config = uvicorn.Config(guarded, log_level=args.log_level, access_log=False,
+                            timeout_keep_alive=args.keep_alive, lifespan="on")
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fork-after-load launcher for the prediction APIs")
+    parser.add_argument("target", nargs="?", default="main:app")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--max-inflight", type=int, default=None,
+                        help="node-wide cap on concurrent requests (default: 16 per worker)")
+    parser.add_argument("--backlog", type=int, default=2048)
+    parser.add_argument("--keep-alive", type=int, default=5)
+    parser.add_argument("--log-level", default="warning")
+    args = parser.parse_args()
+    if args.max_inflight is None:
+        args.max_inflight = 16 * args.workers
+
+    start = time.perf_counter()
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    module, app = load_app(args.target)
+    preload(module)
+    load_ms = (time.perf_counter() - start) * 1000
+
+    # Everything loaded so far is shared with the workers; keep the collector
+    # from touching (and so un-sharing) those pages
+    gc.collect()
+    gc.freeze()
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((args.host, args.port))
+    sock.listen(args.backlog)
+    sock.set_inheritable(True)
+
+    inflight = multiprocessing.Array("i", args.workers)
+    rejected = multiprocessing.Array("i", args.workers, lock=False)
+    children = {}
+
+    def spawn(index):
+        pid = os.fork()
+        if pid == 0:
+            try:
+                run_worker(app, sock, index, args, inflight, rejected)
+            finally:
+                os._exit(0)
+        children[pid] = index
+
+    for i in range(args.workers):
+        spawn(i)
+    print(f"✅ {args.target} loaded in {load_ms:.0f} ms; {args.workers} workers on "
+          f"{args.host}:{args.port}, max in-flight {args.max_inflight}")
+
+    stopping = False
+
+    def shutdown(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, shutdown)
+    signal.signal(signal.SIGTERM, shutdown)
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        index = children.pop(pid, None)
+        if index is None:
+            continue
+        # A dead worker cannot release its slots; reclaim them
+        with inflight.get_lock():
+            inflight[index] = 0
+        if not stopping:
+            print(f"worker {index} (pid {pid}) exited with status {status}; restarting")
+            spawn(index)
+
+    sock.close()
+
+
+if __name__ == "__main__":
+    main()
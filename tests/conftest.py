@@ -0,0 +1,5 @@
+# The modules under test are flat scripts at the repository root
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
@@ -0,0 +1,101 @@
+# Parity of the compiled node tables with each library's own predict, on
+# small models trained here, including NaN and zero inputs.
+import numpy as np
+import pytest
+
+from tree_engine import TOLERANCE, TreeEnsemble, check_against_native
+
+
+def training_data(n=2000, n_features=6, seed=0):
+    # No NaNs and no exact zeros, so LightGBM leaves every split without a
+    # missing type and serving-time NaNs must be compared as 0.0, which with
+    # thresholds on both sides of zero is not the same as always going left
+    rng = np.random.default_rng(seed)
+    X = rng.uniform(-5, 5, size=(n, n_features))
+    y = X[:, 0] * 2 + np.sin(X[:, 1]) * 5 + X[:, 2] * X[:, 3] + rng.normal(0, 0.1, n)
+    return X, y
+
+
+def with_missing(X, value, share=0.1, seed=1):
+    X = X.copy()
+    X[np.random.default_rng(seed).random(X.shape) < share] = value
+    return X
+
+
+def assert_parity(ensemble, native, X):
+    expected = np.asarray(native.predict(X), dtype=np.float64)
+    got = ensemble.predict(X)
+    rel = np.abs(got - expected) / np.maximum(np.abs(expected), 1.0)
+    assert rel.max() <= TOLERANCE[ensemble.source]
+
+
+def test_lightgbm_nan_on_splits_without_missing_type():
+    lgb = pytest.importorskip("lightgbm")
+    X, y = training_data()
+    booster = lgb.train({"objective": "regression", "num_leaves": 15, "verbose": -1},
+                        lgb.Dataset(X, y), num_boost_round=30)
+    ensemble = TreeEnsemble.from_lightgbm(booster)
+    assert not ensemble.has_nan_rules and not ensemble.has_zero_rules
+
+    assert_parity(ensemble, booster, X)
+    assert_parity(ensemble, booster, with_missing(X, np.nan))
+    assert_parity(ensemble, booster, with_missing(X, 0.0))
+    max_rel, tol = check_against_native(ensemble, booster)
+    assert max_rel <= tol
+
+
+def test_lightgbm_nan_rules_and_text_roundtrip(tmp_path):
+    lgb = pytest.importorskip("lightgbm")
+    X, y = training_data()
+    X = with_missing(X, np.nan, share=0.05, seed=2)
+    booster = lgb.train({"objective": "regression", "num_leaves": 15, "verbose": -1},
+                        lgb.Dataset(X, y), num_boost_round=30)
+    ensemble = TreeEnsemble.from_lightgbm_text(booster.model_to_string())
+    ensemble.save(tmp_path / "model.npz")
+    loaded = TreeEnsemble.load(tmp_path / "model.npz")
+
+    assert_parity(loaded, booster, with_missing(X, np.nan, seed=3))
+    assert_parity(loaded, booster, with_missing(X, 0.0, seed=4))
+
+
+def test_xgboost_parity():
+    xgb = pytest.importorskip("xgboost")
+    X, y = training_data()
+    model = xgb.XGBRegressor(n_estimators=30, max_depth=4).fit(X, y)
+    ensemble = TreeEnsemble.from_xgboost(model)
+
+    assert_parity(ensemble, model, X)
+    assert_parity(ensemble, model, with_missing(X, np.nan))
+    assert_parity(ensemble, model, with_missing(X, 0.0))
+
+
+def test_sklearn_parity():
+    tree = pytest.importorskip("sklearn.tree")
+    X, y = training_data()
+    model = tree.DecisionTreeRegressor(max_depth=8, random_state=0).fit(X, y)
+    ensemble = TreeEnsemble.from_sklearn(model)
+
+    assert_parity(ensemble, model, X)
+    assert_parity(ensemble, model, with_missing(X, 0.0))
+    max_rel, tol = check_against_native(ensemble, model)
+    assert max_rel <= tol
+
+
+@pytest.mark.parametrize("params", [{"objective": "poisson"}, {"objective": "binary"},
+                                    {"objective": "regression", "linear_tree": True}])
+def test_lightgbm_rejects_transformed_and_linear_models(params):
+    lgb = pytest.importorskip("lightgbm")
+    X, y = training_data(n=500)
+    y = (y > 0).astype(float) if params["objective"] == "binary" else np.abs(y)
+    booster = lgb.train({**params, "verbose": -1}, lgb.Dataset(X, y), num_boost_round=3)
+    with pytest.raises(NotImplementedError):
+        TreeEnsemble.from_lightgbm_text(booster.model_to_string())
+
+
+def test_check_against_native_fails_when_native_rejects_plain_rows():
+    tree = pytest.importorskip("sklearn.tree")
+    X, y = training_data()
+    ensemble = TreeEnsemble.from_sklearn(tree.DecisionTreeRegressor(max_depth=4).fit(X, y))
+    other = tree.DecisionTreeRegressor(max_depth=4).fit(X[:, :5], y)
+    with pytest.raises(ValueError):
+        check_against_native(ensemble, other)
@@ -0,0 +1,201 @@
+# train_xgb_external.py
+# Out-of-core training for the XGBoost model.
+#
+# XGBoost.ipynb reads the whole training matrix into RAM (and once had to cut
+# the polynomial features into poly_train_part1/2.csv to make it fit). This
+# streams the training files chunk by chunk through an xgb.DataIter instead:
+#
+#   quantile  - QuantileDMatrix over the iterator: the raw floats are never
+#               held at once, only the quantized pages (~1 byte per value)
+#   external  - ExtMemQuantileDMatrix: the quantized pages live in a cache on
+#               disk as well, so not even those have to fit in memory
+#
+# Both train the same tree_method="hist" model as the notebook. --check trains
+# the in-memory notebook version too and compares the predictions.
+#
+#   python train_xgb_external.py --X X_train_top_features.csv --y y_train.csv --out xgb_top20.json
+#   python train_xgb_external.py --X poly_train_part1.csv,poly_train_part2.csv --X-side other_train.csv \
+#       --y y_train.csv --mode external --cache-dir xgb_cache --out xgb_poly.json
+import argparse
+import json
+import os
+import resource
+import time
+
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+
+# Same settings as the tuned notebook run
+DEFAULT_PARAMS = {
+    "objective": "reg:squarederror",
+    "eval_metric": "rmse",
+    "tree_method": "hist",
+    "max_depth": 6,
+    "eta": 0.1,
+    "subsample": 0.7,
+    "colsample_bytree": 0.7,
+    "seed": 42,
+}
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _open(path, chunk_rows):
+    if path.endswith(".parquet"):
+        import pyarrow.parquet as pq
+        return (batch.to_pandas() for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_rows))
+    return pd.read_csv(path, chunksize=chunk_rows, dtype=np.float32)
+
+
+class _Aligned:
+    # Reads exactly as many rows as asked from a list of files read one after another
+    def __init__(self, paths, chunk_rows):
+        self.paths = list(paths)
+        self.chunk_rows = chunk_rows
+        self.readers = iter(())
+        self.buffer = None
+
+    def take(self, n):
+        parts = []
+        while n > 0:
+            if self.buffer is None or len(self.buffer) == 0:
+                self.buffer = next(self.readers, None)
+                if self.buffer is None:
+                    if not self.paths:
+                        raise ValueError("side / label files have fewer rows than the training files")
+                    self.readers = _open(self.paths.pop(0), self.chunk_rows)
+                    continue
+            part, self.buffer = self.buffer.iloc[:n], self.buffer.iloc[n:]
+            parts.append(part.reset_index(drop=True))
+            n -= len(part)
+        return pd.concat(parts, ignore_index=True) if len(parts) > 1 else parts[0]
+
+
+class ChunkIter(xgb.DataIter):
+    # Row chunks of the training files (concatenated top to bottom), with the
+    # side files joined column-wise and the label file read alongside
+    def __init__(self, x_paths, y_paths, side_paths=(), chunk_rows=100_000, cache_prefix=None):
+        self.x_paths = x_paths
+        self.y_paths = y_paths
+        self.side_paths = side_paths
+        self.chunk_rows = chunk_rows
+        self.chunks = 0
+        self.feature_names = None
+        super().__init__(cache_prefix=cache_prefix)
+        self.reset()
+
+    def _chunks(self):
+        for path in self.x_paths:
+            yield from _open(path, self.chunk_rows)
+
+    def reset(self):
+        self.source = self._chunks()
+        self.labels = _Aligned(self.y_paths, self.chunk_rows)
+        self.sides = [_Aligned([path], self.chunk_rows) for path in self.side_paths]
+        self.pass_chunks = 0
+
+    def next(self, input_data):
+        chunk = next(self.source, None)
+        if chunk is None:
+            self.chunks = self.pass_chunks
+            return False
+        frames = [chunk.reset_index(drop=True)] + [side.take(len(chunk)) for side in self.sides]
+        X = pd.concat(frames, axis=1) if len(frames) > 1 else frames[0]
+        y = self.labels.take(len(chunk)).iloc[:, 0].to_numpy(dtype=np.float32)
+        if self.feature_names is None:
+            self.feature_names = X.columns.tolist()
+        input_data(data=X.to_numpy(dtype=np.float32), label=y, feature_names=self.feature_names)
+        self.pass_chunks += 1
+        return True
+
+
+def build_matrix(it, mode, max_bin=256):
+    if mode == "external":
+        return xgb.ExtMemQuantileDMatrix(it, max_bin=max_bin)
+    return xgb.QuantileDMatrix(it, max_bin=max_bin)
+
+
+def load_in_memory(x_paths, y_paths, side_paths):
+    # The notebook way, for --check only
+    X = pd.concat([pd.read_csv(p, dtype=np.float32) for p in x_paths], ignore_index=True)
+    if side_paths:
+        X = pd.concat([X] + [pd.read_csv(p, dtype=np.float32) for p in side_paths], axis=1)
+    y = pd.concat([pd.read_csv(p, dtype=np.float32) for p in y_paths], ignore_index=True).values.ravel()
+    return X, y
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the XGBoost model from chunked files")
+    parser.add_argument("--X", required=True, help="comma-separated training files, stacked top to bottom")
+    parser.add_argument("--X-side", default="", help="comma-separated files joined column-wise (e.g. other_train.csv)")
+    parser.add_argument("--y", required=True, help="comma-separated label files")
+    parser.add_argument("--mode", choices=["quantile", "external"], default="quantile")
+    parser.add_argument("--cache-dir", default="xgb_cache", help="page cache for --mode external")
+    parser.add_argument("--chunk-rows", type=int, default=100_000)
+    parser.add_argument("--params", default=None, help="JSON file with params (e.g. tune.py best_params.json)")
+    parser.add_argument("--rounds", type=int, default=None)
+    parser.add_argument("--max-bin", type=int, default=256)
+    parser.add_argument("--out", default="xgb_external_model.json")
+    parser.add_argument("--check", action="store_true", help="also train in memory and compare predictions")
+    args = parser.parse_args()
+
+    split = lambda s: [p for p in s.split(",") if p]
+    x_paths, side_paths, y_paths = split(args.X), split(args.X_side), split(args.y)
+
+    params, rounds = dict(DEFAULT_PARAMS), 500
+    if args.params:
+        with open(args.params) as f:
+            tuned = json.load(f)
+        params.update(tuned.get("params", tuned))
+        rounds = tuned.get("num_boost_round", rounds)
+    rounds = args.rounds or rounds
+
+    cache_prefix = None
+    if args.mode == "external":
+        os.makedirs(args.cache_dir, exist_ok=True)
+        cache_prefix = os.path.join(args.cache_dir, "train")
+
+    rss_before = peak_rss_mb()
+    start = time.perf_counter()
+    it = ChunkIter(x_paths, y_paths, side_paths, chunk_rows=args.chunk_rows, cache_prefix=cache_prefix)
+    dtrain = build_matrix(it, args.mode, max_bin=args.max_bin)
+    build_s = time.perf_counter() - start
+    n_rows, n_cols = dtrain.num_row(), dtrain.num_col()
+    print(f"✅ {args.mode} matrix: {n_rows:,} rows x {n_cols} features from {it.chunks} chunks "
+          f"in {build_s:.1f} s ({n_rows / build_s:,.0f} rows/s), peak RSS {peak_rss_mb():,.0f} MB")
+
+    start = time.perf_counter()
+    bst = xgb.train(params, dtrain, num_boost_round=rounds, evals=[(dtrain, "train")], verbose_eval=50)
+    train_s = time.perf_counter() - start
+    bst.save_model(args.out)
+    report = {
+        "mode": args.mode, "rows": n_rows, "features": n_cols, "rounds": rounds,
+        "build_seconds": build_s, "train_seconds": train_s,
+        "rows_per_second": n_rows / build_s, "row_rounds_per_second": n_rows * rounds / train_s,
+        "peak_rss_mb": peak_rss_mb(), "rss_at_start_mb": rss_before,
+    }
+    print(f"✅ Trained {rounds} rounds in {train_s:.1f} s "
+          f"({report['row_rounds_per_second']:,.0f} row-rounds/s), peak RSS {report['peak_rss_mb']:,.0f} MB -> {args.out}")
+
+    if args.check:
+        # Peak RSS above already covers the streamed run; this loads everything
+        X, y = load_in_memory(x_paths, y_paths, side_paths)
+        reference = xgb.train(params, xgb.DMatrix(X, label=y), num_boost_round=rounds)
+        dcheck = xgb.DMatrix(X)
+        streamed, in_memory = bst.predict(dcheck), reference.predict(dcheck)
+        rmse = lambda p: float(np.sqrt(np.mean((p - y) ** 2)))
+        report.update(check_max_abs_diff=float(np.max(np.abs(streamed - in_memory))),
+                      check_rmse_streamed=rmse(streamed), check_rmse_in_memory=rmse(in_memory))
+        print(f"check: max |streamed - in-memory| {report['check_max_abs_diff']:.3e}, train RMSE "
+              f"{report['check_rmse_streamed']:.5f} vs {report['check_rmse_in_memory']:.5f}")
+
+    with open(os.path.splitext(args.out)[0] + "_report.json", "w") as f:
+        json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
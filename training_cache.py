@@ -0,0 +1,142 @@
+# training_cache.py
+# Preprocessing-artifact cache for the Model2 LSTM / XGBoost stack.
+#
+# The first run reads final_master_dataset.csv, builds the model frame, fits
+# the LSTM MinMaxScaler and builds the sequences, then writes everything as
+# .npy files under cache/<key>/. The key hashes the dataset bytes together
+# with the feature lists and sequence settings, so any change to either
+# rebuilds. Later runs skip all of that and open the arrays memory-mapped;
+# the LSTM reads its batches straight from the mapped files through tf.data,
+# so resident memory stays flat as the dataset grows.
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import time
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+from sklearn.preprocessing import MinMaxScaler
+
+from sequences import sequence_index
+
+CACHE_FORMAT = 1
+ARRAY_NAMES = ("player_id", "season_name", "features", "target", "lstm_scaled",
+               "X_seq", "y_seq", "seq_player_id", "seq_season_name")
+
+
+def cache_key(dataset_path, spec):
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(json.dumps({"format": CACHE_FORMAT, **spec}, sort_keys=True).encode())
+    with open(dataset_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 22), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _column_array(series):
+    # Fixed-width strings instead of objects so the array can be memory-mapped
+    values = series.to_numpy()
+    return values.astype(str) if values.dtype == object else values
+
+
+def _write_sequences(path_x, path_y, scaled, log_target, window_rows, target_rows, chunk=65536):
+    # Gather the windows straight into the .npy files, chunk by chunk
+    n, L = window_rows.shape
+    X = np.lib.format.open_memmap(path_x, mode="w+", dtype=np.float32, shape=(n, L, scaled.shape[1]))
+    for start in range(0, n, chunk):
+        X[start:start + chunk] = scaled[window_rows[start:start + chunk]]
+    X.flush()
+    del X
+    np.save(path_y, log_target[target_rows].astype(np.float32))
+
+
+def build(dataset_path, cache_dir, prepare, feature_cols, target_col, raw_columns, sequence_length=1):
+    # `prepare(df)` turns the raw columns into the model frame (dropna +
+    # engineered features), exactly as Model2 does for a full run
+    tmp_dir = cache_dir + ".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    df_model = prepare(pd.read_csv(dataset_path, usecols=raw_columns))
+    features = df_model[feature_cols].to_numpy(dtype=np.float64)
+    target = df_model[target_col].to_numpy(dtype=np.float64)
+    player_id = _column_array(df_model["player_id"])
+    season_name = _column_array(df_model["season_name"])
+    del df_model
+
+    scaler = MinMaxScaler()
+    scaled = scaler.fit_transform(features)
+    window_rows, target_rows = sequence_index(player_id, season_name, sequence_length)
+
+    np.save(os.path.join(tmp_dir, "player_id.npy"), player_id)
+    np.save(os.path.join(tmp_dir, "season_name.npy"), season_name)
+    np.save(os.path.join(tmp_dir, "features.npy"), features)
+    np.save(os.path.join(tmp_dir, "target.npy"), target)
+    np.save(os.path.join(tmp_dir, "lstm_scaled.npy"), scaled)
+    _write_sequences(os.path.join(tmp_dir, "X_seq.npy"), os.path.join(tmp_dir, "y_seq.npy"),
+                     scaled, np.log1p(target), window_rows, target_rows)
+    np.save(os.path.join(tmp_dir, "seq_player_id.npy"), player_id[target_rows])
+    np.save(os.path.join(tmp_dir, "seq_season_name.npy"), season_name[target_rows])
+    with open(os.path.join(tmp_dir, "lstm_feature_scaler.pkl"), "wb") as f:
+        pickle.dump(scaler, f)
+    with open(os.path.join(tmp_dir, "meta.json"), "w") as f:
+        json.dump({"dataset": os.path.abspath(dataset_path), "feature_cols": feature_cols,
+                   "target_col": target_col, "sequence_length": sequence_length,
+                   "rows": len(target), "sequences": len(target_rows),
+                   "created_at": time.strftime("%Y-%m-%dT%H:%M:%S")}, f, indent=2)
+
+    # Publish the finished directory in one step so readers never see half a cache
+    shutil.rmtree(cache_dir, ignore_errors=True)
+    os.replace(tmp_dir, cache_dir)
+
+
+def open_cache(cache_dir):
+    arrays = {name: np.load(os.path.join(cache_dir, f"{name}.npy"), mmap_mode="r") for name in ARRAY_NAMES}
+    with open(os.path.join(cache_dir, "lstm_feature_scaler.pkl"), "rb") as f:
+        arrays["lstm_feature_scaler"] = pickle.load(f)
+    with open(os.path.join(cache_dir, "meta.json")) as f:
+        arrays["meta"] = json.load(f)
+    arrays["cache_dir"] = cache_dir
+    return SimpleNamespace(**arrays)
+
+
+def load_or_build(dataset_path, cache_root, prepare, feature_cols, target_col, raw_columns,
+                  sequence_length=1, spec_extra=None):
+    spec = {"feature_cols": feature_cols, "target_col": target_col, "raw_columns": raw_columns,
+            "sequence_length": sequence_length, **(spec_extra or {})}
+    cache_dir = os.path.join(cache_root, cache_key(dataset_path, spec))
+    if os.path.exists(os.path.join(cache_dir, "meta.json")):
+        print(f"✅ Using cached training arrays from {cache_dir}")
+    else:
+        start = time.perf_counter()
+        build(dataset_path, cache_dir, prepare, feature_cols, target_col, raw_columns, sequence_length)
+        print(f"✅ Built training arrays in {time.perf_counter() - start:.1f} s -> {cache_dir}")
+    return open_cache(cache_dir)
+
+
+def memmap_dataset(X, y, indices, batch_size=32, shuffle=True, seed=42):
+    # Streams (X[idx], y[idx]) batches from memory-mapped arrays. The generator
+    # is re-run every epoch, so shuffling reshuffles per epoch like Keras does
+    # for in-memory arrays; only one batch is materialised at a time.
+    import tensorflow as tf
+
+    indices = np.asarray(indices)
+    rng = np.random.default_rng(seed)
+
+    def batches():
+        order = rng.permutation(indices) if shuffle else indices
+        for start in range(0, len(order), batch_size):
+            # Sorted indices read the mapped file front to back
+            idx = np.sort(order[start:start + batch_size])
+            yield np.asarray(X[idx], dtype=np.float32), np.asarray(y[idx], dtype=np.float32)
+
+    signature = (tf.TensorSpec(shape=(None,) + tuple(X.shape[1:]), dtype=tf.float32),
+                 tf.TensorSpec(shape=(None,), dtype=tf.float32))
+    n_batches = -(-len(indices) // batch_size)
+    dataset = tf.data.Dataset.from_generator(batches, output_signature=signature)
+    # A known length lets Keras show progress and re-iterate cleanly each epoch
+    dataset = dataset.apply(tf.data.experimental.assert_cardinality(n_batches))
+    return dataset.prefetch(tf.data.AUTOTUNE)
@@ -0,0 +1,378 @@
+# tree_engine.py
+# Array-backed inference for the shipped tree models.
+#
+# Every supported artifact (LightGBM text/pickle, XGBoost joblib, sklearn
+# decision tree pickle) is flattened into one set of NumPy node tables:
+#   feature, threshold, left, right, value, default_left, missing_type
+# with all trees concatenated and `roots` pointing at each tree's first node.
+# Prediction walks every tree for a whole batch one level at a time, so it is
+# a handful of fancy-indexing ops per depth level instead of per-row calls.
+#
+# Compiled tables are saved as .npz and loaded with NumPy alone, so serving
+# does not need lightgbm, xgboost or sklearn installed.
+#
+#   python tree_engine.py compile lightgbm_model.txt
+#   python tree_engine.py compile xgboost_model.joblib --out xgboost_model.npz
+import argparse
+import json
+import os
+import re
+
+import numpy as np
+
+# Missing-value handling per node (mirrors LightGBM's MissingType)
+MISSING_NONE, MISSING_ZERO, MISSING_NAN = 0, 1, 2
+LGBM_ZERO_THRESHOLD = 1e-35
+
+# Max relative difference accepted against each library's own predict
+TOLERANCE = {"lightgbm": 1e-9, "xgboost": 1e-5, "sklearn": 1e-9}
+
+
+class TreeEnsemble:
+    def __init__(self, feature, threshold, left, right, value, default_left, missing_type,
+                 roots, base_score=0.0, average=False, strict=False, input_dtype="float64",
+                 source="lightgbm", feature_names=None):
+        self.feature = np.asarray(feature, dtype=np.int32)
+        self.threshold = np.asarray(threshold, dtype=np.float64)
+        self.left = np.asarray(left, dtype=np.int32)
+        self.right = np.asarray(right, dtype=np.int32)
+        self.value = np.asarray(value, dtype=np.float64)
+        self.default_left = np.asarray(default_left, dtype=bool)
+        self.missing_type = np.asarray(missing_type, dtype=np.int8)
+        self.roots = np.asarray(roots, dtype=np.int32)
+        self.base_score = float(base_score)
+        self.average = bool(average)
+        # XGBoost splits on x < t, LightGBM and sklearn on x <= t
+        self.strict = bool(strict)
+        # XGBoost and sklearn compare float32 inputs against their thresholds
+        self.input_dtype = input_dtype
+        self.source = source
+        self.feature_names = list(feature_names) if feature_names is not None else None
+
+        self.is_leaf = self.left < 0
+        self.max_depth = self._max_depth()
+        inner_missing = self.missing_type[~self.is_leaf]
+        self.has_nan_rules = bool(np.any(inner_missing == MISSING_NAN))
+        self.has_zero_rules = bool(np.any(inner_missing == MISSING_ZERO))
+
+        # Interleaved child table for the hot loop: children[2*i] is the left
+        # child of node i and children[2*i + 1] the right one. Leaves point at
+        # themselves, so rows that finish early just stay put.
+        own = np.arange(len(self.left), dtype=np.int64)
+        self.children = np.empty(2 * len(self.left), dtype=np.int64)
+        self.children[0::2] = np.where(self.is_leaf, own, self.left)
+        self.children[1::2] = np.where(self.is_leaf, own, self.right)
+        self.node_feature = self.feature.astype(np.int64)
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    def _max_depth(self):
+        depth = 0
+        frontier = self.roots[~self.is_leaf[self.roots]]
+        while len(frontier):
+            depth += 1
+            children = np.concatenate([self.left[frontier], self.right[frontier]])
+            frontier = children[~self.is_leaf[children]]
+        return depth
+
+    # ------------------------------------------------------------------
+    # Prediction
+    # ------------------------------------------------------------------
+    def predict(self, X, chunk_size=4096):
+        X = np.asarray(X)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        X = X.astype(self.input_dtype, copy=False)
+        out = np.empty(X.shape[0], dtype=np.float64)
+        for start in range(0, X.shape[0], chunk_size):
+            stop = start + chunk_size
+            out[start:stop] = self._predict_chunk(X[start:stop])
+        return out
+
+    def _predict_chunk(self, X):
+        n, n_features = X.shape
+        X = np.ascontiguousarray(X).ravel()
+        # Flat (row, tree) state: node[i * n_trees + t] is row i's node in tree t
+        node = np.tile(self.roots.astype(np.int64), n)
+        row_base = np.repeat(np.arange(n, dtype=np.int64) * n_features, self.n_trees)
+        # Any NaN takes the missing-value path: NaN-tracking splits send it the
+        # default way, and LightGBM splits without a missing type compare it as
+        # 0.0. Zeros matter for zero-as-missing splits only.
+        use_missing = self.has_zero_rules or np.isnan(X).any()
+
+        for _ in range(self.max_depth):
+            x = X[row_base + self.node_feature[node]]
+            thr = self.threshold[node]
+            if use_missing:
+                go_right = ~self._decide_with_missing(node, x, thr)
+            else:
+                go_right = x >= thr if self.strict else x > thr
+            node = self.children[2 * node + go_right]
+            if self.is_leaf[node].all():
+                break
+
+        total = self.value[node].reshape(n, self.n_trees).sum(axis=1)
+        if self.average:
+            total /= self.n_trees
+        return total + self.base_score
+
+    def _decide_with_missing(self, node, x, thr):
+        missing_type = self.missing_type[node]
+        is_nan = np.isnan(x)
+        # LightGBM treats NaN as 0.0 unless the split tracks NaN explicitly
+        x = np.where(is_nan & (missing_type != MISSING_NAN), 0, x)
+        is_missing = ((missing_type == MISSING_NAN) & is_nan) | \
+                     ((missing_type == MISSING_ZERO) & (np.abs(x) <= LGBM_ZERO_THRESHOLD))
+        with np.errstate(invalid="ignore"):
+            go_left = x < thr if self.strict else x <= thr
+        return np.where(is_missing, self.default_left[node], go_left)
+
+    # ------------------------------------------------------------------
+    # Persistence (NumPy only)
+    # ------------------------------------------------------------------
+    def save(self, path):
+        meta = {
+            "base_score": self.base_score, "average": self.average, "strict": self.strict,
+            "input_dtype": self.input_dtype, "source": self.source,
+            "feature_names": self.feature_names,
+        }
+        np.savez(
+            path, feature=self.feature, threshold=self.threshold, left=self.left,
+            right=self.right, value=self.value, default_left=self.default_left,
+            missing_type=self.missing_type, roots=self.roots, meta=json.dumps(meta),
+        )
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as npz:
+            meta = json.loads(str(npz["meta"]))
+            tables = {k: npz[k] for k in npz.files if k != "meta"}
+        return cls(**tables, **meta)
+
+    # ------------------------------------------------------------------
+    # Loaders
+    # ------------------------------------------------------------------
+    @classmethod
+    def from_lightgbm_text(cls, text):
+        # Parses the LightGBM model text format directly; no lightgbm import needed
+        header, _, body = text.partition("\nTree=")
+        body = body.split("\nend of trees")[0]
+        feature_names = None
+        m = re.search(r"^feature_names=(.*)$", header, re.M)
+        if m:
+            feature_names = m.group(1).split()
+        average = re.search(r"^average_output\s*$", header, re.M) is not None
+        # Only objectives whose prediction is the raw sum of the leaves
+        m = re.search(r"^objective=(\S+)", header, re.M)
+        objective = m.group(1) if m else "regression"
+        if objective not in ("regression", "regression_l1", "huber", "fair", "quantile", "mape"):
+            raise NotImplementedError(f"LightGBM objective {objective!r} is not supported")
+
+        tables = {k: [] for k in ("feature", "threshold", "left", "right", "value", "default_left", "missing_type")}
+        roots = []
+        offset = 0
+        for block in body.split("\nTree="):
+            fields = dict(line.split("=", 1) for line in block.splitlines() if "=" in line)
+            if fields.get("is_linear", "0") != "0":
+                raise NotImplementedError("linear_tree LightGBM models are not supported")
+            leaf_values = np.array(fields["leaf_value"].split(), dtype=np.float64)
+            n_leaves = len(leaf_values)
+            n_inner = n_leaves - 1
+            roots.append(offset)
+
+            if n_inner == 0:
+                tables["feature"].append(np.zeros(1, dtype=np.int32))
+                tables["threshold"].append(np.zeros(1))
+                tables["left"].append(np.full(1, -1))
+                tables["right"].append(np.full(1, -1))
+                tables["value"].append(leaf_values)
+                tables["default_left"].append(np.zeros(1, dtype=bool))
+                tables["missing_type"].append(np.zeros(1, dtype=np.int8))
+                offset += 1
+                continue
+
+            decision = np.array(fields["decision_type"].split(), dtype=np.int32)
+            if np.any(decision & 1):
+                raise NotImplementedError("categorical LightGBM splits are not supported")
+
+            # Inner nodes first, then leaves; LightGBM encodes leaf j as child ~j
+            def remap(children):
+                children = np.array(children.split(), dtype=np.int64)
+                return np.where(children >= 0, offset + children, offset + n_inner + ~children)
+
+            tables["feature"].append(np.concatenate([np.array(fields["split_feature"].split(), dtype=np.int32), np.zeros(n_leaves, dtype=np.int32)]))
+            tables["threshold"].append(np.concatenate([np.array(fields["threshold"].split(), dtype=np.float64), np.zeros(n_leaves)]))
+            tables["left"].append(np.concatenate([remap(fields["left_child"]), np.full(n_leaves, -1)]))
+            tables["right"].append(np.concatenate([remap(fields["right_child"]), np.full(n_leaves, -1)]))
+            tables["value"].append(np.concatenate([np.zeros(n_inner), leaf_values]))
+            tables["default_left"].append(np.concatenate([(decision & 2) > 0, np.zeros(n_leaves, dtype=bool)]))
+            tables["missing_type"].append(np.concatenate([((decision >> 2) & 3).astype(np.int8), np.zeros(n_leaves, dtype=np.int8)]))
+            offset += n_inner + n_leaves
+
+        return cls(**{k: np.concatenate(v) for k, v in tables.items()}, roots=roots,
+                   average=average, source="lightgbm", feature_names=feature_names)
+
+    @classmethod
+    def from_lightgbm(cls, model):
+        # lgb.Booster or LGBMRegressor
+        booster = getattr(model, "booster_", model)
+        return cls.from_lightgbm_text(booster.model_to_string())
+
+    @classmethod
+    def from_xgboost(cls, model):
+        # XGBRegressor or xgb.Booster trained with a gbtree booster
+        booster = model.get_booster() if hasattr(model, "get_booster") else model
+        learner = json.loads(booster.save_raw(raw_format="json"))["learner"]
+        objective = learner["objective"]["name"]
+        if objective not in ("reg:squarederror", "reg:linear", "reg:absoluteerror", "reg:pseudohubererror"):
+            raise NotImplementedError(f"XGBoost objective {objective!r} is not supported")
+        gbm = learner["gradient_booster"]
+        if gbm["name"] != "gbtree":
+            raise NotImplementedError(f"XGBoost booster {gbm['name']!r} is not supported")
+        base_score = float(learner["learner_model_param"]["base_score"].strip("[]"))
+
+        tables = {k: [] for k in ("feature", "threshold", "left", "right", "value", "default_left", "missing_type")}
+        roots = []
+        offset = 0
+        for tree in gbm["model"]["trees"]:
+            left = np.array(tree["left_children"], dtype=np.int64)
+            right = np.array(tree["right_children"], dtype=np.int64)
+            if any(tree.get("split_type", [])):
+                raise NotImplementedError("categorical XGBoost splits are not supported")
+            leaf = left < 0
+            roots.append(offset)
+            tables["feature"].append(np.array(tree["split_indices"], dtype=np.int32))
+            # Thresholds are float32 in the model; the JSON decimals read back as
+            # float64 land beside them and flip inputs sitting on a cut point
+            conditions = np.asarray(tree["split_conditions"], dtype=np.float32).astype(np.float64)
+            tables["threshold"].append(np.where(leaf, 0.0, conditions))
+            tables["left"].append(np.where(leaf, -1, left + offset))
+            tables["right"].append(np.where(leaf, -1, right + offset))
+            # Leaves carry their output in split_conditions
+            tables["value"].append(np.where(leaf, tree["split_conditions"], 0.0))
+            tables["default_left"].append(np.array(tree["default_left"], dtype=bool))
+            tables["missing_type"].append(np.where(leaf, MISSING_NONE, MISSING_NAN).astype(np.int8))
+            offset += len(left)
+
+        feature_names = booster.feature_names
+        return cls(**{k: np.concatenate(v) for k, v in tables.items()}, roots=roots,
+                   base_score=base_score, strict=True, input_dtype="float32",
+                   source="xgboost", feature_names=feature_names)
+
+    @classmethod
+    def from_sklearn(cls, model):
+        # DecisionTreeRegressor (or anything exposing a single-output tree_)
+        tree = model.tree_
+        left = tree.children_left.astype(np.int64)
+        leaf = left < 0
+        missing_left = getattr(tree, "missing_go_to_left", None)
+        if missing_left is None:
+            default_left = np.zeros(tree.node_count, dtype=bool)
+            missing_type = np.zeros(tree.node_count, dtype=np.int8)
+        else:
+            default_left = np.asarray(missing_left, dtype=bool)
+            missing_type = np.where(leaf, MISSING_NONE, MISSING_NAN).astype(np.int8)
+        feature_names = getattr(model, "feature_names_in_", None)
+        return cls(
+            feature=np.where(leaf, 0, tree.feature), threshold=np.where(leaf, 0.0, tree.threshold),
+            left=left, right=tree.children_right, value=np.where(leaf, tree.value[:, 0, 0], 0.0),
+            default_left=default_left, missing_type=missing_type, roots=[0],
+            input_dtype="float32", source="sklearn",
+            feature_names=None if feature_names is None else feature_names.tolist(),
+        )
+
+    @classmethod
+    def from_model(cls, model):
+        module = type(model).__module__
+        if module.startswith("lightgbm"):
+            return cls.from_lightgbm(model)
+        if module.startswith("xgboost"):
+            return cls.from_xgboost(model)
+        if module.startswith("sklearn"):
+            return cls.from_sklearn(model)
+        raise TypeError(f"unsupported model type {type(model).__name__}")
+
+
+def load_native(path):
+    # The library's own model object, used for compiling and parity checks
+    if path.endswith(".txt"):
+        import lightgbm as lgb
+        return lgb.Booster(model_file=path)
+    import joblib
+    return joblib.load(path)
+
+
+def load_ensemble(path):
+    if path.endswith(".npz"):
+        return TreeEnsemble.load(path)
+    if path.endswith(".txt"):
+        with open(path) as f:
+            return TreeEnsemble.from_lightgbm_text(f.read())
+    return TreeEnsemble.from_model(load_native(path))
+
+
+def sample_rows(ensemble, n, seed=0):
+    # Draw each feature around the model's own split points so every branch is hit
+    rng = np.random.default_rng(seed)
+    n_features = int(ensemble.feature.max()) + 1
+    if ensemble.feature_names:
+        n_features = max(n_features, len(ensemble.feature_names))
+    X = rng.normal(size=(n, n_features))
+    inner = ~ensemble.is_leaf
+    for f in range(n_features):
+        thr = ensemble.threshold[inner & (ensemble.feature == f)]
+        thr = thr[np.isfinite(thr) & (np.abs(thr) < 1e300)]
+        if len(thr):
+            lo, hi = thr.min(), thr.max()
+            pad = max(hi - lo, 1.0) * 0.1
+            X[:, f] = rng.uniform(lo - pad, hi + pad, size=n)
+    return X
+
+
+def check_against_native(ensemble, native, n=2000, seed=0):
+    X = sample_rows(ensemble, n, seed)
+    # Also 1% zeros and 1% NaNs, to exercise the missing-value rules of every
+    # split type (including LightGBM's NaN -> 0.0 on splits without one)
+    rng = np.random.default_rng(seed + 1)
+    X_zero, X_nan = X.copy(), X.copy()
+    X_zero[rng.random(X.shape) < 0.01] = 0.0
+    X_nan[rng.random(X.shape) < 0.01] = np.nan
+    max_rel = 0.0
+    for batch, may_reject in ((X, False), (X_zero, False), (X_nan, True)):
+        try:
+            expected = np.asarray(native.predict(batch), dtype=np.float64)
+        except ValueError:
+            # Older sklearn trees reject NaN input outright; any other failure
+            # (a feature-count mismatch, say) means nothing was compared
+            if not may_reject:
+                raise
+            continue
+        got = ensemble.predict(batch)
+        rel = np.abs(got - expected) / np.maximum(np.abs(expected), 1.0)
+        max_rel = max(max_rel, float(rel.max()))
+    return max_rel, TOLERANCE[ensemble.source]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compile tree models into NumPy node tables")
+    sub = parser.add_subparsers(dest="command", required=True)
+    compile_cmd = sub.add_parser("compile")
+    compile_cmd.add_argument("model_path")
+    compile_cmd.add_argument("--out", default=None)
+    compile_cmd.add_argument("--check-rows", type=int, default=2000)
+    args = parser.parse_args()
+
+    native = load_native(args.model_path)
+    ensemble = TreeEnsemble.from_model(native)
+    out = args.out or os.path.splitext(args.model_path)[0] + ".npz"
+
+    if args.check_rows:
+        max_rel, tol = check_against_native(ensemble, native, n=args.check_rows)
+        print(f"max relative difference vs {ensemble.source}: {max_rel:.2e} (tolerance {tol:.0e})")
+        if max_rel > tol:
+            raise SystemExit("❌ Compiled tables do not match the native model; nothing written")
+
+    ensemble.save(out)
+    print(f"✅ {ensemble.n_trees} trees, {len(ensemble.feature)} nodes, depth {ensemble.max_depth} -> {out}")
@@ -0,0 +1,295 @@
+# tune.py
+# Hyperparameter search for the XGBoost / LightGBM regressors.
+#
+# The training matrix is quantized once into uint8 bin codes (quantile cut
+# points per feature, the same idea as tree_method="hist") and saved as .npy.
+# Tree models only look at the order of a feature's values, so training on the
+# codes is equivalent to training on the binned data. Every worker memory-maps
+# that file and builds each fold's training matrix once, then reuses it for all
+# the trials it runs; only the fold's rows are turned into floats, and only
+# while the library bins them. The dataset is rebuilt when --X / --y change
+# (size and mtime, as merge_engine.py checks its raw tables).
+#
+# Configurations are sampled at random and pruned with successive halving on
+# boosting rounds: every candidate is cross-validated at a small number of
+# rounds, the best 1/eta move up to eta times more rounds, and so on until the
+# full budget. Each finished (trial, rung, fold) is appended to trials.jsonl,
+# so an interrupted search picks up where it stopped.
+#
+#   python tune.py --engine xgboost --X X_train_top_features.csv --y y_train.csv --out tuning/xgb
+#   python tune.py --engine lightgbm --X X_train_top_features.csv --y y_train.csv --out tuning/lgb --workers 8
+import argparse
+import hashlib
+import json
+import math
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+from sklearn.model_selection import KFold
+
+MISSING_CODE = 255
+TRIALS_NAME = "trials.jsonl"
+
+# Fixed settings, as in XGBoost.ipynb
+BASE_PARAMS = {
+    "xgboost": {"objective": "reg:squarederror", "eval_metric": "rmse", "tree_method": "hist", "seed": 42},
+    "lightgbm": {"objective": "regression", "metric": "rmse", "seed": 42, "verbose": -1},
+}
+
+
+def sample_params(engine, rng):
+    if engine == "xgboost":
+        return {
+            "max_depth": int(rng.integers(3, 11)),
+            "eta": float(np.exp(rng.uniform(np.log(0.01), np.log(0.3)))),
+            "subsample": float(rng.uniform(0.5, 1.0)),
+            "colsample_bytree": float(rng.uniform(0.5, 1.0)),
+            "min_child_weight": float(np.exp(rng.uniform(0, np.log(20)))),
+            "lambda": float(np.exp(rng.uniform(np.log(0.1), np.log(10)))),
+        }
+    return {
+        "num_leaves": int(rng.integers(15, 256)),
+        "learning_rate": float(np.exp(rng.uniform(np.log(0.01), np.log(0.3)))),
+        "feature_fraction": float(rng.uniform(0.5, 1.0)),
+        "bagging_fraction": float(rng.uniform(0.5, 1.0)),
+        "bagging_freq": 1,
+        "min_data_in_leaf": int(rng.integers(5, 101)),
+        "lambda_l2": float(np.exp(rng.uniform(np.log(0.1), np.log(10)))),
+    }
+
+
+# ---------------- Quantized dataset ----------------
+def quantize(X, max_bin=255):
+    # Cut points per feature; columns with few distinct values keep one bin each
+    X = np.asarray(X, dtype=np.float64)
+    codes = np.full(X.shape, MISSING_CODE, dtype=np.uint8)
+    cuts = []
+    for j in range(X.shape[1]):
+        col = X[:, j]
+        present = ~np.isnan(col)
+        values = np.unique(col[present])
+        if len(values) <= max_bin:
+            edges = (values[:-1] + values[1:]) / 2
+        else:
+            edges = np.unique(np.quantile(col[present], np.linspace(0, 1, max_bin + 1)[1:-1]))
+        codes[present, j] = np.searchsorted(edges, col[present], side="right")
+        cuts.append(edges.tolist())
+    return codes, cuts
+
+
+def _fingerprint(x_path, y_path, n_folds, max_bin):
+    files = {}
+    for name, path in (("X", x_path), ("y", y_path)):
+        stat = os.stat(path)
+        files[name] = [os.path.abspath(path), stat.st_size, int(stat.st_mtime)]
+    return {"files": files, "folds": n_folds, "max_bin": max_bin}
+
+
+def prepare_dataset(x_path, y_path, out_dir, n_folds=5, max_bin=255):
+    X = pd.read_csv(x_path, dtype=np.float32)
+    y = pd.read_csv(y_path, dtype=np.float32).values.ravel()
+    codes, cuts = quantize(X.to_numpy(), max_bin=min(max_bin, MISSING_CODE))
+    np.save(os.path.join(out_dir, "bins.npy"), codes)
+    np.save(os.path.join(out_dir, "y.npy"), y)
+
+    # Same folds as the 5-fold KFold in XGBoost.ipynb
+    folds = list(KFold(n_splits=n_folds, shuffle=True, random_state=42).split(codes))
+    np.savez(os.path.join(out_dir, "folds.npz"), **{f"val_{i}": val for i, (_, val) in enumerate(folds)})
+
+    digest = hashlib.blake2b(codes.tobytes(), digest_size=8)
+    digest.update(y.tobytes())
+    meta = {"features": X.columns.tolist(), "rows": len(y), "folds": n_folds,
+            "max_bin": max_bin, "fingerprint": digest.hexdigest(), "cuts": cuts,
+            "inputs": _fingerprint(x_path, y_path, n_folds, max_bin)}
+    with open(os.path.join(out_dir, "dataset.json"), "w") as f:
+        json.dump(meta, f)
+    return meta
+
+
+def load_meta(out_dir):
+    with open(os.path.join(out_dir, "dataset.json")) as f:
+        return json.load(f)
+
+
+# ---------------- Worker side ----------------
+_data = {}
+_folds = {}
+
+
+def _init_worker(out_dir, threads):
+    os.environ["OMP_NUM_THREADS"] = str(threads)
+    # The bins stay memory-mapped: every worker reads the same pages
+    _data.update(codes=np.load(os.path.join(out_dir, "bins.npy"), mmap_mode="r"), y=np.load(os.path.join(out_dir, "y.npy")),
+                 folds=dict(np.load(os.path.join(out_dir, "folds.npz"))), threads=threads)
+
+
+def _float_rows(rows):
+    # Float32 copy of just these rows of the bins, NaN for the missing code
+    codes = _data["codes"][rows]
+    X = codes.astype(np.float32)
+    X[codes == MISSING_CODE] = np.nan
+    return X
+
+
+def _fold_matrices(engine, fold):
+    # Built once per worker and fold, then shared by every trial the worker runs
+    key = (engine, fold)
+    if key not in _folds:
+        y = _data["y"]
+        val = _data["folds"][f"val_{fold}"]
+        train = np.setdiff1d(np.arange(len(y)), val)
+        # The float rows are dropped once binned; the libraries keep their own bins
+        if engine == "xgboost":
+            import xgboost as xgb
+            dtrain = xgb.QuantileDMatrix(_float_rows(train), label=y[train], max_bin=256, nthread=_data["threads"])
+            dval = xgb.QuantileDMatrix(_float_rows(val), label=y[val], ref=dtrain, nthread=_data["threads"])
+        else:
+            import lightgbm as lgb
+            # No pre-filtering, so trials can change min_data_in_leaf on the
+            # constructed Dataset without its raw data
+            params = {"max_bin": 256, "feature_pre_filter": False, "verbose": -1}
+            dtrain = lgb.Dataset(_float_rows(train), label=y[train], params=params).construct()
+            dval = lgb.Dataset(_float_rows(val), label=y[val], params=params, reference=dtrain).construct()
+        _folds[key] = (dtrain, dval)
+    return _folds[key]
+
+
+def run_fold(engine, params, rounds, fold):
+    start = time.perf_counter()
+    dtrain, dval = _fold_matrices(engine, fold)
+    history = {}
+    if engine == "xgboost":
+        import xgboost as xgb
+        xgb.train({**BASE_PARAMS[engine], **params, "nthread": _data["threads"]}, dtrain,
+                  num_boost_round=rounds, evals=[(dval, "val")], evals_result=history, verbose_eval=False)
+        curve = history["val"]["rmse"]
+    else:
+        import lightgbm as lgb
+        lgb.train({**BASE_PARAMS[engine], **params, "num_threads": _data["threads"]}, dtrain,
+                  num_boost_round=rounds, valid_sets=[dval], valid_names=["val"],
+                  callbacks=[lgb.record_evaluation(history)])
+        curve = history["val"]["rmse"]
+    return {"rmse": float(curve[-1]), "best_round": int(np.argmin(curve)) + 1,
+            "best_rmse": float(min(curve)), "seconds": time.perf_counter() - start}
+
+
+# ---------------- Successive halving ----------------
+def rung_rounds(min_rounds, max_rounds, eta):
+    rounds = []
+    r = min_rounds
+    while r < max_rounds:
+        rounds.append(int(r))
+        r *= eta
+    return rounds + [max_rounds]
+
+
+def trial_id(engine, params, fingerprint):
+    blob = json.dumps({"engine": engine, "params": params, "data": fingerprint}, sort_keys=True)
+    return hashlib.blake2b(blob.encode(), digest_size=8).hexdigest()
+
+
+def load_trials(path):
+    done = {}
+    if os.path.exists(path):
+        with open(path) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # Last line cut short by an interrupted run
+                    continue
+                done[(record["trial"], record["rounds"], record["fold"])] = record
+    return done
+
+
+def search(args):
+    os.makedirs(args.out, exist_ok=True)
+    meta = load_meta(args.out) if os.path.exists(os.path.join(args.out, "dataset.json")) else None
+    if meta is not None and meta.get("inputs") == _fingerprint(args.X, args.y, args.folds, args.max_bin):
+        print(f"✅ Reusing quantized dataset ({meta['rows']:,} rows, {len(meta['features'])} features)")
+    else:
+        if meta is not None:
+            print(f"⚠️ {args.X} / {args.y} or the fold settings changed; quantizing again")
+        start = time.perf_counter()
+        meta = prepare_dataset(args.X, args.y, args.out, n_folds=args.folds, max_bin=args.max_bin)
+        print(f"✅ Quantized {meta['rows']:,} rows x {len(meta['features'])} features "
+              f"in {time.perf_counter() - start:.1f} s")
+
+    rng = np.random.default_rng(args.seed)
+    configs = {}
+    for _ in range(args.trials):
+        params = sample_params(args.engine, rng)
+        configs[trial_id(args.engine, params, meta["fingerprint"])] = params
+
+    trials_path = os.path.join(args.out, TRIALS_NAME)
+    done = load_trials(trials_path)
+    if done:
+        print(f"Resuming: {len(done)} fold results already on disk")
+
+    survivors = list(configs)
+    rungs = rung_rounds(args.min_rounds, args.max_rounds, args.eta)
+    scores = {}
+    start = time.perf_counter()
+    # Spawned workers: lightgbm / xgboost keep OpenMP state that is not fork-safe
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker,
+                             initargs=(args.out, args.threads),
+                             mp_context=multiprocessing.get_context("spawn")) as pool, \
+            open(trials_path, "a") as log:
+        for rounds in rungs:
+            jobs = {}
+            for trial in survivors:
+                for fold in range(meta["folds"]):
+                    if (trial, rounds, fold) not in done:
+                        future = pool.submit(run_fold, args.engine, configs[trial], rounds, fold)
+                        jobs[future] = (trial, fold)
+            for future in as_completed(jobs):
+                trial, fold = jobs[future]
+                record = {"trial": trial, "rounds": rounds, "fold": fold, "engine": args.engine,
+                          "params": configs[trial], **future.result()}
+                done[(trial, rounds, fold)] = record
+                log.write(json.dumps(record) + "\n")
+                log.flush()
+
+            scores = {trial: float(np.mean([done[(trial, rounds, fold)]["rmse"] for fold in range(meta["folds"])]))
+                      for trial in survivors}
+            ranked = sorted(survivors, key=scores.get)
+            print(f"  {rounds:>5} rounds: {len(survivors):>3} configs, best CV RMSE {scores[ranked[0]]:.5f} "
+                  f"({time.perf_counter() - start:.1f} s)")
+            if rounds != rungs[-1]:
+                survivors = ranked[:max(1, math.ceil(len(ranked) / args.eta))]
+
+    best = min(scores, key=scores.get)
+    fold_records = [done[(best, rungs[-1], fold)] for fold in range(meta["folds"])]
+    result = {"engine": args.engine, "trial": best, "cv_rmse": scores[best],
+              "num_boost_round": rungs[-1],
+              "best_round": int(np.median([r["best_round"] for r in fold_records])),
+              "params": {**BASE_PARAMS[args.engine], **configs[best]}}
+    with open(os.path.join(args.out, "best_params.json"), "w") as f:
+        json.dump(result, f, indent=2)
+    fold_work = sum(r["seconds"] for r in done.values())
+    print(f"✅ Best CV RMSE {scores[best]:.5f} with {json.dumps(configs[best])}")
+    print(f"   {len(done)} fold fits, {fold_work:.0f} s of worker time in "
+          f"{time.perf_counter() - start:.1f} s wall -> {os.path.join(args.out, 'best_params.json')}")
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Successive-halving hyperparameter search")
+    parser.add_argument("--engine", choices=["xgboost", "lightgbm"], default="xgboost")
+    parser.add_argument("--X", default="X_train_top_features.csv")
+    parser.add_argument("--y", default="y_train.csv")
+    parser.add_argument("--out", default="tuning")
+    parser.add_argument("--trials", type=int, default=27, help="configurations sampled")
+    parser.add_argument("--min-rounds", type=int, default=50)
+    parser.add_argument("--max-rounds", type=int, default=500)
+    parser.add_argument("--eta", type=int, default=3, help="keep the best 1/eta at each rung")
+    parser.add_argument("--folds", type=int, default=5)
+    parser.add_argument("--max-bin", type=int, default=255)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--threads", type=int, default=1, help="threads per fold fit")
+    parser.add_argument("--seed", type=int, default=42)
+    search(parser.parse_args())